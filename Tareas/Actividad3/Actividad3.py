@@ -1,12 +1,40 @@
 import sys
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from Basededatos import Libro, SessionLocal, init_db
+from Basededatos import Libro, SessionLocal, init_db, libro_a_dict
+from cache import cache_libros, normalizar_clave
 
 # 1. Inicializar la base de datos (crear tablas)
 init_db()
 
 # --- Funciones de Acceso a la Base de Datos (CRUD) ---
 
+def consultar_libros():
+    """Devuelve todos los libros (como diccionarios), pasando por la caché de lecturas."""
+    def cargar():
+        session = SessionLocal()
+        try:
+            return [libro_a_dict(libro) for libro in session.query(Libro).all()]
+        finally:
+            session.close()
+    return cache_libros.obtener(normalizar_clave("ver"), cargar)
+
+def consultar_busqueda(termino):
+    """Devuelve los libros cuyo título, autor o género contienen el término, pasando por la caché de lecturas."""
+    def cargar():
+        session = SessionLocal()
+        try:
+            # Uso de .ilike() para búsqueda insensible a mayúsculas/minúsculas y 'OR'
+            criterio = f"%{termino}%"
+            libros = session.query(Libro).filter(
+                (Libro.titulo.ilike(criterio)) | 
+                (Libro.autor.ilike(criterio)) | 
+                (Libro.genero.ilike(criterio))
+            ).all()
+            return [libro_a_dict(libro) for libro in libros]
+        finally:
+            session.close()
+    return cache_libros.obtener(normalizar_clave("buscar", termino), cargar)
+
 def agregar_libro(titulo, autor, genero, leido_str):
     """Agrega un nuevo libro a la base de datos usando el ORM."""
     session = SessionLocal()
@@ -16,6 +44,7 @@ def agregar_libro(titulo, autor, genero, leido_str):
     try:
         session.add(nuevo_libro)
         session.commit()
+        cache_libros.invalidar()
         print(f"\n Libro '{titulo}' de {autor} agregado con éxito.")
     except IntegrityError:
         session.rollback()
@@ -28,23 +57,20 @@ def agregar_libro(titulo, autor, genero, leido_str):
 
 def ver_libros():
     """Muestra el listado completo de libros."""
-    session = SessionLocal()
     try:
-        libros = session.query(Libro).all()
+        libros = consultar_libros()
         if not libros:
             print("\n📚 La biblioteca está vacía.")
             return
 
         print("\n--- Listado de Libros ---")
         for libro in libros:
-            estado = "Leído" if libro.leido else "Pendiente"
-            print(f"ID: {libro.id} | Título: {libro.titulo} | Autor: {libro.autor} | Género: {libro.genero} | Estado: {estado}")
+            estado = "Leído" if libro['leido'] else "Pendiente"
+            print(f"ID: {libro['id']} | Título: {libro['titulo']} | Autor: {libro['autor']} | Género: {libro['genero']} | Estado: {estado}")
         print("--------------------------")
 
     except SQLAlchemyError as e:
         print(f"\n ERROR de base de datos al listar: {e}")
-    finally:
-        session.close()
 
 def actualizar_libro(libro_id, **kwargs):
     """Modifica la información de un libro por su ID."""
@@ -64,6 +90,7 @@ def actualizar_libro(libro_id, **kwargs):
             libro.leido = leido
 
         session.commit()
+        cache_libros.invalidar()
         print(f"\n Libro con ID {libro_id} actualizado con éxito.")
 
     except IntegrityError:
@@ -77,15 +104,8 @@ def actualizar_libro(libro_id, **kwargs):
 
 def buscar_libros(termino):
     """Busca libros por título, autor o género."""
-    session = SessionLocal()
     try:
-        # Uso de .ilike() para búsqueda insensible a mayúsculas/minúsculas y 'OR'
-        criterio = f"%{termino}%"
-        libros = session.query(Libro).filter(
-            (Libro.titulo.ilike(criterio)) | 
-            (Libro.autor.ilike(criterio)) | 
-            (Libro.genero.ilike(criterio))
-        ).all()
+        libros = consultar_busqueda(termino)
 
         if not libros:
             print(f"\n No se encontraron libros con el término '{termino}'.")
@@ -93,12 +113,10 @@ def buscar_libros(termino):
 
         print(f"\n--- Resultados de Búsqueda para '{termino}' ---")
         for libro in libros:
-            estado = "Leído" if libro.leido else "Pendiente"
-            print(f"ID: {libro.id} | Título: {libro.titulo} | Autor: {libro.autor} | Género: {libro.genero} | Estado: {estado}")
+            estado = "Leído" if libro['leido'] else "Pendiente"
+            print(f"ID: {libro['id']} | Título: {libro['titulo']} | Autor: {libro['autor']} | Género: {libro['genero']} | Estado: {estado}")
         print("-------------------------------------------------")
     
     except SQLAlchemyError as e:
         print(f"\n ERROR de base de datos al buscar: {e}")
-    finally:
-        session.close()
 
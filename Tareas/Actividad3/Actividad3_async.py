@@ -0,0 +1,136 @@
+"""
+Versión asíncrona (asyncio) de las funciones CRUD de Actividad3.py.
+
+Usa el motor asíncrono de SQLAlchemy con la misma API (agregar_libro, ver_libros, actualizar_libro,
+buscar_libros), pero cada función es una corrutina. Así un front end web puede atender muchas
+consultas concurrentes sobre un único event loop sin bloquearse en cada llamada a la base.
+
+Driver según ASYNC_DATABASE_URL (ver Basededatos.py):
+- MariaDB: mariadb+asyncmy://... (o mariadb+aiomysql://...)
+- Local:   sqlite+aiosqlite:///biblioteca.db
+"""
+import asyncio
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from Basededatos import ASYNC_DATABASE_URL, Base, Libro, libro_a_dict
+from cache import cache_libros, normalizar_clave
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+
+async def init_db():
+    """Crea las tablas si aún no existen (equivalente asíncrono de Basededatos.init_db)."""
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+# --- Funciones de Acceso a la Base de Datos (CRUD) ---
+
+async def consultar_libros():
+    """Devuelve todos los libros (como diccionarios)."""
+    async def cargar():
+        async with AsyncSessionLocal() as session:
+            resultado = await session.scalars(select(Libro))
+            return [libro_a_dict(libro) for libro in resultado]
+    return await cache_libros.obtener_async(normalizar_clave("ver"), cargar)
+
+async def consultar_busqueda(termino):
+    """Devuelve los libros cuyo título, autor o género contienen el término."""
+    async def cargar():
+        criterio = f"%{termino}%"
+        consulta = select(Libro).where(or_(
+            Libro.titulo.ilike(criterio),
+            Libro.autor.ilike(criterio),
+            Libro.genero.ilike(criterio)
+        ))
+        async with AsyncSessionLocal() as session:
+            resultado = await session.scalars(consulta)
+            return [libro_a_dict(libro) for libro in resultado]
+    return await cache_libros.obtener_async(normalizar_clave("buscar", termino), cargar)
+
+async def agregar_libro(titulo, autor, genero, leido_str):
+    """Agrega un nuevo libro a la base de datos usando el ORM."""
+    leido = leido_str.lower() in ['si', 's', 'true', '1']
+    async with AsyncSessionLocal() as session:
+        try:
+            session.add(Libro(titulo=titulo, autor=autor, genero=genero, leido=leido))
+            await session.commit()
+            await cache_libros.invalidar_async()
+            print(f"\n Libro '{titulo}' de {autor} agregado con éxito.")
+        except IntegrityError:
+            await session.rollback()
+            print(f"\n ERROR: Ya existe un libro con el título '{titulo}'.")
+        except SQLAlchemyError as e:
+            await session.rollback()
+            print(f"\n ERROR de base de datos al agregar: {e}")
+
+async def ver_libros():
+    """Muestra el listado completo de libros."""
+    try:
+        libros = await consultar_libros()
+        if not libros:
+            print("\n📚 La biblioteca está vacía.")
+            return
+
+        print("\n--- Listado de Libros ---")
+        for libro in libros:
+            estado = "Leído" if libro['leido'] else "Pendiente"
+            print(f"ID: {libro['id']} | Título: {libro['titulo']} | Autor: {libro['autor']} | Género: {libro['genero']} | Estado: {estado}")
+        print("--------------------------")
+
+    except SQLAlchemyError as e:
+        print(f"\n ERROR de base de datos al listar: {e}")
+
+async def actualizar_libro(libro_id, **kwargs):
+    """Modifica la información de un libro por su ID."""
+    async with AsyncSessionLocal() as session:
+        try:
+            libro = await session.get(Libro, libro_id)
+            if not libro:
+                print(f"\n Libro con ID {libro_id} no encontrado.")
+                return
+
+            if 'titulo' in kwargs:
+                libro.titulo = kwargs['titulo']
+            if 'leido' in kwargs:
+                libro.leido = kwargs['leido'].lower() in ['si', 's', 'true', '1']
+
+            await session.commit()
+            await cache_libros.invalidar_async()
+            print(f"\n Libro con ID {libro_id} actualizado con éxito.")
+
+        except IntegrityError:
+            await session.rollback()
+            print(f"\n ERROR: Ya existe un libro con ese título.")
+        except SQLAlchemyError as e:
+            await session.rollback()
+            print(f"\n ERROR de base de datos al actualizar: {e}")
+
+async def buscar_libros(termino):
+    """Busca libros por título, autor o género."""
+    try:
+        libros = await consultar_busqueda(termino)
+
+        if not libros:
+            print(f"\n No se encontraron libros con el término '{termino}'.")
+            return
+
+        print(f"\n--- Resultados de Búsqueda para '{termino}' ---")
+        for libro in libros:
+            estado = "Leído" if libro['leido'] else "Pendiente"
+            print(f"ID: {libro['id']} | Título: {libro['titulo']} | Autor: {libro['autor']} | Género: {libro['genero']} | Estado: {estado}")
+        print("-------------------------------------------------")
+
+    except SQLAlchemyError as e:
+        print(f"\n ERROR de base de datos al buscar: {e}")
+
+
+if __name__ == "__main__":
+    async def main():
+        await init_db()
+        await ver_libros()
+        await async_engine.dispose()
+
+    asyncio.run(main())
@@ -1,5 +1,7 @@
+import os
 from sqlalchemy import create_engine, Column, Integer, String, Boolean
 from sqlalchemy.orm import declarative_base, sessionmaker
+from instrumentacion import activar_desde_entorno
 
 
 DB_USER = "tu_usuario_mariadb"
@@ -8,7 +10,9 @@ DB_HOST = "localhost"
 DB_NAME = "biblioteca_db"
 
 
-DATABASE_URL = f"mariadb+mysqlclient://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
+DATABASE_URL = os.getenv("DATABASE_URL", f"mariadb+mysqlclient://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}")
+# Variante asíncrona (Actividad3_async.py). Para pruebas locales: sqlite+aiosqlite:///biblioteca.db
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", f"mariadb+asyncmy://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}")
 
 
 try:
@@ -19,6 +23,9 @@ try:
 except Exception as e:
     print(f" Error al conectar a la base de datos: {e}")
 
+# Instrumentación opcional de consultas (SQL_INSTRUMENTACION=1), ver instrumentacion.py
+activar_desde_entorno(engine)
+
 Base = declarative_base()
 
 class Libro(Base):
@@ -37,6 +44,10 @@ class Libro(Base):
     def __repr__(self):
         return f"Libro(id={self.id}, titulo='{self.titulo}', autor='{self.autor}', leido={self.leido})"
 
+def libro_a_dict(libro):
+    """Copia plana de una fila, apta para guardarse en caché fuera de la sesión."""
+    return {"id": libro.id, "titulo": libro.titulo, "autor": libro.autor, "genero": libro.genero, "leido": libro.leido}
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
@@ -0,0 +1,99 @@
+"""
+Benchmark de rendimiento: CRUD síncrono (Actividad3.py, con un pool de hilos) vs asíncrono
+(Actividad3_async.py, con un único event loop) bajo concurrencia.
+
+Por defecto usa un archivo SQLite local (benchmark_async.db, que se borra al terminar) para poder
+correrlo sin MariaDB:
+    python benchmark_async.py --libros 2000 --peticiones 5000 --concurrencia 100
+
+Para medir contra MariaDB, definir DATABASE_URL y ASYNC_DATABASE_URL antes de ejecutarlo.
+Con SQLite las escrituras se serializan y las lecturas son locales, así que la diferencia es
+menor que contra un servidor real, donde cada consulta espera la red.
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ARCHIVO_LOCAL = "benchmark_async.db"
+USA_ARCHIVO_LOCAL = "DATABASE_URL" not in os.environ
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{ARCHIVO_LOCAL}")
+os.environ.setdefault("ASYNC_DATABASE_URL", f"sqlite+aiosqlite:///{ARCHIVO_LOCAL}")
+
+from Basededatos import Libro, SessionLocal, engine, init_db
+from cache import configurar_cache
+import Actividad3
+import Actividad3_async
+
+TERMINOS = ["autor 1", "Novela", "titulo 5", "Ensayo", "autor 7", "Poesía", "titulo 42", "xyz"]
+GENEROS = ["Novela", "Ensayo", "Poesía", "Cuento", "Teatro"]
+
+
+def preparar_datos(cantidad):
+    init_db()
+    session = SessionLocal()
+    try:
+        existentes = session.query(Libro).count()
+        if existentes >= cantidad:
+            return
+        session.add_all([
+            Libro(titulo=f"titulo {i}", autor=f"autor {i % 97}", genero=GENEROS[i % len(GENEROS)], leido=i % 2 == 0)
+            for i in range(existentes, cantidad)
+        ])
+        session.commit()
+    finally:
+        session.close()
+
+
+def medir_sincrono(peticiones, concurrencia):
+    terminos = [TERMINOS[i % len(TERMINOS)] for i in range(peticiones)]
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        for _ in pool.map(Actividad3.consultar_busqueda, terminos):
+            pass
+    return time.perf_counter() - inicio
+
+
+async def medir_asincrono(peticiones, concurrencia):
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def una(termino):
+        async with semaforo:
+            await Actividad3_async.consultar_busqueda(termino)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(una(TERMINOS[i % len(TERMINOS)]) for i in range(peticiones)))
+    duracion = time.perf_counter() - inicio
+    await Actividad3_async.async_engine.dispose()
+    return duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara el throughput del CRUD síncrono vs asíncrono.")
+    parser.add_argument("--libros", type=int, default=2000)
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    args = parser.parse_args()
+
+    # Sin caché: se mide el acceso real a la base
+    configurar_cache(None)
+    try:
+        preparar_datos(args.libros)
+        t_sync = medir_sincrono(args.peticiones, args.concurrencia)
+        t_async = asyncio.run(medir_asincrono(args.peticiones, args.concurrencia))
+    finally:
+        if USA_ARCHIVO_LOCAL:
+            engine.dispose()
+            if os.path.exists(ARCHIVO_LOCAL):
+                os.remove(ARCHIVO_LOCAL)
+
+    print("\n--- Benchmark síncrono vs asíncrono ---")
+    print(f"Libros: {args.libros} | Peticiones: {args.peticiones} | Concurrencia: {args.concurrencia}")
+    print(f"Síncrono (hilos):     {t_sync:.2f} s | {args.peticiones / t_sync:8.1f} consultas/s")
+    print(f"Asíncrono (asyncio):  {t_async:.2f} s | {args.peticiones / t_async:8.1f} consultas/s")
+    print("----------------------------------------")
+
+
+if __name__ == "__main__":
+    main()
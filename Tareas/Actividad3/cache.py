@@ -0,0 +1,235 @@
+"""
+Caché de lectura (read-through) para las consultas sobre la tabla 'libros'.
+
+Las funciones de lectura de Actividad3.py piden los datos a través de `cache_libros.obtener(clave, cargar)`:
+si la clave está en caché se devuelve sin tocar MariaDB; si no, se llama a `cargar()` y se guarda el resultado.
+Las funciones de escritura llaman a `cache_libros.invalidar()` después del commit.
+
+Se configura con variables de entorno:
+- LIBROS_CACHE: "memoria" (LRU en el proceso), "redis" (servidor compatible con el protocolo Redis) o vacío/"off" (desactivada).
+- LIBROS_CACHE_TTL: segundos de vida de cada entrada (por defecto 60).
+- LIBROS_CACHE_MAX: cantidad máxima de entradas del LRU en memoria (por defecto 256).
+- LIBROS_CACHE_REDIS_URL: URL del servidor para el backend "redis" (por defecto redis://localhost:6379/0).
+
+La generación de la caché se toma antes de `cargar()`: si hay una invalidación durante la carga, el
+resultado (quizá anterior al cambio) se descarta en lugar de guardarse como vigente. Si el servidor
+Redis no responde, las lecturas van directo a la base.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from redis import RedisError
+except ImportError:  # redis es opcional (solo para el backend "redis")
+    RedisError = ()
+
+CACHE_TTL = float(os.getenv("LIBROS_CACHE_TTL", 60))
+CACHE_MAX = int(os.getenv("LIBROS_CACHE_MAX", 256))
+
+
+def normalizar_clave(operacion, termino=""):
+    """Clave de caché para una consulta. La búsqueda usa ILIKE, así que las mayúsculas no cambian el resultado."""
+    return f"{operacion}:{termino.lower()}"
+
+
+class CacheLRU:
+    """LRU en memoria con vencimiento por TTL."""
+
+    bloqueante = False  # Sin E/S: se puede usar directo desde el event loop
+
+    def __init__(self, max_entradas=CACHE_MAX, ttl=CACHE_TTL):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self._generacion = 0
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            vence, valor = entrada
+            if vence < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def generacion(self):
+        return self._generacion
+
+    def set(self, clave, valor, generacion):
+        with self._lock:
+            if generacion != self._generacion:
+                return  # Hubo una invalidación durante la carga
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self):
+        with self._lock:
+            self._generacion += 1
+            self._datos.clear()
+
+
+class CacheRedis:
+    """
+    Backend sobre un servidor compatible con el protocolo Redis (Redis/KeyDB), compartido entre procesos.
+    La invalidación incrementa un número de generación que forma parte de las claves, así no hace falta
+    recorrer ni borrar claves: las entradas viejas dejan de leerse y vencen solas por TTL.
+    """
+
+    bloqueante = True  # Cliente síncrono: en código async se usa desde un hilo (ver obtener_async)
+
+    def __init__(self, cliente, ttl=CACHE_TTL, prefijo="biblioteca:cache:libros"):
+        self.cliente = cliente
+        self.ttl = ttl
+        self.prefijo = prefijo
+
+    def generacion(self):
+        """Generación vigente, o None si el servidor no responde."""
+        try:
+            generacion = self.cliente.get(f"{self.prefijo}:generacion") or b"0"
+        except RedisError as e:
+            print(f"\n AVISO: caché Redis no disponible, se consulta la base ({e})")
+            return None
+        if isinstance(generacion, bytes):
+            generacion = generacion.decode()
+        return generacion
+
+    def get(self, clave):
+        generacion = self.generacion()
+        if generacion is None:
+            return None
+        try:
+            valor = self.cliente.get(f"{self.prefijo}:{generacion}:{clave}")
+        except RedisError as e:
+            print(f"\n AVISO: caché Redis no disponible, se consulta la base ({e})")
+            return None
+        return json.loads(valor) if valor is not None else None
+
+    def set(self, clave, valor, generacion):
+        # Se guarda bajo la generación tomada antes de cargar: si hubo una invalidación
+        # mientras tanto, la entrada queda en una generación que ya no se lee
+        if generacion is None:
+            return
+        try:
+            self.cliente.set(f"{self.prefijo}:{generacion}:{clave}", json.dumps(valor), ex=max(1, int(self.ttl)))
+        except RedisError as e:
+            print(f"\n AVISO: no se pudo guardar en la caché Redis ({e})")
+
+    def invalidar(self):
+        try:
+            self.cliente.incr(f"{self.prefijo}:generacion")
+        except RedisError as e:
+            print(f"\n ERROR: no se pudo invalidar la caché Redis ({e})")
+
+
+class CacheLecturas:
+    """Caché read-through con contadores de aciertos y fallos. Sin backend, siempre consulta la base."""
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.reiniciar_contadores()
+
+    def reiniciar_contadores(self):
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+
+    @property
+    def activa(self):
+        return self.backend is not None
+
+    def obtener(self, clave, cargar):
+        if self.backend is None:
+            return cargar()
+        valor = self.backend.get(clave)
+        if valor is not None:
+            self.aciertos += 1
+            return valor
+        self.fallos += 1
+        generacion = self.backend.generacion()
+        valor = cargar()
+        self.backend.set(clave, valor, generacion)
+        return valor
+
+    async def obtener_async(self, clave, cargar):
+        """
+        Igual que obtener(), pero `cargar` es una corrutina (ver Actividad3_async.py). Las llamadas a un
+        backend con E/S (Redis) se hacen en un hilo con asyncio.to_thread, para no bloquear el event loop.
+        """
+        if self.backend is None:
+            return await cargar()
+        valor = await self._llamar_backend(self.backend.get, clave)
+        if valor is not None:
+            self.aciertos += 1
+            return valor
+        self.fallos += 1
+        generacion = await self._llamar_backend(self.backend.generacion)
+        valor = await cargar()
+        await self._llamar_backend(self.backend.set, clave, valor, generacion)
+        return valor
+
+    async def _llamar_backend(self, metodo, *args):
+        if getattr(self.backend, "bloqueante", True):
+            return await asyncio.to_thread(metodo, *args)
+        return metodo(*args)
+
+    async def invalidar_async(self):
+        """Igual que invalidar(), sin bloquear el event loop."""
+        if self.backend is None:
+            return
+        self.invalidaciones += 1
+        await self._llamar_backend(self.backend.invalidar)
+
+    def invalidar(self):
+        if self.backend is None:
+            return
+        self.invalidaciones += 1
+        self.backend.invalidar()
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "invalidaciones": self.invalidaciones,
+            "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+        }
+
+
+def crear_backend_desde_entorno():
+    tipo = os.getenv("LIBROS_CACHE", "").lower()
+    if tipo == "memoria":
+        return CacheLRU()
+    if tipo == "redis":
+        import redis  # Dependencia opcional, solo para este backend
+        return CacheRedis(redis.Redis.from_url(os.getenv("LIBROS_CACHE_REDIS_URL", "redis://localhost:6379/0")))
+    return None
+
+
+cache_libros = CacheLecturas(crear_backend_desde_entorno())
+
+
+def configurar_cache(backend):
+    """Reemplaza el backend de la caché (None la desactiva) y reinicia los contadores."""
+    cache_libros.backend = backend
+    cache_libros.reiniciar_contadores()
+
+
+def imprimir_estadisticas_cache():
+    e = cache_libros.estadisticas()
+    if not e["backend"]:
+        print("\n La caché de lecturas está desactivada (LIBROS_CACHE).")
+        return
+    print(f"\n--- Caché de Libros ({e['backend']}) ---")
+    print(f"Aciertos: {e['aciertos']} | Fallos: {e['fallos']} | Tasa de aciertos: {e['tasa_aciertos']:.1%} | Invalidaciones: {e['invalidaciones']}")
+    print("-----------------------------------")
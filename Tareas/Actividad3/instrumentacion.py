@@ -0,0 +1,277 @@
+"""
+Instrumentación de las consultas SQL que emite la biblioteca (SQLAlchemy).
+
+Se engancha a los eventos del Engine y del pool de conexiones para registrar:
+- latencia y filas de cada sentencia, agrupadas por sentencia normalizada (filas afectadas en
+  INSERT/UPDATE/DELETE; en las SELECT, filas leídas, contadas a medida que se obtienen del cursor),
+- tiempo de espera al pedir una conexión al pool (checkout),
+- patrones N+1 (la misma SELECT repetida muchas veces dentro de un mismo checkout),
+- un log de consultas lentas a partir de un umbral configurable.
+
+Uso desde la línea de comandos (ejecuta el listado y una búsqueda e imprime el resumen):
+    python instrumentacion.py [termino_de_busqueda]
+
+También se activa para cualquier ejecución con la variable de entorno SQL_INSTRUMENTACION=1,
+en cuyo caso el resumen se imprime al salir del programa.
+"""
+import atexit
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import event
+
+UMBRAL_LENTO_MS = float(os.getenv("SQL_UMBRAL_LENTO_MS", 100))
+UMBRAL_N_MAS_1 = int(os.getenv("SQL_UMBRAL_N_MAS_1", 5))
+
+logger = logging.getLogger("biblioteca.sql")
+
+# Literales que se reemplazan por '?' para agrupar sentencias equivalentes
+_RE_CADENAS = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMEROS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTAS_IN = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+
+def normalizar_sentencia(sql):
+    """Devuelve la sentencia sin literales ni espacios repetidos, para usarla como clave de agrupación."""
+    sql = _RE_CADENAS.sub("?", sql)
+    sql = _RE_NUMEROS.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = _RE_LISTAS_IN.sub("(?)", sql)
+    return _RE_ESPACIOS.sub(" ", sql).strip()
+
+
+class EstadisticaSentencia:
+    """Acumulado de ejecuciones de una sentencia normalizada."""
+
+    def __init__(self):
+        self.ejecuciones = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.filas = None  # None si el driver no informa filas afectadas
+
+    def registrar(self, duracion_ms, filas):
+        self.ejecuciones += 1
+        self.total_ms += duracion_ms
+        self.max_ms = max(self.max_ms, duracion_ms)
+        if filas is not None and filas >= 0:
+            self.filas = (self.filas or 0) + filas
+
+    @property
+    def promedio_ms(self):
+        return self.total_ms / self.ejecuciones if self.ejecuciones else 0.0
+
+
+class CursorContador:
+    """
+    Envuelve el cursor DBAPI de una sentencia que devuelve filas y avisa cuántas se leen.
+    El driver no las informa al ejecutar (rowcount es -1 en las SELECT), así que se cuentan al leerlas.
+    """
+
+    def __init__(self, cursor, al_leer):
+        self._cursor = cursor
+        self._al_leer = al_leer
+
+    def fetchone(self):
+        fila = self._cursor.fetchone()
+        if fila is not None:
+            self._al_leer(1)
+        return fila
+
+    def fetchmany(self, *args, **kwargs):
+        filas = self._cursor.fetchmany(*args, **kwargs)
+        self._al_leer(len(filas))
+        return filas
+
+    def fetchall(self):
+        filas = self._cursor.fetchall()
+        self._al_leer(len(filas))
+        return filas
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+class Instrumentacion:
+    """Registra métricas de las sentencias ejecutadas por un Engine de SQLAlchemy."""
+
+    def __init__(self, engine, umbral_lento_ms=UMBRAL_LENTO_MS, umbral_n_mas_1=UMBRAL_N_MAS_1):
+        self.engine = engine
+        self.umbral_lento_ms = umbral_lento_ms
+        self.umbral_n_mas_1 = umbral_n_mas_1
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Descarta todas las métricas acumuladas hasta el momento."""
+        with self._lock:
+            self.sentencias = {}
+            self.consultas_lentas = 0
+            self.errores = 0
+            self.checkouts = 0
+            self.espera_pool_total_ms = 0.0
+            self.espera_pool_max_ms = 0.0
+            self.patrones_n_mas_1 = Counter()
+
+    # --- Enganche a los eventos ---
+
+    def instalar(self):
+        event.listen(self.engine, "before_cursor_execute", self._antes_de_ejecutar)
+        event.listen(self.engine, "after_cursor_execute", self._despues_de_ejecutar)
+        event.listen(self.engine, "handle_error", self._al_fallar)
+        event.listen(self.engine, "checkout", self._al_checkout)
+        event.listen(self.engine, "checkin", self._al_checkin)
+
+        # El pool no expone un evento previo al checkout, así que se mide la espera
+        # envolviendo Pool.connect(), que es lo que llama el Engine para obtener una conexión.
+        pool = self.engine.pool
+        connect_original = pool.connect
+
+        def connect_medido():
+            inicio = time.perf_counter()
+            try:
+                return connect_original()
+            finally:
+                self._registrar_espera_pool((time.perf_counter() - inicio) * 1000)
+
+        pool.connect = connect_medido
+        return self
+
+    def _antes_de_ejecutar(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("sql_inicio", []).append(time.perf_counter())
+
+    def _despues_de_ejecutar(self, conn, cursor, statement, parameters, context, executemany):
+        duracion_ms = (time.perf_counter() - conn.info["sql_inicio"].pop()) * 1000
+        clave = normalizar_sentencia(statement)
+
+        with self._lock:
+            estadistica = self.sentencias.get(clave)
+            if estadistica is None:
+                estadistica = self.sentencias[clave] = EstadisticaSentencia()
+            # Con filas a devolver (description no es None) se cuentan las leídas; si no, las afectadas
+            devuelve_filas = cursor.description is not None
+            estadistica.registrar(duracion_ms, 0 if devuelve_filas else getattr(cursor, "rowcount", None))
+            if duracion_ms >= self.umbral_lento_ms:
+                self.consultas_lentas += 1
+
+        if devuelve_filas and context is not None:
+            # SQLAlchemy arma el resultado con context.cursor después de este evento
+            context.cursor = CursorContador(cursor, lambda filas: self._sumar_filas(estadistica, filas))
+
+        if duracion_ms >= self.umbral_lento_ms:
+            logger.warning("Consulta lenta (%.1f ms): %s | parámetros: %r", duracion_ms, statement, parameters)
+
+        conteo = conn.info.get("sql_conteo_checkout")
+        if conteo is not None and clave.upper().startswith("SELECT"):
+            conteo[clave] += 1
+
+    def _sumar_filas(self, estadistica, filas):
+        with self._lock:
+            estadistica.filas += filas
+
+    def _al_fallar(self, contexto):
+        inicios = contexto.connection.info.get("sql_inicio") if contexto.connection is not None else None
+        if inicios:
+            inicios.pop()
+        with self._lock:
+            self.errores += 1
+
+    def _al_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        # Contador de sentencias por checkout: se evalúa al devolver la conexión al pool
+        connection_record.info["sql_conteo_checkout"] = Counter()
+
+    def _al_checkin(self, dbapi_connection, connection_record):
+        conteo = connection_record.info.pop("sql_conteo_checkout", None)
+        if not conteo:
+            return
+        for clave, repeticiones in conteo.items():
+            if repeticiones >= self.umbral_n_mas_1:
+                logger.warning("Posible patrón N+1: %d ejecuciones de '%s' en una misma conexión", repeticiones, clave)
+                with self._lock:
+                    self.patrones_n_mas_1[clave] += 1
+
+    def _registrar_espera_pool(self, espera_ms):
+        with self._lock:
+            self.checkouts += 1
+            self.espera_pool_total_ms += espera_ms
+            self.espera_pool_max_ms = max(self.espera_pool_max_ms, espera_ms)
+
+    # --- Reporte ---
+
+    def resumen(self, top=10):
+        """Devuelve un reporte de texto con las métricas acumuladas."""
+        with self._lock:
+            sentencias = sorted(self.sentencias.items(), key=lambda item: item[1].total_ms, reverse=True)
+            total_ejecuciones = sum(e.ejecuciones for _, e in sentencias)
+            total_ms = sum(e.total_ms for _, e in sentencias)
+            espera_promedio = self.espera_pool_total_ms / self.checkouts if self.checkouts else 0.0
+
+            lineas = [
+                "--- Resumen de Consultas SQL ---",
+                f"Sentencias ejecutadas: {total_ejecuciones} ({len(sentencias)} distintas) | Tiempo total: {total_ms:.1f} ms",
+                f"Consultas lentas (>= {self.umbral_lento_ms:.0f} ms): {self.consultas_lentas} | Errores: {self.errores}",
+                f"Checkouts del pool: {self.checkouts} | Espera promedio: {espera_promedio:.2f} ms | Espera máxima: {self.espera_pool_max_ms:.2f} ms",
+            ]
+            if sentencias:
+                lineas.append(f"Top {min(top, len(sentencias))} sentencias por tiempo total:")
+                for clave, e in sentencias[:top]:
+                    lineas.append(
+                        f"  {e.ejecuciones:>6}x | total {e.total_ms:9.1f} ms | prom {e.promedio_ms:7.2f} ms "
+                        f"| máx {e.max_ms:7.2f} ms | filas {'' if e.filas is None else e.filas:>7} | {clave[:120]}"
+                    )
+            if self.patrones_n_mas_1:
+                lineas.append(f"Posibles patrones N+1 (>= {self.umbral_n_mas_1} repeticiones por conexión):")
+                for clave, veces in self.patrones_n_mas_1.most_common():
+                    lineas.append(f"  detectado {veces} vez/veces | {clave[:120]}")
+            lineas.append("--------------------------------")
+        return "\n".join(lineas)
+
+
+_instrumentaciones = {}
+
+
+def instrumentar(engine, umbral_lento_ms=UMBRAL_LENTO_MS, umbral_n_mas_1=UMBRAL_N_MAS_1):
+    """Instala la instrumentación en el Engine (una sola vez) y la devuelve."""
+    if engine not in _instrumentaciones:
+        _instrumentaciones[engine] = Instrumentacion(engine, umbral_lento_ms, umbral_n_mas_1).instalar()
+    return _instrumentaciones[engine]
+
+
+def imprimir_resumen(engine=None, top=10):
+    """Imprime el resumen de la instrumentación del Engine indicado (o de todos los instrumentados)."""
+    instrumentaciones = [_instrumentaciones[engine]] if engine is not None else list(_instrumentaciones.values())
+    if not instrumentaciones:
+        print("\n La instrumentación SQL no está activa.")
+        return
+    for instrumentacion in instrumentaciones:
+        print("\n" + instrumentacion.resumen(top=top))
+
+
+def activar_desde_entorno(engine):
+    """Activa la instrumentación si SQL_INSTRUMENTACION=1 e imprime el resumen al salir."""
+    if os.getenv("SQL_INSTRUMENTACION") != "1":
+        return None
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    if engine not in _instrumentaciones:
+        atexit.register(imprimir_resumen, engine)
+    return instrumentar(engine)
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+
+    from Basededatos import engine
+    instrumentar(engine)
+
+    from Actividad3 import ver_libros, buscar_libros
+
+    ver_libros()
+    if len(sys.argv) > 1:
+        buscar_libros(" ".join(sys.argv[1:]))
+    imprimir_resumen(engine)
@@ -1,7 +1,10 @@
+import re
 import sys
+from itertools import chain
 from bson.objectid import ObjectId
-from pymongo.errors import DuplicateKeyError, WriteConcernError, OperationFailure
-from Basededatos import libros_collection # Importamos la colección ya conectada
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError, WriteConcernError, OperationFailure, PyMongoError
+from Basededatos import obtener_coleccion # La conexión se establece en el primer uso
 
 
 def agregar_libro(titulo, autor, genero, leido_str):
@@ -20,33 +23,70 @@ def agregar_libro(titulo, autor, genero, leido_str):
 
     try:
         # Insertar el documento. MongoDB genera automáticamente el _id.
-        resultado = libros_collection.insert_one(nuevo_libro)
+        resultado = obtener_coleccion().insert_one(nuevo_libro)
         print(f"\n Libro '{titulo}' agregado con éxito. ID: {resultado.inserted_id}")
     except DuplicateKeyError:
-        # Esta excepción ocurriría si se creara un índice único en 'titulo'
+        # Índice único 'titulo_unico' (ver Basededatos.crear_indices)
         print(f"\n ERROR: Ya existe un libro con el título '{titulo}'.")
-    except OperationFailure as e:
+    except PyMongoError as e:
         print(f"\n ERROR de MongoDB al insertar: {e}")
 
-def ver_libros():
-    """Muestra el listado completo de documentos (libros)."""
+# Solo se traen los campos que se muestran, en lotes acotados
+PROYECCION_LIBRO = {"titulo": 1, "autor": 1, "genero": 1, "leido": 1}
+TAMANO_LOTE = 500
+
+def iterar_libros(despues_de=None, limite=0, tamano_lote=TAMANO_LOTE):
+    """
+    Cursor sobre los libros ordenados por _id (usa el índice de _id, sin ordenar en memoria).
+    Paginación por rango (keyset): `despues_de` es el _id del último libro de la página anterior.
+    """
+    filtro = {"_id": {"$gt": despues_de}} if despues_de is not None else {}
+    cursor = obtener_coleccion().find(filtro, PROYECCION_LIBRO).sort("_id", ASCENDING).batch_size(tamano_lote)
+    if limite:
+        cursor = cursor.limit(limite)
+    return cursor
+
+def ver_libros(tamano_pagina=0, despues_de=None, tamano_lote=TAMANO_LOTE):
+    """
+    Muestra los documentos (libros) a medida que llegan del cursor, en una sola consulta.
+    Con `tamano_pagina` muestra solo esa cantidad y devuelve el _id del último libro mostrado,
+    que se pasa como `despues_de` para ver la página siguiente. Devuelve None si no hay más.
+    """
+    if isinstance(despues_de, str):
+        try:
+            despues_de = ObjectId(despues_de)
+        except Exception:
+            print(f"\n ERROR: ID '{despues_de}' no es un formato válido de MongoDB ObjectId.")
+            return None
+
     try:
-        # Usamos .find({}) para obtener todos los documentos
-        libros = libros_collection.find({})
-        
-        if libros_collection.count_documents({}) == 0:
-            print("\n La biblioteca está vacía.")
-            return
+        libros = iterar_libros(despues_de, tamano_pagina, tamano_lote)
+
+        # El vacío se detecta con el primer lote del mismo cursor (sin un count_documents aparte)
+        primero = next(libros, None)
+        if primero is None:
+            print("\n No hay más libros." if despues_de else "\n La biblioteca está vacía.")
+            return None
 
         print("\n--- Listado de Libros ---")
-        for libro in libros:
+        mostrados = 0
+        ultimo_id = None
+        for libro in chain([primero], libros):
             estado = "Leído" if libro['leido'] else "Pendiente"
             # El ID en MongoDB es '_id' y es un objeto ObjectId
             print(f"ID: {libro['_id']} | Título: {libro['titulo']} | Autor: {libro['autor']} | Género: {libro['genero']} | Estado: {estado}")
+            mostrados += 1
+            ultimo_id = libro['_id']
         print("--------------------------")
 
-    except OperationFailure as e:
+        if tamano_pagina and mostrados == tamano_pagina:
+            print(f"Página siguiente: ver_libros({tamano_pagina}, despues_de='{ultimo_id}')")
+            return ultimo_id
+        return None
+
+    except PyMongoError as e:
         print(f"\n ERROR de MongoDB al listar: {e}")
+        return None
 
 def actualizar_libro(libro_id_str, campo, nuevo_valor):
     """Modifica un campo específico de un documento por su _id."""
@@ -67,7 +107,7 @@ def actualizar_libro(libro_id_str, campo, nuevo_valor):
         actualizacion = {"$set": {campo: nuevo_valor}}
 
     try:
-        resultado = libros_collection.update_one(filtro, actualizacion)
+        resultado = obtener_coleccion().update_one(filtro, actualizacion)
         
         if resultado.matched_count == 0:
             print(f"\n Libro con ID {libro_id_str} no encontrado.")
@@ -76,42 +116,60 @@ def actualizar_libro(libro_id_str, campo, nuevo_valor):
         else:
             print(f"\n Libro encontrado, pero no se realizó ninguna modificación (el valor ya era el mismo).")
 
-    except OperationFailure as e:
+    except PyMongoError as e:
         print(f"\n ERROR de MongoDB al actualizar: {e}")
 
-def buscar_libros(termino):
-    """Busca documentos por título, autor o género utilizando expresiones regulares."""
-    
-    regex_pattern = {"$regex": termino, "$options": "i"}
+LIMITE_BUSQUEDA = 20
+
+def buscar_libros(termino, limite=LIMITE_BUSQUEDA):
+    """Busca documentos por título, autor o género usando el índice de texto, ordenados por relevancia."""
+
+    filtro = {"$text": {"$search": termino}}
+    proyeccion = {**PROYECCION_LIBRO, "score": {"$meta": "textScore"}}
 
-    filtro = {
-        "$or": [
-            {"titulo": regex_pattern},
-            {"autor": regex_pattern},
-            {"genero": regex_pattern}
-        ]
-    }
-    
     try:
-      
-        libros = libros_collection.find(filtro)
-        
-        # Contar resultados (una alternativa más eficiente sería .count_documents(filtro))
-        resultados_encontrados = list(libros)
-        
-        if not resultados_encontrados:
+        try:
+            libros = (
+                obtener_coleccion().find(filtro, proyeccion)
+                .sort([("score", {"$meta": "textScore"})])
+                .limit(limite)
+                .batch_size(TAMANO_LOTE)
+            )
+            # El primer lote se pide acá: si falta el índice de texto, el error aparece ahora
+            primero = next(libros, None)
+        except OperationFailure as e:
+            # Sin índice de texto (código 27): regex como antes
+            if e.code != 27:
+                raise
+            libros = buscar_libros_regex(termino, limite)
+            primero = next(libros, None)
+
+        if primero is None:
             print(f"\n No se encontraron libros con el término '{termino}'.")
             return
 
         print(f"\n--- Resultados de Búsqueda para '{termino}' ---")
-        for libro in resultados_encontrados:
+        for libro in chain([primero], libros):
             estado = "Leído" if libro.get('leido', False) else "Pendiente"
-            print(f"ID: {libro['_id']} | Título: {libro['titulo']} | Autor: {libro['autor']} | Género: {libro['genero']} | Estado: {estado}")
+            relevancia = f" | Relevancia: {libro['score']:.2f}" if 'score' in libro else ""
+            print(f"ID: {libro['_id']} | Título: {libro['titulo']} | Autor: {libro['autor']} | Género: {libro['genero']} | Estado: {estado}{relevancia}")
         print("-------------------------------------------------")
     
-    except OperationFailure as e:
+    except PyMongoError as e:
         print(f"\n ERROR de MongoDB al buscar: {e}")
 
+def buscar_libros_regex(termino, limite=LIMITE_BUSQUEDA):
+    """Búsqueda por subcadena (recorre toda la colección). Solo se usa si no hay índice de texto."""
+    regex_pattern = {"$regex": re.escape(termino), "$options": "i"}
+    filtro = {
+        "$or": [
+            {"titulo": regex_pattern},
+            {"autor": regex_pattern},
+            {"genero": regex_pattern}
+        ]
+    }
+    return obtener_coleccion().find(filtro, PROYECCION_LIBRO).limit(limite).batch_size(TAMANO_LOTE)
+
 def eliminar_libro(libro_id_str):
     """Elimina un documento por su _id."""
     try:
@@ -122,14 +180,14 @@ def eliminar_libro(libro_id_str):
 
     try:
 
-        resultado = libros_collection.delete_one({"_id": libro_id})
+        resultado = obtener_coleccion().delete_one({"_id": libro_id})
         
         if resultado.deleted_count == 1:
             print(f"\n Libro con ID {libro_id_str} eliminado con éxito.")
         else:
             print(f"\n Libro con ID {libro_id_str} no encontrado.")
 
-    except OperationFailure as e:
+    except PyMongoError as e:
         print(f"\n ERROR de MongoDB al eliminar: {e}")
 
 
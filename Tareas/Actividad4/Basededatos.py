@@ -1,34 +1,124 @@
-from pymongo import MongoClient
-from pymongo.errors import ConnectionError, ConfigurationError
+import os
+from pymongo import MongoClient, IndexModel, ASCENDING, TEXT, ReadPreference
+from pymongo.errors import ConnectionFailure, ConfigurationError, OperationFailure
+from pymongo.write_concern import WriteConcern
 
 # 1. Parámetros de Conexión a MongoDB
 # Usar MongoDB Atlas o una instancia local.
 # Ejemplo de conexión local: "mongodb://localhost:27017/"
 # Ejemplo de conexión Atlas (reemplazar con su URL):
 # MONGO_URI = "mongodb+srv://<usuario>:<password>@cluster0.abcde.mongodb.net/?retryWrites=true&w=majority"
-MONGO_URI = "mongodb://localhost:27017/"
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 DB_NAME = "biblioteca_nosql"
 COLLECTION_NAME = "libros"
 
-# 2. Inicialización del Cliente y Conexión
-try:
-    # Intentar establecer la conexión
-    client = MongoClient(MONGO_URI)
-    # Ping para verificar que la conexión está activa
-    client.admin.command('ping')
-    print("✅ Conexión a MongoDB exitosa.")
-
-    # Acceder a la base de datos y la colección
-    db = client[DB_NAME]
-    libros_collection = db[COLLECTION_NAME]
-
-except ConnectionError:
-    print(f"\n❌ ERROR: No se pudo conectar a MongoDB en {MONGO_URI}.")
-    print("Asegúrate de que MongoDB esté corriendo o que la cadena de conexión sea correcta.")
-    # Usamos exit() para terminar el programa si la conexión falla
-    import sys
-    sys.exit(1)
-except ConfigurationError as e:
-    print(f"\n❌ ERROR de configuración de URI de MongoDB: {e}")
-    import sys
-    sys.exit(1)
\ No newline at end of file
+# Pool y tiempos de espera del cliente (ver crear_cliente)
+MONGO_MAX_POOL = int(os.getenv("MONGO_MAX_POOL", 50))
+MONGO_MIN_POOL = int(os.getenv("MONGO_MIN_POOL", 0))
+MONGO_TIMEOUT_SELECCION_MS = int(os.getenv("MONGO_TIMEOUT_SELECCION_MS", 5000))
+MONGO_TIMEOUT_CONEXION_MS = int(os.getenv("MONGO_TIMEOUT_CONEXION_MS", 5000))
+MONGO_TIMEOUT_SOCKET_MS = int(os.getenv("MONGO_TIMEOUT_SOCKET_MS", 30000))
+# Compresión de la red, p. ej. "zstd,snappy,zlib" (zstd y snappy requieren paquetes extra). Vacío = sin compresión.
+MONGO_COMPRESORES = os.getenv("MONGO_COMPRESORES", "")
+
+# Perfiles de escritura/lectura:
+# - "rapido": confirma con el primario sin esperar el journal y permite leer de secundarios
+# - "durable": espera a la mayoría del replica set y al journal, y lee siempre del primario
+PERFILES = {
+    "rapido": {
+        "write_concern": WriteConcern(w=1, j=False),
+        "read_preference": ReadPreference.PRIMARY_PREFERRED,
+    },
+    "durable": {
+        "write_concern": WriteConcern(w="majority", j=True),
+        "read_preference": ReadPreference.PRIMARY,
+    },
+}
+MONGO_PERFIL = os.getenv("MONGO_PERFIL", "durable")
+
+# Índices de la colección: se crean al iniciar (create_indexes no hace nada si ya existen)
+INDICES_LIBROS = [
+    # Garantiza títulos únicos (agregar_libro captura DuplicateKeyError)
+    IndexModel([("titulo", ASCENDING)], name="titulo_unico", unique=True),
+    # Filtros por autor y por autor+género; con 'leido' cubre además las estadísticas de reportes.py
+    IndexModel([("autor", ASCENDING), ("genero", ASCENDING), ("leido", ASCENDING)], name="autor_genero_leido"),
+    # Búsqueda de texto de buscar_libros ($text), con más peso para el título
+    IndexModel(
+        [("titulo", TEXT), ("autor", TEXT), ("genero", TEXT)],
+        name="texto_libros",
+        weights={"titulo": 10, "autor": 5, "genero": 2},
+        default_language="spanish",
+    ),
+]
+
+# Índices de versiones anteriores que quedaron cubiertos por otros (autor_genero -> autor_genero_leido):
+# se eliminan para no pagar su mantenimiento en cada escritura
+INDICES_OBSOLETOS = ["autor_genero"]
+
+def crear_indices(coleccion):
+    """Crea los índices de la colección de libros si aún no existen y elimina los obsoletos."""
+    try:
+        existentes = coleccion.index_information()
+        for nombre in INDICES_OBSOLETOS:
+            if nombre in existentes:
+                coleccion.drop_index(nombre)
+    except OperationFailure as e:
+        # IndexNotFound (27): otro proceso lo eliminó entre la consulta y el drop
+        if e.code != 27:
+            print(f"\n⚠️ No se pudieron eliminar los índices obsoletos de '{coleccion.name}': {e}")
+    try:
+        coleccion.create_indexes(INDICES_LIBROS)
+    except OperationFailure as e:
+        # Por ejemplo, títulos duplicados previos que impiden crear el índice único
+        print(f"\n⚠️ No se pudieron crear los índices de '{coleccion.name}': {e}")
+
+# 2. Inicialización del Cliente (diferida)
+# El cliente se crea recién cuando se pide la primera colección, así importar los módulos es instantáneo.
+_cliente = None
+_colecciones = {}
+
+def crear_cliente(uri=MONGO_URI, **opciones):
+    """Crea un MongoClient con el pool y los tiempos de espera configurados, sin conectarse todavía."""
+    configuracion = {
+        "maxPoolSize": MONGO_MAX_POOL,
+        "minPoolSize": MONGO_MIN_POOL,
+        "serverSelectionTimeoutMS": MONGO_TIMEOUT_SELECCION_MS,
+        "connectTimeoutMS": MONGO_TIMEOUT_CONEXION_MS,
+        "socketTimeoutMS": MONGO_TIMEOUT_SOCKET_MS,
+        "connect": False,
+    }
+    if MONGO_COMPRESORES:
+        configuracion["compressors"] = MONGO_COMPRESORES
+    configuracion.update(opciones)
+    return MongoClient(uri, **configuracion)
+
+def obtener_cliente():
+    """Devuelve el cliente compartido del proceso (lo crea la primera vez)."""
+    global _cliente
+    if _cliente is None:
+        try:
+            _cliente = crear_cliente()
+        except ConfigurationError as e:
+            print(f"\n❌ ERROR de configuración de URI de MongoDB: {e}")
+            raise
+    return _cliente
+
+def obtener_coleccion(perfil=MONGO_PERFIL):
+    """
+    Devuelve la colección de libros con el write concern y read preference del perfil ("rapido" o "durable").
+    El primer uso se conecta al servidor y crea los índices.
+    """
+    if perfil not in PERFILES:
+        raise ValueError(f"Perfil '{perfil}' desconocido. Opciones: {', '.join(PERFILES)}")
+    if perfil not in _colecciones:
+        coleccion = obtener_cliente()[DB_NAME].get_collection(COLLECTION_NAME, **PERFILES[perfil])
+        if not _colecciones:
+            try:
+                crear_indices(coleccion)
+                print("✅ Conexión a MongoDB exitosa.")
+            except ConnectionFailure:
+                print(f"\n❌ ERROR: No se pudo conectar a MongoDB en {MONGO_URI}.")
+                print("Asegúrate de que MongoDB esté corriendo o que la cadena de conexión sea correcta.")
+                raise
+        _colecciones[perfil] = coleccion
+    return _colecciones[perfil]
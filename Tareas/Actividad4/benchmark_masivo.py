@@ -0,0 +1,88 @@
+"""
+Benchmark de ingesta: insert_one por documento vs bulk_write ordenado vs no ordenado (registros/segundo).
+
+Contra un mongod local (usa una base aparte, 'biblioteca_benchmark', que se vacía en cada corrida):
+    python benchmark_masivo.py --registros 20000 --lote 1000
+
+Sin servidor, contra mongomock (en memoria; sirve para validar el flujo, no mide la red):
+    python benchmark_masivo.py --mongomock
+"""
+import argparse
+import time
+
+from operaciones_masivas import agregar_libros_masivo
+
+GENEROS = ["Novela", "Ensayo", "Poesía", "Cuento", "Teatro"]
+
+
+def generar_libros(cantidad, duplicados=0):
+    libros = [
+        {"titulo": f"Libro {i}", "autor": f"Autor {i % 311}", "genero": GENEROS[i % len(GENEROS)], "leido": i % 2 == 0}
+        for i in range(cantidad)
+    ]
+    # Algunos títulos repetidos para ejercitar el reporte de errores por documento
+    libros.extend(dict(libros[i], autor="Duplicado") for i in range(duplicados))
+    return libros
+
+
+def obtener_coleccion(usar_mongomock, uri):
+    if usar_mongomock:
+        import mongomock
+        cliente = mongomock.MongoClient()
+    else:
+        from pymongo import MongoClient
+        cliente = MongoClient(uri)
+    coleccion = cliente["biblioteca_benchmark"]["libros"]
+    return coleccion
+
+
+def preparar(coleccion):
+    coleccion.drop()
+    coleccion.create_index("titulo", unique=True, name="titulo_unico")
+
+
+def medir(nombre, coleccion, funcion, cantidad):
+    preparar(coleccion)
+    inicio = time.perf_counter()
+    errores = funcion()
+    duracion = time.perf_counter() - inicio
+    print(f"{nombre:<28} {duracion:8.2f} s | {cantidad / duracion:10.0f} registros/s | errores: {errores}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide registros/segundo de la ingesta uno a uno vs bulk_write.")
+    parser.add_argument("--registros", type=int, default=10000)
+    parser.add_argument("--lote", type=int, default=1000)
+    parser.add_argument("--duplicados", type=int, default=10)
+    parser.add_argument("--uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--mongomock", action="store_true", help="Usar mongomock en lugar de un mongod local")
+    args = parser.parse_args()
+
+    coleccion = obtener_coleccion(args.mongomock, args.uri)
+    libros = generar_libros(args.registros, args.duplicados)
+    total = len(libros)
+
+    def uno_a_uno():
+        from pymongo.errors import DuplicateKeyError
+        errores = 0
+        for libro in libros:
+            try:
+                coleccion.insert_one(dict(libro))
+            except DuplicateKeyError:
+                errores += 1
+        return errores
+
+    print(f"\n--- Benchmark de ingesta ({total} documentos, lote {args.lote}) ---")
+    medir("insert_one (uno a uno)", coleccion, uno_a_uno, total)
+    medir("bulk_write ordenado", coleccion,
+          lambda: len(agregar_libros_masivo(libros, args.lote, ordenado=True, coleccion=coleccion)["errores"]), total)
+    medir("bulk_write no ordenado", coleccion,
+          lambda: len(agregar_libros_masivo(libros, args.lote, ordenado=False, coleccion=coleccion)["errores"]), total)
+    print("--------------------------------------------------------------")
+    print("Nota: en modo ordenado la carga se detiene en el primer duplicado.")
+
+    coleccion.drop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Operaciones masivas sobre la colección de libros usando bulk_write.
+
+En lugar de un insert_one/update_one/delete_one (una ida y vuelta al servidor) por libro,
+las operaciones se agrupan en lotes de `tamano_lote` y se envían con bulk_write.
+- ordenado=False (por defecto): el servidor aplica todo el lote aunque alguna operación falle
+  y puede paralelizar; es el modo de mayor throughput.
+- ordenado=True: se detiene en el primer error (y no se envían los lotes siguientes).
+
+Los errores se informan por documento (índice dentro de la entrada, código y mensaje),
+por ejemplo los títulos duplicados que rechaza el índice único 'titulo_unico'. Los ids inválidos
+de las actualizaciones y eliminaciones se detectan antes de enviar el primer lote y se informan
+igual, como errores por documento.
+"""
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import InsertOne, UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+
+TAMANO_LOTE_ESCRITURA = 1000
+CODIGO_DUPLICADO = 11000
+CODIGO_ID_INVALIDO = "id_invalido"
+
+
+def _coleccion_por_defecto():
+    from Basededatos import obtener_coleccion
+    return obtener_coleccion()
+
+
+def _a_booleano(valor):
+    if isinstance(valor, bool):
+        return valor
+    return str(valor).lower() in ['si', 's', 'true', '1']
+
+
+def _preparar_operaciones(entradas, construir, ordenado):
+    """
+    Construye todas las operaciones antes de escribir nada. Las entradas con un id inválido quedan
+    como errores por documento; en modo ordenado se conservan solo las operaciones anteriores al
+    primer id inválido (el mismo punto donde se detendría bulk_write).
+    Devuelve (operaciones, indices, errores): indices[i] es la posición en `entradas` de operaciones[i].
+    """
+    operaciones, indices, errores = [], [], []
+    for indice, entrada in enumerate(entradas):
+        try:
+            operacion = construir(entrada)
+        except (InvalidId, TypeError) as e:
+            errores.append({"indice": indice, "codigo": CODIGO_ID_INVALIDO, "mensaje": f"id inválido: {e}"})
+            if ordenado:
+                break
+            continue
+        operaciones.append(operacion)
+        indices.append(indice)
+    return operaciones, indices, errores
+
+
+def _ejecutar_validadas(entradas, construir, tamano_lote, ordenado, coleccion):
+    operaciones, indices, errores = _preparar_operaciones(entradas, construir, ordenado)
+    resumen = ejecutar_masivo(operaciones, tamano_lote, ordenado, coleccion, indices=indices)
+    resumen["errores"] = sorted(errores + resumen["errores"], key=lambda error: error["indice"])
+    return resumen
+
+
+def ejecutar_masivo(operaciones, tamano_lote=TAMANO_LOTE_ESCRITURA, ordenado=False, coleccion=None, indices=None):
+    """
+    Envía las operaciones (InsertOne/UpdateOne/DeleteOne) en lotes con bulk_write.
+    Devuelve un resumen con los totales y la lista de errores por documento. Si se pasa `indices`,
+    el índice de cada error es indices[posición de la operación] en lugar de la posición.
+    """
+    coleccion = coleccion if coleccion is not None else _coleccion_por_defecto()
+    resumen = {"insertados": 0, "coincidentes": 0, "modificados": 0, "eliminados": 0, "errores": []}
+
+    lote = []
+    desplazamiento = 0  # Índice global de la primera operación del lote actual
+
+    def enviar(lote, desplazamiento):
+        try:
+            resultado = coleccion.bulk_write(lote, ordered=ordenado)
+            detalles = resultado.bulk_api_result
+        except BulkWriteError as e:
+            detalles = e.details
+            for error in detalles.get("writeErrors", []):
+                posicion = desplazamiento + error["index"]
+                resumen["errores"].append({
+                    "indice": indices[posicion] if indices is not None else posicion,
+                    "codigo": error.get("code"),
+                    "mensaje": "título duplicado" if error.get("code") == CODIGO_DUPLICADO else error.get("errmsg"),
+                })
+        resumen["insertados"] += detalles.get("nInserted", 0)
+        resumen["coincidentes"] += detalles.get("nMatched", 0)
+        resumen["modificados"] += detalles.get("nModified", 0)
+        resumen["eliminados"] += detalles.get("nRemoved", 0)
+        # En modo ordenado, un error detiene el resto de la carga
+        return not (ordenado and detalles.get("writeErrors"))
+
+    for operacion in operaciones:
+        lote.append(operacion)
+        if len(lote) >= tamano_lote:
+            if not enviar(lote, desplazamiento):
+                return resumen
+            desplazamiento += len(lote)
+            lote = []
+    if lote:
+        enviar(lote, desplazamiento)
+    return resumen
+
+
+def agregar_libros_masivo(libros, tamano_lote=TAMANO_LOTE_ESCRITURA, ordenado=False, coleccion=None):
+    """Inserta muchos libros. Cada libro es un dict con titulo, autor, genero y leido ('si'/'no' o bool)."""
+    operaciones = (
+        InsertOne({
+            "titulo": libro["titulo"],
+            "autor": libro["autor"],
+            "genero": libro["genero"],
+            "leido": _a_booleano(libro.get("leido", False)),
+        })
+        for libro in libros
+    )
+    return ejecutar_masivo(operaciones, tamano_lote, ordenado, coleccion)
+
+
+def actualizar_libros_masivo(cambios, tamano_lote=TAMANO_LOTE_ESCRITURA, ordenado=False, coleccion=None):
+    """Aplica muchas actualizaciones. Cada cambio es una tupla (libro_id, campo, nuevo_valor)."""
+    def construir(cambio):
+        libro_id, campo, nuevo_valor = cambio
+        if campo.lower() == 'leido':
+            nuevo_valor = _a_booleano(nuevo_valor)
+        return UpdateOne({"_id": ObjectId(libro_id)}, {"$set": {campo: nuevo_valor}})
+    return _ejecutar_validadas(cambios, construir, tamano_lote, ordenado, coleccion)
+
+
+def eliminar_libros_masivo(libro_ids, tamano_lote=TAMANO_LOTE_ESCRITURA, ordenado=False, coleccion=None):
+    """Elimina muchos libros por su _id."""
+    construir = lambda libro_id: DeleteOne({"_id": ObjectId(libro_id)})
+    return _ejecutar_validadas(libro_ids, construir, tamano_lote, ordenado, coleccion)
+
+
+def imprimir_resumen_masivo(resumen, max_errores=10):
+    print("\n--- Resultado de la Operación Masiva ---")
+    print(f"Insertados: {resumen['insertados']} | Coincidentes: {resumen['coincidentes']} | "
+          f"Modificados: {resumen['modificados']} | Eliminados: {resumen['eliminados']} | Errores: {len(resumen['errores'])}")
+    for error in resumen["errores"][:max_errores]:
+        print(f"  Documento #{error['indice']}: [{error['codigo']}] {error['mensaje']}")
+    if len(resumen["errores"]) > max_errores:
+        print(f"  ... y {len(resumen['errores']) - max_errores} errores más.")
+    print("----------------------------------------")
+
@@ -0,0 +1,88 @@
+"""
+Estadísticas de la biblioteca calculadas en MongoDB con un pipeline de agregación.
+
+Un único `aggregate` con `$facet` devuelve en una sola ida y vuelta:
+- totales de libros leídos y pendientes,
+- conteos por género,
+- conteos por autor (los `limite_autores` con más libros).
+
+El pipeline empieza con una proyección de autor/genero/leido y se sugiere (hint) el índice
+'autor_genero_leido', así MongoDB lo resuelve leyendo solo el índice (covered query) en lugar
+de traer los documentos completos.
+"""
+from pymongo.errors import OperationFailure, PyMongoError
+from Basededatos import obtener_coleccion
+
+INDICE_ESTADISTICAS = "autor_genero_leido"
+
+# 1 si el libro está leído, 0 si no (para sumar en los $group)
+_ES_LEIDO = {"$cond": [{"$eq": ["$leido", True]}, 1, 0]}
+
+
+def _agrupar_por(campo):
+    return {"$group": {"_id": campo, "total": {"$sum": 1}, "leidos": {"$sum": _ES_LEIDO}}}
+
+
+def pipeline_estadisticas(limite_autores=10):
+    return [
+        {"$project": {"_id": 0, "autor": 1, "genero": 1, "leido": 1}},
+        {"$facet": {
+            "totales": [_agrupar_por(None)],
+            "por_genero": [_agrupar_por("$genero"), {"$sort": {"total": -1, "_id": 1}}],
+            "por_autor": [_agrupar_por("$autor"), {"$sort": {"total": -1, "_id": 1}}, {"$limit": limite_autores}],
+        }},
+    ]
+
+
+def obtener_estadisticas(limite_autores=10, coleccion=None):
+    """Devuelve un dict con 'total', 'leidos', 'pendientes', 'por_genero' y 'por_autor'."""
+    coleccion = coleccion if coleccion is not None else obtener_coleccion()
+    pipeline = pipeline_estadisticas(limite_autores)
+    try:
+        resultado = next(coleccion.aggregate(pipeline, hint=INDICE_ESTADISTICAS), None)
+    except OperationFailure:
+        # El índice sugerido no existe (base creada antes de agregarlo): mismo pipeline sin hint
+        resultado = next(coleccion.aggregate(pipeline), None)
+
+    totales = resultado["totales"][0] if resultado and resultado["totales"] else {"total": 0, "leidos": 0}
+
+    def filas(grupos):
+        return [
+            {"nombre": g["_id"], "total": g["total"], "leidos": g["leidos"], "pendientes": g["total"] - g["leidos"]}
+            for g in grupos
+        ]
+
+    return {
+        "total": totales["total"],
+        "leidos": totales["leidos"],
+        "pendientes": totales["total"] - totales["leidos"],
+        "por_genero": filas(resultado["por_genero"]) if resultado else [],
+        "por_autor": filas(resultado["por_autor"]) if resultado else [],
+    }
+
+
+def ver_estadisticas(limite_autores=10):
+    """Muestra las estadísticas de la biblioteca."""
+    try:
+        estadisticas = obtener_estadisticas(limite_autores)
+    except PyMongoError as e:
+        print(f"\n ERROR de MongoDB al calcular estadísticas: {e}")
+        return
+
+    if estadisticas["total"] == 0:
+        print("\n La biblioteca está vacía.")
+        return
+
+    print("\n--- Estadísticas de la Biblioteca ---")
+    print(f"Total: {estadisticas['total']} | Leídos: {estadisticas['leidos']} | Pendientes: {estadisticas['pendientes']}")
+    print("\nPor género:")
+    for fila in estadisticas["por_genero"]:
+        print(f"  {fila['nombre']}: {fila['total']} (leídos {fila['leidos']}, pendientes {fila['pendientes']})")
+    print(f"\nAutores con más libros (top {limite_autores}):")
+    for fila in estadisticas["por_autor"]:
+        print(f"  {fila['nombre']}: {fila['total']} (leídos {fila['leidos']}, pendientes {fila['pendientes']})")
+    print("-------------------------------------")
+
+
+if __name__ == "__main__":
+    ver_estadisticas()
@@ -1,120 +1,398 @@
 import redis
 import json
 import os
-from dotenv import load_dotenv
+import re
+import sys
+import unicodedata
+import uuid
+from conexion import obtener_cliente, esta_disponible
 
 # --- Configuración y Conexión ---
 
-# Cargar variables de entorno del archivo .env
-load_dotenv()
-
-# Variables de conexión a KeyDB
-KEYDB_HOST = os.getenv("KEYDB_HOST", "localhost")
-KEYDB_PORT = int(os.getenv("KEYDB_PORT", 6379))
-KEYDB_PASSWORD = os.getenv("KEYDB_PASSWORD") # Será None si no está definida
-
-try:
-    # Conexión a KeyDB
-    # Se utiliza la clase Redis de redis-py, ya que KeyDB es compatible con el protocolo Redis
-    r = redis.Redis(
-        host=KEYDB_HOST,
-        port=KEYDB_PORT,
-        password=KEYDB_PASSWORD,
-        decode_responses=True  # Decodifica las respuestas a string de Python automáticamente
-    )
-    r.ping()
-    print("Conexión a KeyDB establecida con éxito.")
-except redis.exceptions.ConnectionError as e:
-    print(f"ERROR: No se pudo conectar a KeyDB en {KEYDB_HOST}:{KEYDB_PORT}. Asegúrate de que KeyDB esté corriendo.")
-    print(e)
-    exit(1)
-except Exception as e:
-    print(f"Ocurrió un error inesperado al conectar a KeyDB: {e}")
-    exit(1)
+# Cliente compartido del pool de conexiones (ver conexion.py): no se conecta al importar; la
+# primera operación abre la conexión y los cortes se reintentan con backoff.
+# Se utiliza la clase Redis de redis-py, ya que KeyDB es compatible con el protocolo Redis
+r = obtener_cliente()
 
 # --- Funciones de la Lógica de la Aplicación (CRUD) ---
 
-def generar_id_unico():
-    # Incrementa un contador global en KeyDB y lo usa como ID
-    return r.incr('libro:next_id')
+# Índice ordenado de ids (sorted set, score = id): permite listar en orden y por páginas
+# sin recorrer todo el keyspace con KEYS ni ordenar en Python.
+CLAVE_INDICE_IDS = "libro:ids"
+TAMANO_LOTE = 500
+
+# Índices secundarios para la búsqueda: un set de ids por cada palabra (y sus prefijos) de
+# titulo/autor/genero, más un set por estado. Se mantienen en la misma transacción que el libro.
+CAMPOS_BUSQUEDA = ("titulo", "autor", "genero")
+LARGO_MIN_PREFIJO = 2
+CLAVE_VERSION_INDICES = "libro:indices_version"
+VERSION_INDICES = "2"
+
+# Formato de almacenamiento de cada libro:
+# - "hash": un HASH por libro (HSET/HMGET); permite leer y actualizar campos sueltos
+# - "json": un string JSON por libro (formato original; cada cambio reescribe el libro entero)
+# Se toma de KEYDB_FORMATO o, si no está definida, del formato registrado en KeyDB. Una base
+# nueva usa "hash"; una base con libros JSON sigue en "json" hasta ejecutar `python Actividad5.py migrar`.
+CLAVE_FORMATO = "libro:formato"
+CAMPOS_LIBRO = ("id", "titulo", "autor", "genero", "estado", "version")
+
+def formato_configurado():
+    """Formato fijado con KEYDB_FORMATO (tiene prioridad sobre el registrado en KeyDB), o None."""
+    return os.getenv("KEYDB_FORMATO") or None
+
+def detectar_formato():
+    formato = formato_configurado() or r.get(CLAVE_FORMATO)
+    if formato:
+        return formato
+    if r.exists('libro:next_id'):
+        return "json"
+    r.setnx(CLAVE_FORMATO, "hash")
+    return r.get(CLAVE_FORMATO)
+
+FORMATO = None  # Se detecta con el primer uso (ver _formato())
+
+def _formato():
+    """Formato de la base, detectado la primera vez que se necesita (no hace falta llamar antes a inicializar())."""
+    global FORMATO
+    if FORMATO is None:
+        FORMATO = detectar_formato()
+    return FORMATO
+
+def libro_desde_hash(valores):
+    """Convierte la respuesta de HMGET (en el orden de CAMPOS_LIBRO) en un libro, o None si no existe."""
+    if not valores or valores[0] is None:
+        return None
+    libro = dict(zip(CAMPOS_LIBRO, valores))
+    libro["id"] = int(libro["id"])
+    libro["version"] = int(libro["version"] or 0)
+    return libro
+
+def leer_libro(cliente, clave):
+    # `cliente` puede ser la conexión o un pipeline en modo WATCH (ejecuta al instante)
+    if _formato() == "hash":
+        return libro_desde_hash(cliente.hmget(clave, CAMPOS_LIBRO))
+    libro_json = cliente.get(clave)
+    return json.loads(libro_json) if libro_json else None
+
+def normalizar_texto(texto):
+    # Minúsculas y sin tildes, para que "García" y "garcia" coincidan
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+def palabras(texto):
+    return re.findall(r"\w+", normalizar_texto(texto))
+
+def prefijos(texto):
+    """Cada palabra y sus prefijos desde LARGO_MIN_PREFIJO letras (permite buscar por el comienzo de las palabras)."""
+    resultado = set()
+    for palabra in palabras(texto):
+        resultado.add(palabra)
+        for largo in range(LARGO_MIN_PREFIJO, len(palabra)):
+            resultado.add(palabra[:largo])
+    return resultado
+
+def clave_indice_estado(estado):
+    return f"libro:idx:estado:{normalizar_texto(estado).strip()}"
+
+def claves_indices(libro):
+    """Claves de los sets de índice en los que debe figurar el libro."""
+    claves = {f"libro:idx:{campo}:{p}" for campo in CAMPOS_BUSQUEDA for p in prefijos(libro[campo])}
+    claves.add(clave_indice_estado(libro["estado"]))
+    return claves
+
+def reconstruir_indices(count=TAMANO_LOTE):
+    """
+    Recorre las claves de libros con SCAN (sin bloquear el servidor como KEYS) y las agrega al
+    índice de ids y a los índices de búsqueda. Sirve para migrar datos guardados antes de que
+    existieran los índices.
+    """
+    agregados = 0
+    claves = []
+
+    def indexar_lote(claves):
+        pipe = r.pipeline(transaction=False)
+        for libro in obtener_libros_por_ids([clave.split(":", 1)[1] for clave in claves]):
+            pipe.zadd(CLAVE_INDICE_IDS, {libro["id"]: libro["id"]})
+            for clave_indice in claves_indices(libro):
+                pipe.sadd(clave_indice, libro["id"])
+        pipe.execute()
+
+    for clave in r.scan_iter(match="libro:[0-9]*", count=count):
+        claves.append(clave)
+        agregados += 1
+        if len(claves) >= count:
+            indexar_lote(claves)
+            claves = []
+    if claves:
+        indexar_lote(claves)
+    r.set(CLAVE_VERSION_INDICES, VERSION_INDICES)
+    return agregados
+
+# --- Scripts Lua: escrituras atómicas en una sola ida y vuelta ---
+
+# Alta: asigna el id (INCR), guarda el libro y lo agrega a todos sus índices.
+# KEYS: contador de ids, índice de ids, índices de búsqueda del libro...
+# ARGV: formato, prefijo de las claves, titulo, autor, genero, estado
+LUA_AGREGAR = """
+local id = redis.call('INCR', KEYS[1])
+local clave = ARGV[2] .. id
+if ARGV[1] == 'hash' then
+    redis.call('HSET', clave, 'id', id, 'titulo', ARGV[3], 'autor', ARGV[4], 'genero', ARGV[5], 'estado', ARGV[6], 'version', 1)
+else
+    redis.call('SET', clave, cjson.encode({id = id, titulo = ARGV[3], autor = ARGV[4], genero = ARGV[5], estado = ARGV[6], version = 1}))
+end
+redis.call('ZADD', KEYS[2], id, id)
+for i = 3, #KEYS do
+    redis.call('SADD', KEYS[i], id)
+end
+return id
+"""
+
+# Modificación con control optimista: solo se aplica si la versión guardada es la que se leyó.
+# KEYS: clave del libro, índices a quitar..., índices a agregar...
+# ARGV: formato, versión leída, cantidad de índices a quitar, id, y luego
+#       "hash": pares campo/valor modificados | "json": el libro completo ya serializado
+# Devuelve la nueva versión, 0 si hubo conflicto de versión o -1 si el libro no existe.
+LUA_ACTUALIZAR = """
+local clave = KEYS[1]
+local version
+if ARGV[1] == 'hash' then
+    if redis.call('EXISTS', clave) == 0 then return -1 end
+    version = redis.call('HGET', clave, 'version') or '0'
+else
+    local actual = redis.call('GET', clave)
+    if not actual then return -1 end
+    version = tostring(cjson.decode(actual)['version'] or 0)
+end
+if version ~= ARGV[2] then return 0 end
+
+local nueva_version = tonumber(version) + 1
+if ARGV[1] == 'hash' then
+    for i = 5, #ARGV, 2 do
+        redis.call('HSET', clave, ARGV[i], ARGV[i + 1])
+    end
+    redis.call('HSET', clave, 'version', nueva_version)
+else
+    redis.call('SET', clave, ARGV[5])
+end
+
+local quitar = tonumber(ARGV[3])
+for i = 2, quitar + 1 do
+    redis.call('SREM', KEYS[i], ARGV[4])
+end
+for i = quitar + 2, #KEYS do
+    redis.call('SADD', KEYS[i], ARGV[4])
+end
+return nueva_version
+"""
+
+script_agregar = r.register_script(LUA_AGREGAR)
+script_actualizar = r.register_script(LUA_ACTUALIZAR)
 
 def agregar_libro(titulo, autor, genero, estado):
-    libro_id = generar_id_unico()
     libro = {
-        "id": libro_id,
         "titulo": titulo,
         "autor": autor,
         "genero": genero,
         "estado": estado
     }
-    # Serializar el objeto a JSON
-    libro_json = json.dumps(libro)
-    # Usar el comando SET para almacenar el string JSON con una clave única
-    clave = f"libro:{libro_id}"
-    r.set(clave, libro_json)
+    # Id, libro (HASH o string JSON, según FORMATO) e índices en un único script atómico
+    libro_id = script_agregar(
+        keys=['libro:next_id', CLAVE_INDICE_IDS, *claves_indices(libro)],
+        args=[_formato(), "libro:", titulo, autor, genero, estado]
+    )
     print(f"\nLibro agregado: {titulo} con ID: {libro_id}")
 
 def obtener_libro_por_id(libro_id):
+    return leer_libro(r, f"libro:{libro_id}")
+
+def obtener_libros_por_ids(ids):
+    """Trae varios libros en una sola ida y vuelta (MGET o HMGET en pipeline), en el orden de `ids`."""
+    if not ids:
+        return []
+    claves = [f"libro:{i}" for i in ids]
+    if _formato() == "hash":
+        pipe = r.pipeline(transaction=False)
+        for clave in claves:
+            pipe.hmget(clave, CAMPOS_LIBRO)
+        return [libro for libro in map(libro_desde_hash, pipe.execute()) if libro]
+    return [json.loads(libro_json) for libro_json in r.mget(claves) if libro_json]
+
+def actualizar_campos(libro_id, version_esperada=None, **cambios):
+    """
+    Actualiza solo los campos indicados con control de concurrencia optimista.
+    Devuelve (resultado, libro) con resultado "ok", "no_encontrado" o "conflicto".
+    - Con `version_esperada`, el cambio solo se aplica si nadie modificó el libro desde que se
+      leyó esa versión (si no, "conflicto").
+    - Sin ella, se relee y se reintenta hasta aplicar el cambio sobre la última versión.
+    En formato "hash" se escriben únicamente los campos que cambian.
+    """
     clave = f"libro:{libro_id}"
-    libro_json = r.get(clave)
-    if libro_json:
-        return json.loads(libro_json)
-    return None
+    while True:
+        libro = obtener_libro_por_id(libro_id)
+        if not libro:
+            return "no_encontrado", None
+        # Los libros guardados antes de versionar no tienen "version": cuentan como 0
+        version = libro.get("version", 0)
+        if version_esperada is not None and version != version_esperada:
+            return "conflicto", libro
+
+        modificados = {campo: valor for campo, valor in cambios.items() if libro.get(campo) != valor}
+        nuevo = {**libro, **modificados, "version": version + 1}
+        indices_anteriores = claves_indices(libro)
+        indices_nuevos = claves_indices(nuevo)
+        quitar = indices_anteriores - indices_nuevos
+        agregar = indices_nuevos - indices_anteriores
+
+        if _formato() == "hash":
+            datos = [valor for par in modificados.items() for valor in par]
+        else:
+            datos = [json.dumps(nuevo)]
+        # Escritura + versión + índices en un único script (una ida y vuelta)
+        resultado = script_actualizar(
+            keys=[clave, *quitar, *agregar],
+            args=[_formato(), version, len(quitar), libro_id, *datos]
+        )
+        if resultado == -1:
+            return "no_encontrado", None
+        if resultado > 0:
+            return "ok", nuevo
+        if version_esperada is not None:
+            return "conflicto", obtener_libro_por_id(libro_id)
+        # Otro cliente escribió entre la lectura y el script: se reintenta con la versión nueva
 
 def actualizar_libro(libro_id, nuevo_titulo, nuevo_autor, nuevo_genero, nuevo_estado):
-    libro = obtener_libro_por_id(libro_id)
-    if not libro:
+    resultado, _ = actualizar_campos(libro_id, titulo=nuevo_titulo, autor=nuevo_autor, genero=nuevo_genero, estado=nuevo_estado)
+    if resultado == "no_encontrado":
         print(f"\nERROR: No se encontró el libro con ID {libro_id}.")
         return
-
-    # Actualizar campos
-    libro["titulo"] = nuevo_titulo
-    libro["autor"] = nuevo_autor
-    libro["genero"] = nuevo_genero
-    libro["estado"] = nuevo_estado
-
-    # Serializar y almacenar de nuevo
-    clave = f"libro:{libro_id}"
-    r.set(clave, json.dumps(libro))
     print(f"\nLibro con ID {libro_id} actualizado con éxito.")
 
 def eliminar_libro(libro_id):
     clave = f"libro:{libro_id}"
-    # Usar el comando DEL
-    if r.delete(clave) == 1:
-        print(f"\nLibro con ID {libro_id} eliminado con éxito.")
-    else:
-        print(f"\nERROR: No se encontró el libro con ID {libro_id}.")
+    with r.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(clave)
+                libro = leer_libro(pipe, clave)
+                if not libro:
+                    print(f"\nERROR: No se encontró el libro con ID {libro_id}.")
+                    return
+                # Usar el comando DEL y quitar el id de todos sus índices en la misma transacción
+                pipe.multi()
+                pipe.delete(clave)
+                pipe.zrem(CLAVE_INDICE_IDS, libro_id)
+                for clave_indice in claves_indices(libro):
+                    pipe.srem(clave_indice, libro_id)
+                pipe.execute()
+                break
+            except redis.WatchError:
+                continue
+    print(f"\nLibro con ID {libro_id} eliminado con éxito.")
 
-def obtener_todos_los_libros():
-    # Usar SCAN para buscar todas las claves que coincidan con el patrón "libro:*"
-    claves = r.keys("libro:[0-9]*")
-    libros = []
-    if not claves:
-        return libros
+def obtener_pagina_libros(despues_de=0, tamano=TAMANO_LOTE):
+    """
+    Devuelve (libros, siguiente) con hasta `tamano` libros de id mayor a `despues_de`, en orden.
+    `siguiente` es el cursor para pedir la página siguiente, o None si no hay más.
+    """
+    ids = r.zrangebyscore(CLAVE_INDICE_IDS, f"({despues_de}", "+inf", start=0, num=tamano)
+    if not ids:
+        return [], None
+    # MGET trae los valores de todo el lote en una sola ida y vuelta
+    libros = obtener_libros_por_ids(ids)
+    siguiente = int(ids[-1]) if len(ids) == tamano else None
+    return libros, siguiente
+
+def iterar_libros(tamano_lote=TAMANO_LOTE):
+    """Genera los libros en orden de id, trayéndolos de a lotes (memoria acotada por el tamaño del lote)."""
+    cursor = 0
+    while cursor is not None:
+        libros, cursor = obtener_pagina_libros(cursor, tamano_lote)
+        yield from libros
 
-    # Usar MGET para obtener los valores de múltiples claves de forma eficiente
-    libros_json = r.mget(claves)
-    for libro_json in libros_json:
-        if libro_json:
-            libros.append(json.loads(libro_json))
+def obtener_todos_los_libros():
+    return list(iterar_libros())
 
-    return sorted(libros, key=lambda l: l['id'])
+def buscar_ids(termino):
+    """
+    Ids de los libros que contienen todas las palabras del término (o palabras que empiezan así)
+    en titulo, autor o genero: SUNION de los tres campos por palabra y SINTER entre palabras.
+    """
+    grupos = [[f"libro:idx:{campo}:{palabra}" for campo in CAMPOS_BUSQUEDA] for palabra in palabras(termino)]
+    if not grupos:
+        return []
+    if len(grupos) == 1:
+        ids = r.sunion(grupos[0])
+    else:
+        # Uniones en claves temporales + intersección, todo en una transacción (una ida y vuelta)
+        temporales = [f"libro:tmp:{uuid.uuid4().hex}" for _ in grupos]
+        pipe = r.pipeline()
+        for temporal, grupo in zip(temporales, grupos):
+            pipe.sunionstore(temporal, grupo)
+        pipe.sinter(temporales)
+        pipe.delete(*temporales)
+        ids = pipe.execute()[-2]
+    return sorted(int(libro_id) for libro_id in ids)
 
 def buscar_libros(termino):
-    libros_encontrados = []
-    # Obtener todos los libros para realizar la búsqueda en la aplicación
-    # Una solución más escalable podría usar Redis Search (KeyDB soporta RediSearch)
-    todos_los_libros = obtener_todos_los_libros()
-    termino = termino.lower()
-
-    for libro in todos_los_libros:
-        if (termino in libro['titulo'].lower() or
-            termino in libro['autor'].lower() or
-            termino in libro['genero'].lower()):
-            libros_encontrados.append(libro)
-    
-    return libros_encontrados
+    # Los índices se consultan en el servidor: solo viajan los libros que coinciden
+    return obtener_libros_por_ids(buscar_ids(termino))
+
+def buscar_por_estado(estado):
+    ids = sorted(int(libro_id) for libro_id in r.smembers(clave_indice_estado(estado)))
+    return obtener_libros_por_ids(ids)
+
+def migrar_a_hash(count=TAMANO_LOTE):
+    """
+    Convierte los libros guardados como string JSON a HASH y registra el nuevo formato en KeyDB.
+    Se migra por lotes de `count` claves: el DEL + HSET de todos los libros del lote va en una sola
+    transacción (MULTI/EXEC), así ningún libro queda sin clave ni a medio escribir. Los libros se leen
+    con MGET antes de la transacción, sin WATCH: ejecutar con la aplicación detenida.
+    """
+    global FORMATO
+    migrados = 0
+
+    def migrar_lote(claves):
+        pipe = r.pipeline(transaction=False)
+        for clave in claves:
+            pipe.type(clave)
+        claves_json = [clave for clave, tipo in zip(claves, pipe.execute()) if tipo == "string"]
+        if not claves_json:
+            return 0
+        pipe = r.pipeline()
+        cantidad = 0
+        for clave, libro_json in zip(claves_json, r.mget(claves_json)):
+            if not libro_json:
+                continue
+            pipe.delete(clave)
+            pipe.hset(clave, mapping=json.loads(libro_json))
+            cantidad += 1
+        pipe.execute()
+        return cantidad
+
+    claves = []
+    for clave in r.scan_iter(match="libro:[0-9]*", count=count):
+        claves.append(clave)
+        if len(claves) >= count:
+            migrados += migrar_lote(claves)
+            claves = []
+    if claves:
+        migrados += migrar_lote(claves)
+    r.set(CLAVE_FORMATO, "hash")
+    FORMATO = "hash"
+    return migrados
+
+INICIALIZADO = False
+
+def inicializar():
+    """Detecta el formato y, la primera vez, indexa los datos guardados antes de que existieran los índices."""
+    global INICIALIZADO
+    if INICIALIZADO:
+        return
+    INICIALIZADO = True
+    _formato()
+    if r.get(CLAVE_VERSION_INDICES) != VERSION_INDICES and r.exists('libro:next_id'):
+        print(f"Indexando libros existentes... {reconstruir_indices()} libros indexados.")
 
 # --- Interfaz de Usuario (CLI) ---
 
@@ -125,7 +403,8 @@ def mostrar_menu():
     print("3. Eliminar libro existente")
     print("4. Ver listado de libros")
     print("5. Buscar libros")
-    print("6. Salir")
+    print("6. Filtrar por estado de lectura")
+    print("7. Salir")
     return input("Selecciona una opción: ")
 
 def obtener_datos_libro():
@@ -174,13 +453,14 @@ def manejar_opcion(opcion):
 
     elif opcion == '4':
         print("\n--- Listado de Libros ---")
-        libros = obtener_todos_los_libros()
-        if libros:
-            for libro in libros:
-                print("-" * 25)
-                mostrar_libro(libro)
+        total = 0
+        for libro in iterar_libros():
+            print("-" * 25)
+            mostrar_libro(libro)
+            total += 1
+        if total:
             print("-" * 25)
-            print(f"Total de libros: {len(libros)}")
+            print(f"Total de libros: {total}")
         else:
             print("No hay libros registrados.")
 
@@ -198,6 +478,19 @@ def manejar_opcion(opcion):
             print(f"\nNo se encontraron libros que coincidan con '{termino}'.")
 
     elif opcion == '6':
+        print("\n--- Filtrar por Estado ---")
+        estado = input("Estado de lectura (por ejemplo, 'Leído', 'Pendiente', 'En curso'): ")
+        libros_encontrados = buscar_por_estado(estado)
+        if libros_encontrados:
+            for libro in libros_encontrados:
+                print("-" * 25)
+                mostrar_libro(libro)
+            print("-" * 25)
+            print(f"Total de libros: {len(libros_encontrados)}")
+        else:
+            print(f"\nNo hay libros con estado '{estado}'.")
+
+    elif opcion == '7':
         print("Saliendo de la aplicación. ¡Adiós!")
         return False
     
@@ -206,9 +499,30 @@ def manejar_opcion(opcion):
     
     return True
 
+def ejecutar_opcion(opcion):
+    # Si KeyDB no responde (ya agotados los reintentos) se informa y se vuelve al menú:
+    # la conexión se reintenta sola en la siguiente operación.
+    try:
+        inicializar()
+        return manejar_opcion(opcion)
+    except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+        print(f"\nERROR: No se pudo conectar a KeyDB. Asegúrate de que KeyDB esté corriendo. ({e})")
+        return opcion != '7'
+
 # --- Bucle Principal ---
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "migrar":
+        # python Actividad5.py migrar -> convierte los libros JSON a HASH (con la aplicación detenida)
+        inicializar()
+        print(f"Libros migrados a HASH: {migrar_a_hash()}")
+        sys.exit(0)
+
+    if esta_disponible(r):
+        print("Conexión a KeyDB establecida con éxito.")
+    else:
+        print("ADVERTENCIA: KeyDB no responde por ahora; se reintentará en cada operación.")
+
     ejecutando = True
     while ejecutando:
-        ejecutando = manejar_opcion(mostrar_menu())
\ No newline at end of file
+        ejecutando = ejecutar_opcion(mostrar_menu())
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""
+Benchmark de formatos de almacenamiento en KeyDB: libro como string JSON vs HASH.
+
+Mide el uso de memoria por libro (MEMORY USAGE) y la latencia por operación de:
+- escritura del libro completo (SET vs HSET),
+- lectura del libro completo (GET + json.loads vs HMGET),
+- actualización de un campo (GET + loads + dumps + SET vs HSET de un solo campo).
+
+Usa claves propias (bench:json:* y bench:hash:*) que se borran al terminar:
+    python benchmark_formato.py --libros 5000
+"""
+import argparse
+import json
+import os
+import time
+
+import redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CAMPOS_LIBRO = ("id", "titulo", "autor", "genero", "estado")
+
+
+def libro_de_prueba(i):
+    return {
+        "id": i,
+        "titulo": f"Título de prueba número {i}",
+        "autor": f"Autor {i % 500}",
+        "genero": ["Novela", "Ensayo", "Poesía", "Cuento"][i % 4],
+        "estado": ["Pendiente", "En curso", "Leído"][i % 3],
+    }
+
+
+def medir(nombre, cantidad, operacion):
+    inicio = time.perf_counter()
+    for i in range(1, cantidad + 1):
+        operacion(i)
+    duracion = time.perf_counter() - inicio
+    print(f"  {nombre:<34} {duracion / cantidad * 1e6:8.1f} µs/op")
+
+
+def memoria_promedio(r, prefijo, cantidad, muestras=200):
+    paso = max(1, cantidad // muestras)
+    usos = [r.memory_usage(f"{prefijo}{i}") or 0 for i in range(1, cantidad + 1, paso)]
+    return sum(usos) / len(usos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara memoria y latencia de libros JSON vs HASH en KeyDB.")
+    parser.add_argument("--libros", type=int, default=5000)
+    args = parser.parse_args()
+    n = args.libros
+
+    r = redis.Redis(
+        host=os.getenv("KEYDB_HOST", "localhost"),
+        port=int(os.getenv("KEYDB_PORT", 6379)),
+        password=os.getenv("KEYDB_PASSWORD"),
+        decode_responses=True,
+    )
+    r.ping()
+
+    def actualizar_json(i):
+        clave = f"bench:json:{i}"
+        libro = json.loads(r.get(clave))
+        libro["estado"] = "Leído"
+        r.set(clave, json.dumps(libro))
+
+    print(f"\n--- Benchmark JSON vs HASH ({n} libros) ---")
+    print("JSON (string por libro):")
+    medir("escritura (SET)", n, lambda i: r.set(f"bench:json:{i}", json.dumps(libro_de_prueba(i))))
+    medir("lectura (GET + loads)", n, lambda i: json.loads(r.get(f"bench:json:{i}")))
+    medir("actualizar 1 campo (GET+SET)", n, actualizar_json)
+    memoria_json = memoria_promedio(r, "bench:json:", n)
+
+    print("HASH (campos por libro):")
+    medir("escritura (HSET)", n, lambda i: r.hset(f"bench:hash:{i}", mapping=libro_de_prueba(i)))
+    medir("lectura (HMGET)", n, lambda i: r.hmget(f"bench:hash:{i}", CAMPOS_LIBRO))
+    medir("actualizar 1 campo (HSET)", n, lambda i: r.hset(f"bench:hash:{i}", "estado", "Leído"))
+    memoria_hash = memoria_promedio(r, "bench:hash:", n)
+
+    print("Memoria promedio por libro (MEMORY USAGE):")
+    print(f"  JSON: {memoria_json:.0f} bytes | HASH: {memoria_hash:.0f} bytes")
+    print("-------------------------------------------")
+
+    # Limpieza de las claves del benchmark
+    for prefijo in ("bench:json:", "bench:hash:"):
+        claves = list(r.scan_iter(match=f"{prefijo}*", count=1000))
+        for i in range(0, len(claves), 1000):
+            r.delete(*claves[i:i + 1000])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Conexión a KeyDB: pool de conexiones compartido, reintentos con backoff y cliente asyncio.
+
+- El cliente se crea sin conectarse (perezoso): la primera operación abre la conexión, así
+  importar el módulo no falla si KeyDB está caído y la aplicación se recupera cuando vuelve.
+- Las operaciones que fallan por conexión o timeout se reintentan con backoff exponencial
+  (KEYDB_REINTENTOS veces); las conexiones que estuvieron inactivas más de
+  KEYDB_HEALTH_CHECK segundos se verifican con un PING antes de usarse.
+- `obtener_cliente_async()` devuelve el equivalente con redis.asyncio.
+
+Variables de entorno (todas opcionales):
+    KEYDB_HOST, KEYDB_PORT, KEYDB_PASSWORD, KEYDB_DB
+    KEYDB_MAX_CONEXIONES      (50)   tamaño máximo del pool
+    KEYDB_TIMEOUT             (5)    segundos por operación
+    KEYDB_TIMEOUT_CONEXION    (2)    segundos para abrir una conexión
+    KEYDB_HEALTH_CHECK        (30)   segundos de inactividad antes de verificar la conexión
+    KEYDB_REINTENTOS          (3)
+    KEYDB_BACKOFF_BASE        (0.05) segundos de la primera espera
+    KEYDB_BACKOFF_MAX         (2)    tope de la espera entre reintentos
+"""
+import os
+
+import redis
+import redis.asyncio
+from redis.asyncio.retry import Retry as RetryAsync
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+from redis.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ERRORES_REINTENTABLES = [ConnectionError, TimeoutError]
+
+
+def configuracion():
+    """Parámetros de conexión tomados del entorno."""
+    return {
+        "host": os.getenv("KEYDB_HOST", "localhost"),
+        "port": int(os.getenv("KEYDB_PORT", 6379)),
+        "password": os.getenv("KEYDB_PASSWORD"),  # None si no está definida
+        "db": int(os.getenv("KEYDB_DB", 0)),
+        "max_connections": int(os.getenv("KEYDB_MAX_CONEXIONES", 50)),
+        "socket_timeout": float(os.getenv("KEYDB_TIMEOUT", 5)),
+        "socket_connect_timeout": float(os.getenv("KEYDB_TIMEOUT_CONEXION", 2)),
+        "health_check_interval": int(os.getenv("KEYDB_HEALTH_CHECK", 30)),
+        "reintentos": int(os.getenv("KEYDB_REINTENTOS", 3)),
+        "backoff_base": float(os.getenv("KEYDB_BACKOFF_BASE", 0.05)),
+        "backoff_max": float(os.getenv("KEYDB_BACKOFF_MAX", 2)),
+    }
+
+
+def _argumentos_pool(config, clase_retry):
+    config = dict(config)
+    backoff = ExponentialBackoff(cap=config.pop("backoff_max"), base=config.pop("backoff_base"))
+    retry = clase_retry(backoff, config.pop("reintentos"))
+    return {
+        **config,
+        "retry": retry,
+        "retry_on_error": ERRORES_REINTENTABLES,
+        "socket_keepalive": True,
+        "decode_responses": True,  # Decodifica las respuestas a string de Python automáticamente
+    }
+
+
+def crear_pool(**cambios):
+    """Pool de conexiones (sync) con la configuración del entorno; `cambios` pisa cualquier parámetro."""
+    return redis.ConnectionPool(**_argumentos_pool({**configuracion(), **cambios}, Retry))
+
+
+def crear_pool_async(**cambios):
+    return redis.asyncio.ConnectionPool(**_argumentos_pool({**configuracion(), **cambios}, RetryAsync))
+
+
+_pool = None
+_cliente = None
+
+
+def obtener_cliente():
+    """Cliente compartido por todo el proceso (se crea en el primer uso, sin conectarse todavía)."""
+    global _pool, _cliente
+    if _cliente is None:
+        _pool = crear_pool()
+        _cliente = redis.Redis(connection_pool=_pool)
+    return _cliente
+
+
+def obtener_cliente_async():
+    # El pool asyncio queda ligado al event loop en el que se usa: se crea uno por llamada
+    # y quien lo pide es responsable de cerrarlo (await cliente.aclose(), que cierra también el pool).
+    return redis.asyncio.Redis.from_pool(crear_pool_async())
+
+
+def esta_disponible(cliente=None):
+    """True si KeyDB responde al PING (después de los reintentos configurados)."""
+    try:
+        return bool((cliente or obtener_cliente()).ping())
+    except (ConnectionError, TimeoutError):
+        return False
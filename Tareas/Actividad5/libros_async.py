@@ -0,0 +1,215 @@
+"""
+Versión asyncio (redis.asyncio) de las operaciones CRUD de la biblioteca en KeyDB.
+
+Usa las mismas claves, índices y scripts Lua que Actividad5.py, así ambas versiones pueden
+trabajar sobre la misma base. Cada función recibe el cliente asíncrono a usar:
+
+    cliente = obtener_cliente_async()        # pool asyncio con reintentos (conexion.py)
+    libro_id = await agregar_libro(cliente, "Rayuela", "Cortázar", "Novela", "Pendiente")
+    ...
+    await cliente.aclose()
+
+Para probarlo sin servidor, con fakeredis (necesita el extra [lua] para los scripts):
+    python libros_async.py --fakeredis
+"""
+import argparse
+import asyncio
+import json
+import uuid
+import weakref
+
+import redis
+
+from Actividad5 import (
+    CAMPOS_BUSQUEDA, CAMPOS_LIBRO, CLAVE_FORMATO, CLAVE_INDICE_IDS, LUA_ACTUALIZAR, LUA_AGREGAR,
+    TAMANO_LOTE, clave_indice_estado, claves_indices, formato_configurado, libro_desde_hash, palabras,
+)
+from conexion import obtener_cliente_async
+
+# Formato detectado por cliente ("hash" | "json"); la entrada se va con el cliente
+_formatos = weakref.WeakKeyDictionary()
+
+
+async def formato_de(cliente):
+    """Mismo criterio que detectar_formato() de Actividad5 (KEYDB_FORMATO primero), resuelto una vez por cliente."""
+    formato = _formatos.get(cliente)
+    if formato is None:
+        formato = formato_configurado() or await cliente.get(CLAVE_FORMATO)
+        if not formato:
+            if await cliente.exists('libro:next_id'):
+                formato = "json"
+            else:
+                await cliente.setnx(CLAVE_FORMATO, "hash")
+                formato = await cliente.get(CLAVE_FORMATO)
+        _formatos[cliente] = formato
+    return formato
+
+
+async def leer_libro(cliente, clave, formato):
+    if formato == "hash":
+        return libro_desde_hash(await cliente.hmget(clave, CAMPOS_LIBRO))
+    libro_json = await cliente.get(clave)
+    return json.loads(libro_json) if libro_json else None
+
+
+async def agregar_libro(cliente, titulo, autor, genero, estado):
+    """Devuelve el id asignado al libro."""
+    libro = {"titulo": titulo, "autor": autor, "genero": genero, "estado": estado}
+    script = cliente.register_script(LUA_AGREGAR)
+    return await script(
+        keys=['libro:next_id', CLAVE_INDICE_IDS, *claves_indices(libro)],
+        args=[await formato_de(cliente), "libro:", titulo, autor, genero, estado]
+    )
+
+
+async def obtener_libro_por_id(cliente, libro_id):
+    return await leer_libro(cliente, f"libro:{libro_id}", await formato_de(cliente))
+
+
+async def obtener_libros_por_ids(cliente, ids):
+    """Trae varios libros en una sola ida y vuelta (MGET o HMGET en pipeline), en el orden de `ids`."""
+    if not ids:
+        return []
+    claves = [f"libro:{i}" for i in ids]
+    if await formato_de(cliente) == "hash":
+        async with cliente.pipeline(transaction=False) as pipe:
+            for clave in claves:
+                pipe.hmget(clave, CAMPOS_LIBRO)
+            respuestas = await pipe.execute()
+        return [libro for libro in map(libro_desde_hash, respuestas) if libro]
+    return [json.loads(libro_json) for libro_json in await cliente.mget(claves) if libro_json]
+
+
+async def actualizar_campos(cliente, libro_id, version_esperada=None, **cambios):
+    """Igual que actualizar_campos() de Actividad5: devuelve (resultado, libro)."""
+    formato = await formato_de(cliente)
+    script = cliente.register_script(LUA_ACTUALIZAR)
+    clave = f"libro:{libro_id}"
+    while True:
+        libro = await leer_libro(cliente, clave, formato)
+        if not libro:
+            return "no_encontrado", None
+        # Los libros guardados antes de versionar no tienen "version": cuentan como 0
+        version = libro.get("version", 0)
+        if version_esperada is not None and version != version_esperada:
+            return "conflicto", libro
+
+        modificados = {campo: valor for campo, valor in cambios.items() if libro.get(campo) != valor}
+        nuevo = {**libro, **modificados, "version": version + 1}
+        indices_anteriores = claves_indices(libro)
+        indices_nuevos = claves_indices(nuevo)
+        quitar = indices_anteriores - indices_nuevos
+        agregar = indices_nuevos - indices_anteriores
+
+        if formato == "hash":
+            datos = [valor for par in modificados.items() for valor in par]
+        else:
+            datos = [json.dumps(nuevo)]
+        resultado = await script(
+            keys=[clave, *quitar, *agregar],
+            args=[formato, version, len(quitar), libro_id, *datos]
+        )
+        if resultado == -1:
+            return "no_encontrado", None
+        if resultado > 0:
+            return "ok", nuevo
+        if version_esperada is not None:
+            return "conflicto", await leer_libro(cliente, clave, formato)
+
+
+async def eliminar_libro(cliente, libro_id):
+    """Devuelve True si el libro existía y se eliminó."""
+    formato = await formato_de(cliente)
+    clave = f"libro:{libro_id}"
+    async with cliente.pipeline() as pipe:
+        while True:
+            try:
+                await pipe.watch(clave)
+                libro = await leer_libro(pipe, clave, formato)
+                if not libro:
+                    await pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.delete(clave)
+                pipe.zrem(CLAVE_INDICE_IDS, libro_id)
+                for clave_indice in claves_indices(libro):
+                    pipe.srem(clave_indice, libro_id)
+                await pipe.execute()
+                return True
+            except redis.WatchError:
+                continue
+
+
+async def obtener_pagina_libros(cliente, despues_de=0, tamano=TAMANO_LOTE):
+    """Devuelve (libros, siguiente), igual que obtener_pagina_libros() de Actividad5."""
+    ids = await cliente.zrangebyscore(CLAVE_INDICE_IDS, f"({despues_de}", "+inf", start=0, num=tamano)
+    if not ids:
+        return [], None
+    libros = await obtener_libros_por_ids(cliente, ids)
+    siguiente = int(ids[-1]) if len(ids) == tamano else None
+    return libros, siguiente
+
+
+async def iterar_libros(cliente, tamano_lote=TAMANO_LOTE):
+    cursor = 0
+    while cursor is not None:
+        libros, cursor = await obtener_pagina_libros(cliente, cursor, tamano_lote)
+        for libro in libros:
+            yield libro
+
+
+async def buscar_ids(cliente, termino):
+    grupos = [[f"libro:idx:{campo}:{palabra}" for campo in CAMPOS_BUSQUEDA] for palabra in palabras(termino)]
+    if not grupos:
+        return []
+    if len(grupos) == 1:
+        ids = await cliente.sunion(grupos[0])
+    else:
+        temporales = [f"libro:tmp:{uuid.uuid4().hex}" for _ in grupos]
+        async with cliente.pipeline() as pipe:
+            for temporal, grupo in zip(temporales, grupos):
+                pipe.sunionstore(temporal, grupo)
+            pipe.sinter(temporales)
+            pipe.delete(*temporales)
+            ids = (await pipe.execute())[-2]
+    return sorted(int(libro_id) for libro_id in ids)
+
+
+async def buscar_libros(cliente, termino):
+    return await obtener_libros_por_ids(cliente, await buscar_ids(cliente, termino))
+
+
+async def buscar_por_estado(cliente, estado):
+    ids = sorted(int(libro_id) for libro_id in await cliente.smembers(clave_indice_estado(estado)))
+    return await obtener_libros_por_ids(cliente, ids)
+
+
+async def demostracion(cliente):
+    """Recorre todas las operaciones sobre el cliente dado (útil para probar contra fakeredis)."""
+    libro_id = await agregar_libro(cliente, "Rayuela", "Julio Cortázar", "Novela", "Pendiente")
+    print(f"Agregado: {await obtener_libro_por_id(cliente, libro_id)}")
+    print(f"Actualizar: {(await actualizar_campos(cliente, libro_id, estado='Leído'))[0]}")
+    print(f"Buscar 'cort': {[libro['titulo'] for libro in await buscar_libros(cliente, 'cort')]}")
+    print(f"Estado 'leido': {[libro['titulo'] for libro in await buscar_por_estado(cliente, 'Leído')]}")
+    print(f"Listado: {[libro['titulo'] async for libro in iterar_libros(cliente)]}")
+    print(f"Eliminar: {await eliminar_libro(cliente, libro_id)}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Ejecuta el CRUD asíncrono contra KeyDB o fakeredis.")
+    parser.add_argument("--fakeredis", action="store_true", help="Usar fakeredis en memoria en lugar de KeyDB")
+    args = parser.parse_args()
+
+    if args.fakeredis:
+        import fakeredis
+        cliente = fakeredis.FakeAsyncRedis(decode_responses=True)
+    else:
+        cliente = obtener_cliente_async()
+    try:
+        await demostracion(cliente)
+    finally:
+        await cliente.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,131 +1,647 @@
 import redis
+import bisect
 import json
 import os
-from dotenv import load_dotenv
-from flask import Flask, render_template_string, request, redirect, url_for
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+from conexion import obtener_cliente
+from flask import Flask, Response, request, redirect, stream_with_context, url_for
+from markupsafe import Markup, escape
 
 
-load_dotenv()
-
-KEYDB_HOST = os.getenv("KEYDB_HOST", "localhost")
-KEYDB_PORT = int(os.getenv("KEYDB_PORT", 6379))
-KEYDB_PASSWORD = os.getenv("KEYDB_PASSWORD")
 KEYDB_PREFIX = "libro:"
 
-try:
-    r = redis.Redis(
-        host=KEYDB_HOST,
-        port=KEYDB_PORT,
-        password=KEYDB_PASSWORD,
-        decode_responses=True,
-        socket_timeout=5
-    )
-    r.ping()
-    print(f"INFO: Conexión a KeyDB establecida en {KEYDB_HOST}:{KEYDB_PORT}")
-except redis.exceptions.ConnectionError as e:
-    print(f"ERROR: No se pudo conectar a KeyDB. Asegúrate de que KeyDB esté corriendo. {e}")
-    r = None # Establecer r como None si la conexión falla
+# Cliente del pool de conexiones compartido (ver conexion.py): se conecta en el primer uso y
+# reintenta con backoff, así la aplicación se recupera sola si KeyDB se reinicia.
+r = obtener_cliente()
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.urandom(24) # Necesario para sesiones/mensajes flash si se usan
 
 
 
-def generar_id_unico():
-    if r is None: return None
-    # Incrementa un contador global
-    return r.incr(f'{KEYDB_PREFIX}next_id')
+# Índice ordenado de ids (sorted set, score = id): permite listar en orden y por páginas
+# sin recorrer todo el keyspace con KEYS ni ordenar en Python.
+CLAVE_INDICE_IDS = f"{KEYDB_PREFIX}ids"
+TAMANO_LOTE = 500
+
+# Paginación por cursor de las páginas web: cada página trae los `tamano` libros con id mayor
+# al cursor `despues`, así el tiempo de respuesta depende del tamaño de página y no de la biblioteca.
+TAMANO_PAGINA = int(os.getenv("TAMANO_PAGINA", 50))
+TAMANO_PAGINA_MAX = 200
+
+# Índices secundarios para la búsqueda: un set de ids por cada palabra (y sus prefijos) de
+# titulo/autor/genero, más un set por estado. Se mantienen en la misma transacción que el libro.
+CAMPOS_BUSQUEDA = ("titulo", "autor", "genero")
+LARGO_MIN_PREFIJO = 2
+CLAVE_VERSION_INDICES = f"{KEYDB_PREFIX}indices_version"
+VERSION_INDICES = "2"
+
+# Formato de almacenamiento de cada libro:
+# - "hash": un HASH por libro (HSET/HMGET); permite leer y actualizar campos sueltos
+# - "json": un string JSON por libro (formato original; cada cambio reescribe el libro entero)
+# Se toma de KEYDB_FORMATO o, si no está definida, del formato registrado en KeyDB. Una base
+# nueva usa "hash"; una base con libros JSON sigue en "json" hasta ejecutar `flask --app Actividad6 migrar-hash`.
+CLAVE_FORMATO = f"{KEYDB_PREFIX}formato"
+CAMPOS_LIBRO = ("id", "titulo", "autor", "genero", "estado", "version")
+
+def detectar_formato():
+    formato = os.getenv("KEYDB_FORMATO") or r.get(CLAVE_FORMATO)
+    if formato: return formato
+    if r.exists(f'{KEYDB_PREFIX}next_id'): return "json"
+    r.setnx(CLAVE_FORMATO, "hash")
+    return r.get(CLAVE_FORMATO)
+
+FORMATO = None  # Se detecta en inicializar_keydb(), con la primera operación que usa KeyDB (ver _formato())
+
+def _formato():
+    """Formato de la base; la primera vez detecta el formato e indexa los datos viejos (inicializar_keydb)."""
+    if FORMATO is None:
+        inicializar_keydb()
+    return FORMATO
+
+def libro_desde_hash(valores):
+    """Convierte la respuesta de HMGET (en el orden de CAMPOS_LIBRO) en un libro, o None si no existe."""
+    if not valores or valores[0] is None: return None
+    libro = dict(zip(CAMPOS_LIBRO, valores))
+    libro["id"] = int(libro["id"])
+    libro["version"] = int(libro["version"] or 0)
+    return libro
+
+def leer_libro(cliente, clave):
+    # `cliente` puede ser la conexión o un pipeline en modo WATCH (ejecuta al instante)
+    if _formato() == "hash":
+        return libro_desde_hash(cliente.hmget(clave, CAMPOS_LIBRO))
+    libro_json = cliente.get(clave)
+    return json.loads(libro_json) if libro_json else None
+
+def normalizar_texto(texto):
+    # Minúsculas y sin tildes, para que "García" y "garcia" coincidan
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+def palabras(texto):
+    return re.findall(r"\w+", normalizar_texto(texto))
+
+def prefijos(texto):
+    """Cada palabra y sus prefijos desde LARGO_MIN_PREFIJO letras (permite buscar por el comienzo de las palabras)."""
+    resultado = set()
+    for palabra in palabras(texto):
+        resultado.add(palabra)
+        for largo in range(LARGO_MIN_PREFIJO, len(palabra)):
+            resultado.add(palabra[:largo])
+    return resultado
+
+def clave_indice_estado(estado):
+    return f"{KEYDB_PREFIX}idx:estado:{normalizar_texto(estado).strip()}"
+
+def claves_indices(libro):
+    """Claves de los sets de índice en los que debe figurar el libro."""
+    claves = {f"{KEYDB_PREFIX}idx:{campo}:{p}" for campo in CAMPOS_BUSQUEDA for p in prefijos(libro[campo])}
+    claves.add(clave_indice_estado(libro["estado"]))
+    return claves
+
+def reconstruir_indices(count=TAMANO_LOTE):
+    """
+    Recorre las claves de libros con SCAN (sin bloquear el servidor como KEYS) y las agrega al
+    índice de ids y a los índices de búsqueda. Sirve para migrar datos guardados antes de que
+    existieran los índices.
+    """
+    agregados = 0
+    claves = []
+
+    def indexar_lote(claves):
+        pipe = r.pipeline(transaction=False)
+        for libro in obtener_libros_por_ids([clave[len(KEYDB_PREFIX):] for clave in claves]):
+            pipe.zadd(CLAVE_INDICE_IDS, {libro["id"]: libro["id"]})
+            for clave_indice in claves_indices(libro):
+                pipe.sadd(clave_indice, libro["id"])
+        pipe.execute()
+
+    for clave in r.scan_iter(match=f"{KEYDB_PREFIX}[0-9]*", count=count):
+        claves.append(clave)
+        agregados += 1
+        if len(claves) >= count:
+            indexar_lote(claves)
+            claves = []
+    if claves:
+        indexar_lote(claves)
+    r.set(CLAVE_VERSION_INDICES, VERSION_INDICES)
+    return agregados
+
+# --- Scripts Lua: escrituras atómicas en una sola ida y vuelta ---
+
+# Alta: asigna el id (INCR), guarda el libro y lo agrega a todos sus índices.
+# KEYS: contador de ids, índice de ids, índices de búsqueda del libro...
+# ARGV: formato, prefijo de las claves, titulo, autor, genero, estado
+LUA_AGREGAR = """
+local id = redis.call('INCR', KEYS[1])
+local clave = ARGV[2] .. id
+if ARGV[1] == 'hash' then
+    redis.call('HSET', clave, 'id', id, 'titulo', ARGV[3], 'autor', ARGV[4], 'genero', ARGV[5], 'estado', ARGV[6], 'version', 1)
+else
+    redis.call('SET', clave, cjson.encode({id = id, titulo = ARGV[3], autor = ARGV[4], genero = ARGV[5], estado = ARGV[6], version = 1}))
+end
+redis.call('ZADD', KEYS[2], id, id)
+for i = 3, #KEYS do
+    redis.call('SADD', KEYS[i], id)
+end
+return id
+"""
 
-def obtener_todos_los_libros():
-    if r is None: return []
-    # Usar el patrón KEYDB_PREFIX más un patrón numérico para evitar el contador
-    claves = r.keys(f"{KEYDB_PREFIX}[0-9]*")
-    libros = []
-    if not claves: return libros
+# Modificación con control optimista: solo se aplica si la versión guardada es la que se leyó.
+# KEYS: clave del libro, índices a quitar..., índices a agregar...
+# ARGV: formato, versión leída, cantidad de índices a quitar, id, y luego
+#       "hash": pares campo/valor modificados | "json": el libro completo ya serializado
+# Devuelve la nueva versión, 0 si hubo conflicto de versión o -1 si el libro no existe.
+LUA_ACTUALIZAR = """
+local clave = KEYS[1]
+local version
+if ARGV[1] == 'hash' then
+    if redis.call('EXISTS', clave) == 0 then return -1 end
+    version = redis.call('HGET', clave, 'version') or '0'
+else
+    local actual = redis.call('GET', clave)
+    if not actual then return -1 end
+    version = tostring(cjson.decode(actual)['version'] or 0)
+end
+if version ~= ARGV[2] then return 0 end
+
+local nueva_version = tonumber(version) + 1
+if ARGV[1] == 'hash' then
+    for i = 5, #ARGV, 2 do
+        redis.call('HSET', clave, ARGV[i], ARGV[i + 1])
+    end
+    redis.call('HSET', clave, 'version', nueva_version)
+else
+    redis.call('SET', clave, ARGV[5])
+end
+
+local quitar = tonumber(ARGV[3])
+for i = 2, quitar + 1 do
+    redis.call('SREM', KEYS[i], ARGV[4])
+end
+for i = quitar + 2, #KEYS do
+    redis.call('SADD', KEYS[i], ARGV[4])
+end
+return nueva_version
+"""
 
+script_agregar = r.register_script(LUA_AGREGAR)
+script_actualizar = r.register_script(LUA_ACTUALIZAR)
+
+# --- Caché cercana (near cache) en memoria del proceso ---
+
+# Cada proceso de la aplicación guarda en memoria los últimos libros leídos (LRU acotado) y los
+# resultados de listados/búsquedas (listas de ids). Toda escritura publica el id del libro en
+# CANAL_INVALIDACIONES; un hilo suscriptor en cada proceso descarta ese libro y los listados, así
+# las recargas de la página se sirven desde memoria sin dejar de ver los cambios de otros procesos.
+# Si se pierde la suscripción la caché se desactiva (y se vacía) hasta volver a suscribirse.
+CANAL_INVALIDACIONES = f"{KEYDB_PREFIX}invalidaciones"
+CACHE_ACTIVA = os.getenv("CACHE_CERCANA", "1") != "0"
+CACHE_MAX_LIBROS = int(os.getenv("CACHE_MAX_LIBROS", 10000))
+CACHE_MAX_LISTAS = int(os.getenv("CACHE_MAX_LISTAS", 256))
+
+class CacheCercana:
+    def __init__(self, max_libros=CACHE_MAX_LIBROS, max_listas=CACHE_MAX_LISTAS):
+        self.max_libros = max_libros
+        self.max_listas = max_listas
+        self.libros = OrderedDict()
+        self.listas = OrderedDict()
+        # Tarjeta HTML ya renderizada de cada libro: id -> (versión, html)
+        self.fragmentos = OrderedDict()
+        self.lock = threading.Lock()
+        self.suscrita = False
+        # Se incrementa en cada invalidación: un valor leído de KeyDB solo se guarda si no hubo
+        # invalidaciones mientras se leía (si no, podría quedar guardado un dato viejo)
+        self.generacion = 0
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _obtener(self, tabla, clave):
+        with self.lock:
+            if not self.suscrita or clave not in tabla:
+                self.fallos += 1
+                return None
+            tabla.move_to_end(clave)
+            self.aciertos += 1
+            return tabla[clave]
+
+    def _guardar(self, tabla, maximo, clave, valor, generacion):
+        with self.lock:
+            if not self.suscrita or generacion != self.generacion: return
+            tabla[clave] = valor
+            tabla.move_to_end(clave)
+            while len(tabla) > maximo:
+                tabla.popitem(last=False)
+
+    def obtener_libro(self, libro_id):
+        libro = self._obtener(self.libros, int(libro_id))
+        return dict(libro) if libro else None
+
+    def guardar_libro(self, libro, generacion):
+        self._guardar(self.libros, self.max_libros, int(libro["id"]), dict(libro), generacion)
+
+    def obtener_lista(self, clave):
+        return self._obtener(self.listas, clave)
+
+    def guardar_lista(self, clave, ids, generacion):
+        self._guardar(self.listas, self.max_listas, clave, list(ids), generacion)
+
+    def obtener_total(self):
+        return self._obtener(self.listas, "total")
+
+    def guardar_total(self, total, generacion):
+        self._guardar(self.listas, self.max_listas, "total", total, generacion)
+
+    def obtener_fragmento(self, libro):
+        # El fragmento vale mientras la versión del libro sea la misma con la que se renderizó,
+        # por eso (a diferencia de los datos) se puede usar aunque no haya suscripción
+        with self.lock:
+            guardado = self.fragmentos.get(libro["id"])
+            if guardado is None or guardado[0] != libro.get("version", 0): return None
+            self.fragmentos.move_to_end(libro["id"])
+            return guardado[1]
+
+    def guardar_fragmento(self, libro, html):
+        with self.lock:
+            self.fragmentos[libro["id"]] = (libro.get("version", 0), html)
+            self.fragmentos.move_to_end(libro["id"])
+            while len(self.fragmentos) > self.max_libros:
+                self.fragmentos.popitem(last=False)
+
+    def invalidar(self, libro_id=None):
+        """Descarta el libro indicado ("*": todos), su tarjeta y todos los listados, que pueden incluirlo."""
+        with self.lock:
+            self.generacion += 1
+            if libro_id == "*":
+                self.libros.clear()
+                self.fragmentos.clear()
+            elif libro_id:
+                self.libros.pop(int(libro_id), None)
+                self.fragmentos.pop(int(libro_id), None)
+            self.listas.clear()
+
+    def vaciar(self, suscrita):
+        with self.lock:
+            self.generacion += 1
+            self.libros.clear()
+            self.listas.clear()
+            self.suscrita = suscrita
+
+    def estadisticas(self):
+        with self.lock:
+            total = self.aciertos + self.fallos
+            return {
+                "libros": len(self.libros),
+                "listas": len(self.listas),
+                "fragmentos": len(self.fragmentos),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": self.aciertos / total if total else 0.0,
+                "suscrita": self.suscrita,
+            }
+
+cache = CacheCercana()
+_suscriptor = {"pid": None}
+
+def escuchar_invalidaciones():
+    """Hilo suscriptor: aplica las invalidaciones publicadas por cualquier proceso."""
+    while True:
+        pubsub = r.pubsub()
+        try:
+            pubsub.subscribe(CANAL_INVALIDACIONES)
+            while True:
+                # get_message con timeout (y no listen) para que un canal sin mensajes no
+                # dispare el timeout de lectura del pool; también verifica la conexión (health check)
+                mensaje = pubsub.get_message(timeout=1.0)
+                if mensaje is None: continue
+                if mensaje["type"] == "subscribe":
+                    # Recién suscritos: se descarta lo que pudo cambiar mientras no se escuchaba
+                    cache.vaciar(suscrita=True)
+                elif mensaje["type"] == "message":
+                    cache.invalidar(mensaje["data"])
+        except Exception as e:
+            print(f"ERROR en la suscripción de invalidaciones, se reintenta: {e}")
+        finally:
+            cache.vaciar(suscrita=False)
+            pubsub.close()
+        time.sleep(1)
+
+def iniciar_suscriptor():
+    # Un hilo por proceso (se comprueba el pid porque los hilos no sobreviven a un fork de los workers)
+    if not CACHE_ACTIVA or _suscriptor["pid"] == os.getpid(): return
+    _suscriptor["pid"] = os.getpid()
+    cache.vaciar(suscrita=False)
+    threading.Thread(target=escuchar_invalidaciones, name="invalidaciones-libros", daemon=True).start()
+
+def publicar_invalidacion(libro_id):
+    # La caché propia se invalida al instante; las de los demás procesos, al recibir el mensaje
+    cache.invalidar(libro_id)
     try:
-        libros_json = r.mget(claves)
-        for libro_json in libros_json:
-            if libro_json:
-                libros.append(json.loads(libro_json))
+        r.publish(CANAL_INVALIDACIONES, libro_id)
+    except Exception as e:
+        print(f"ERROR al publicar la invalidación del libro {libro_id}: {e}")
+
+@app.before_request
+def preparar_keydb():
+    # Sin operaciones en KeyDB: las páginas que no leen datos (p. ej. el formulario de alta) se
+    # muestran aunque KeyDB esté caído; el formato se detecta con la primera operación (_formato())
+    iniciar_suscriptor()
+
+def obtener_libros_por_ids(ids):
+    """Trae varios libros en una sola ida y vuelta (MGET o HMGET en pipeline), en el orden de `ids`."""
+    if not ids: return []
+    # Los que están en la caché cercana no viajan; el resto se pide a KeyDB en un solo lote
+    encontrados = {int(libro_id): cache.obtener_libro(libro_id) for libro_id in ids}
+    faltantes = [libro_id for libro_id, libro in encontrados.items() if libro is None]
+    if faltantes:
+        generacion = cache.generacion
+        claves = [f"{KEYDB_PREFIX}{libro_id}" for libro_id in faltantes]
+        if _formato() == "hash":
+            pipe = r.pipeline(transaction=False)
+            for clave in claves:
+                pipe.hmget(clave, CAMPOS_LIBRO)
+            leidos = map(libro_desde_hash, pipe.execute())
+        else:
+            leidos = (json.loads(libro_json) if libro_json else None for libro_json in r.mget(claves))
+        for libro_id, libro in zip(faltantes, leidos):
+            encontrados[libro_id] = libro
+            if libro: cache.guardar_libro(libro, generacion)
+    return [encontrados[int(libro_id)] for libro_id in ids if encontrados[int(libro_id)]]
+
+def obtener_pagina_libros(despues_de=0, tamano=TAMANO_LOTE):
+    """
+    Devuelve (libros, siguiente) con hasta `tamano` libros de id mayor a `despues_de`, en orden.
+    `siguiente` es el cursor para pedir la página siguiente, o None si no hay más.
+    """
+    clave_lista = ("pagina", despues_de, tamano)
+    ids = cache.obtener_lista(clave_lista)
+    if ids is None:
+        generacion = cache.generacion
+        ids = r.zrangebyscore(CLAVE_INDICE_IDS, f"({despues_de}", "+inf", start=0, num=tamano)
+        cache.guardar_lista(clave_lista, ids, generacion)
+    if not ids: return [], None
+
+    # MGET trae los valores de todo el lote en una sola ida y vuelta
+    libros = obtener_libros_por_ids(ids)
+    siguiente = int(ids[-1]) if len(ids) == tamano else None
+    return libros, siguiente
+
+def iterar_libros(tamano_lote=TAMANO_LOTE):
+    """Genera los libros en orden de id, trayéndolos de a lotes (memoria acotada por el tamaño del lote)."""
+    cursor = 0
+    while cursor is not None:
+        libros, cursor = obtener_pagina_libros(cursor, tamano_lote)
+        yield from libros
+
+def iterar_libros_por_ids(ids, tamano_lote=TAMANO_LOTE):
+    """Genera los libros de `ids` trayéndolos de a lotes (para enviarlos mientras se leen)."""
+    for inicio in range(0, len(ids), tamano_lote):
+        yield from obtener_libros_por_ids(ids[inicio:inicio + tamano_lote])
+
+def obtener_todos_los_libros():
+    try:
+        return list(iterar_libros())
     except Exception as e:
         print(f"ERROR al obtener libros: {e}")
         return []
 
-    # Se ordena en Python ya que Redis no garantiza el orden con KEYS o SCAN
-    return sorted(libros, key=lambda l: int(l['id']))
-
 def obtener_libro_por_id(libro_id):
-    if r is None: return None
-    clave = f"{KEYDB_PREFIX}{libro_id}"
-    libro_json = r.get(clave)
-    if libro_json:
-        return json.loads(libro_json)
-    return None
+    libro = cache.obtener_libro(libro_id)
+    if libro is None:
+        generacion = cache.generacion
+        libro = leer_libro(r, f"{KEYDB_PREFIX}{libro_id}")
+        if libro: cache.guardar_libro(libro, generacion)
+    return libro
 
 def agregar_libro_db(titulo, autor, genero, estado):
-    if r is None: return False
     try:
-        libro_id = generar_id_unico()
-        if libro_id is None: return False
         libro = {
-            "id": libro_id,
             "titulo": titulo,
             "autor": autor,
             "genero": genero,
             "estado": estado
         }
-        clave = f"{KEYDB_PREFIX}{libro_id}"
-        r.set(clave, json.dumps(libro))
+        # Id (INCR), libro e índices en un único script atómico: una sola ida y vuelta
+        libro_id = script_agregar(
+            keys=[f'{KEYDB_PREFIX}next_id', CLAVE_INDICE_IDS, *claves_indices(libro)],
+            args=[_formato(), KEYDB_PREFIX, titulo, autor, genero, estado]
+        )
+        publicar_invalidacion(libro_id)
         return True
     except Exception as e:
         print(f"ERROR al agregar libro: {e}")
         return False
 
-def actualizar_libro_db(libro_id, titulo, autor, genero, estado):
-    if r is None: return False
-    libro = obtener_libro_por_id(libro_id)
-    if not libro: return False
-
+def actualizar_campos_db(libro_id, version_esperada=None, **cambios):
+    """
+    Actualiza solo los campos indicados con control de concurrencia optimista.
+    Devuelve (resultado, libro) con resultado "ok", "no_encontrado" o "conflicto".
+    - Con `version_esperada` (la versión que vio el usuario en el formulario), el cambio solo se
+      aplica si nadie modificó el libro desde entonces; si no, "conflicto" y el libro actual.
+    - Sin ella, se relee y se reintenta hasta aplicar el cambio sobre la última versión.
+    En formato "hash" se escriben únicamente los campos que cambian.
+    """
+    clave = f"{KEYDB_PREFIX}{libro_id}"
+    while True:
+        libro = obtener_libro_por_id(libro_id)
+        if not libro: return "no_encontrado", None
+        # Los libros guardados antes de versionar no tienen "version": cuentan como 0
+        version = libro.get("version", 0)
+        if version_esperada is not None and version != version_esperada:
+            return "conflicto", libro
+
+        modificados = {campo: valor for campo, valor in cambios.items() if libro.get(campo) != valor}
+        nuevo = {**libro, **modificados, "version": version + 1}
+        indices_anteriores = claves_indices(libro)
+        indices_nuevos = claves_indices(nuevo)
+        quitar = indices_anteriores - indices_nuevos
+        agregar = indices_nuevos - indices_anteriores
+
+        if _formato() == "hash":
+            datos = [valor for par in modificados.items() for valor in par]
+        else:
+            datos = [json.dumps(nuevo)]
+        # Escritura + versión + índices en un único script (una ida y vuelta)
+        resultado = script_actualizar(
+            keys=[clave, *quitar, *agregar],
+            args=[_formato(), version, len(quitar), libro_id, *datos]
+        )
+        # En todos los casos la copia en caché quedó vieja (o el libro ya no existe)
+        publicar_invalidacion(libro_id)
+        if resultado == -1: return "no_encontrado", None
+        if resultado > 0: return "ok", nuevo
+        if version_esperada is not None:
+            return "conflicto", obtener_libro_por_id(libro_id)
+        # Otro cliente escribió entre la lectura y el script: se reintenta con la versión nueva
+
+def actualizar_libro_db(libro_id, titulo, autor, genero, estado, version=None):
+    """Devuelve "ok", "no_encontrado", "conflicto" o "error"."""
     try:
-        libro["titulo"] = titulo
-        libro["autor"] = autor
-        libro["genero"] = genero
-        libro["estado"] = estado
-        
-        clave = f"{KEYDB_PREFIX}{libro_id}"
-        r.set(clave, json.dumps(libro))
-        return True
+        resultado, _ = actualizar_campos_db(libro_id, version, titulo=titulo, autor=autor, genero=genero, estado=estado)
+        return resultado
     except Exception as e:
         print(f"ERROR al actualizar libro: {e}")
-        return False
+        return "error"
 
 def eliminar_libro_db(libro_id):
-    if r is None: return False
     clave = f"{KEYDB_PREFIX}{libro_id}"
     try:
-        return r.delete(clave) == 1
+        with r.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(clave)
+                    libro = leer_libro(pipe, clave)
+                    if not libro: return False
+                    # El libro se borra junto con su id en todos los índices
+                    pipe.multi()
+                    pipe.delete(clave)
+                    pipe.zrem(CLAVE_INDICE_IDS, libro_id)
+                    for clave_indice in claves_indices(libro):
+                        pipe.srem(clave_indice, libro_id)
+                    pipe.execute()
+                    publicar_invalidacion(libro_id)
+                    return True
+                except redis.WatchError:
+                    continue
     except Exception as e:
         print(f"ERROR al eliminar libro: {e}")
         return False
 
+def buscar_ids_db(termino):
+    """
+    Ids de los libros que contienen todas las palabras del término (o palabras que empiezan así)
+    en titulo, autor o genero: SUNION de los tres campos por palabra y SINTER entre palabras.
+    """
+    grupos = [[f"{KEYDB_PREFIX}idx:{campo}:{palabra}" for campo in CAMPOS_BUSQUEDA] for palabra in palabras(termino)]
+    if not grupos: return []
+    clave_lista = ("buscar", *palabras(termino))
+    ids = cache.obtener_lista(clave_lista)
+    if ids is not None: return ids
+    generacion = cache.generacion
+    if len(grupos) == 1:
+        ids = r.sunion(grupos[0])
+    else:
+        # Uniones en claves temporales + intersección, todo en una transacción (una ida y vuelta)
+        temporales = [f"{KEYDB_PREFIX}tmp:{uuid.uuid4().hex}" for _ in grupos]
+        pipe = r.pipeline()
+        for temporal, grupo in zip(temporales, grupos):
+            pipe.sunionstore(temporal, grupo)
+        pipe.sinter(temporales)
+        pipe.delete(*temporales)
+        ids = pipe.execute()[-2]
+    ids = sorted(int(libro_id) for libro_id in ids)
+    cache.guardar_lista(clave_lista, ids, generacion)
+    return ids
+
 def buscar_libros_db(termino):
-    todos_los_libros = obtener_todos_los_libros()
-    if not todos_los_libros: return []
-
-    libros_encontrados = []
-    termino = termino.lower().strip()
-    if not termino: return todos_los_libros # Si la búsqueda está vacía, mostrar todos
-
-    for libro in todos_los_libros:
-        if (termino in libro['titulo'].lower() or
-            termino in libro['autor'].lower() or
-            termino in libro['genero'].lower()):
-            libros_encontrados.append(libro)
-    
-    return libros_encontrados
+    termino = (termino or "").strip()
+    if not termino: return obtener_todos_los_libros() # Si la búsqueda está vacía, mostrar todos
+
+    # Los índices se consultan en el servidor: solo viajan los libros que coinciden
+    try:
+        return obtener_libros_por_ids(buscar_ids_db(termino))
+    except Exception as e:
+        print(f"ERROR al buscar libros: {e}")
+        return []
 
-#  Plantilla Base HTML (Utilizando render_template_string para ser single-file) 
+def contar_libros_db():
+    # ZCARD es O(1): el total no requiere recorrer los libros. Queda en la caché cercana hasta la próxima escritura
+    total = cache.obtener_total()
+    if total is None:
+        generacion = cache.generacion
+        total = r.zcard(CLAVE_INDICE_IDS)
+        cache.guardar_total(total, generacion)
+    return total
+
+def buscar_pagina_db(termino, despues_de=0, tamano=TAMANO_PAGINA):
+    """
+    Una página de resultados de búsqueda: (libros, siguiente, total).
+    Los ids coincidentes salen ordenados de los índices (y quedan en la caché cercana); de KeyDB
+    solo se traen los libros de la página, los de id mayor a `despues_de`.
+    """
+    termino = (termino or "").strip()
+    if not termino:
+        libros, siguiente = obtener_pagina_libros(despues_de, tamano)
+        return libros, siguiente, contar_libros_db()
+    ids = buscar_ids_db(termino)
+    inicio = bisect.bisect_right(ids, despues_de)
+    pagina = ids[inicio:inicio + tamano]
+    siguiente = pagina[-1] if inicio + tamano < len(ids) else None
+    return obtener_libros_por_ids(pagina), siguiente, len(ids)
+
+def buscar_por_estado_db(estado):
+    try:
+        clave_lista = ("estado", clave_indice_estado(estado))
+        ids = cache.obtener_lista(clave_lista)
+        if ids is None:
+            generacion = cache.generacion
+            ids = sorted(int(libro_id) for libro_id in r.smembers(clave_indice_estado(estado)))
+            cache.guardar_lista(clave_lista, ids, generacion)
+        return obtener_libros_por_ids(ids)
+    except Exception as e:
+        print(f"ERROR al filtrar libros por estado: {e}")
+        return []
+
+def migrar_a_hash(count=TAMANO_LOTE):
+    """
+    Convierte los libros guardados como string JSON a HASH y registra el nuevo formato en KeyDB.
+    Se migra por lotes de `count` claves: el DEL + HSET de todos los libros del lote va en una sola
+    transacción (MULTI/EXEC), así ningún libro queda sin clave ni a medio escribir. Los libros se leen
+    con MGET antes de la transacción, sin WATCH: ejecutar con la aplicación detenida.
+    """
+    global FORMATO
+    migrados = 0
+
+    def migrar_lote(claves):
+        pipe = r.pipeline(transaction=False)
+        for clave in claves:
+            pipe.type(clave)
+        claves_json = [clave for clave, tipo in zip(claves, pipe.execute()) if tipo == "string"]
+        if not claves_json: return 0
+        pipe = r.pipeline()
+        cantidad = 0
+        for clave, libro_json in zip(claves_json, r.mget(claves_json)):
+            if not libro_json: continue
+            pipe.delete(clave)
+            pipe.hset(clave, mapping=json.loads(libro_json))
+            cantidad += 1
+        pipe.execute()
+        return cantidad
+
+    claves = []
+    for clave in r.scan_iter(match=f"{KEYDB_PREFIX}[0-9]*", count=count):
+        claves.append(clave)
+        if len(claves) >= count:
+            migrados += migrar_lote(claves)
+            claves = []
+    if claves:
+        migrados += migrar_lote(claves)
+    r.set(CLAVE_FORMATO, "hash")
+    FORMATO = "hash"
+    publicar_invalidacion("*")
+    return migrados
+
+@app.cli.command("migrar-hash")
+def migrar_hash_comando():
+    """Convierte los libros guardados como JSON a HASH (ejecutar con la aplicación detenida)."""
+    inicializar_keydb()
+    print(f"Libros migrados a HASH: {migrar_a_hash()}")
+
+def inicializar_keydb():
+    """Detecta el formato y, la primera vez, indexa los datos guardados antes de que existieran los índices."""
+    global FORMATO
+    if FORMATO is not None: return
+    FORMATO = detectar_formato()
+    if r.get(CLAVE_VERSION_INDICES) != VERSION_INDICES and r.exists(f'{KEYDB_PREFIX}next_id'):
+        print(f"INFO: Indexando libros existentes... {reconstruir_indices()} libros indexados.")
+
+#  Plantilla Base HTML (single-file: se compila una sola vez con app.jinja_env.from_string) 
 
 BASE_HTML = """
 <!doctype html>
@@ -160,6 +676,16 @@ BASE_HTML = """
         <div class="row">
             <div class="col-12">
                 {{ content }}
+                {% if tarjetas is defined %}
+                <div class="book-list-container">
+                    <div class="list-group">
+                        {% for tarjeta in tarjetas %}{{ tarjeta }}{% else %}
+                        <p class="text-muted text-center mt-5">No hay libros registrados en la biblioteca.</p>
+                        {% endfor %}
+                    </div>
+                </div>
+                {{ pie }}
+                {% endif %}
             </div>
         </div>
     </div>
@@ -171,24 +697,65 @@ BASE_HTML = """
 
 
 
+# Compilada una vez al iniciar (render_template_string volvía a parsear y compilar la plantilla
+# en cada petición).
+PLANTILLA_BASE = app.jinja_env.from_string(BASE_HTML)
+TARJETAS_POR_ENVIO = 50
+
+def preparar_contexto(contexto):
+    # content y pie son HTML armado por la aplicación (los datos del usuario se escapan al armarlos);
+    # se marcan como seguros para que el autoescape de Jinja no los muestre como texto
+    contexto["content"] = Markup(contexto.get("content", ""))
+    contexto["pie"] = Markup(contexto.get("pie", ""))
+    app.update_template_context(contexto)
+    return contexto
+
+def renderizar(**contexto):
+    """Página completa con la plantilla base ya compilada."""
+    return PLANTILLA_BASE.render(preparar_contexto(contexto))
+
+def renderizar_stream(**contexto):
+    """
+    Igual que renderizar(), pero la respuesta se envía a medida que se genera: el encabezado sale
+    enseguida y las tarjetas (`tarjetas`, un iterable) en bloques de TARJETAS_POR_ENVIO.
+    """
+    flujo = PLANTILLA_BASE.stream(preparar_contexto(contexto))
+    flujo.enable_buffering(TARJETAS_POR_ENVIO)
+    return Response(stream_with_context(flujo), mimetype="text/html")
+
+ERROR_CONEXION_HTML = """
+    <div class="alert alert-danger" role="alert">
+        Error de Conexión: La aplicación no puede conectarse a KeyDB. Por favor, verifica la configuración y el servicio.
+    </div>
+"""
+
+@app.errorhandler(redis.exceptions.ConnectionError)
+@app.errorhandler(redis.exceptions.TimeoutError)
+def keydb_no_disponible(e):
+    # KeyDB no respondió ni después de los reintentos: la próxima petición vuelve a intentar
+    print(f"ERROR: KeyDB no disponible: {e}")
+    return renderizar(content=ERROR_CONEXION_HTML), 503
+
+def parametros_pagina():
+    """Cursor (`despues`) y tamaño de página (`tamano`) de la query string, acotados."""
+    despues = max(request.args.get('despues', 0, type=int), 0)
+    tamano = request.args.get('tamano', TAMANO_PAGINA, type=int)
+    return despues, min(max(tamano, 1), TAMANO_PAGINA_MAX)
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
-    if r is None:
-        return render_template_string(BASE_HTML, content="""
-            <div class="alert alert-danger" role="alert">
-                Error de Conexión: La aplicación no puede conectarse a KeyDB. Por favor, verifica la configuración y el servicio.
-            </div>
-        """)
-
-    libros = obtener_todos_los_libros()
+    # Sin PING previo: si KeyDB no responde, la primera lectura que no esté en la caché cercana
+    # lanza ConnectionError/TimeoutError y keydb_no_disponible() devuelve el 503
+    despues, tamano = parametros_pagina()
+    total = contar_libros_db()
     
     content = f"""
     <div class="d-flex justify-content-between align-items-center mb-3">
-        <h2 class="h3">Listado de Libros ({len(libros)} encontrados)</h2>
+        <h2 class="h3">Listado de Libros ({total} en total)</h2>
         <a href="{url_for('agregar')}" class="btn btn-success btn-custom">Añadir Nuevo Libro</a>
     </div>
 
-    <form method="POST" action="{url_for('buscar')}" class="mb-4">
+    <form method="GET" action="{url_for('buscar')}" class="mb-4">
         <div class="input-group">
             <input type="text" name="termino" class="form-control" placeholder="Buscar por título, autor o género..." required>
             <button class="btn btn-outline-primary btn-custom" type="submit">Buscar</button>
@@ -196,40 +763,56 @@ def index():
         </div>
     </form>
     
-    <div class="book-list-container">
-        <div class="list-group">
-            { libros_html(libros) }
-        </div>
-    </div>
     """
-    return render_template_string(BASE_HTML, content=content, mensaje=request.args.get('mensaje'))
+    if request.args.get('todos'):
+        # Toda la biblioteca en streaming: los libros se leen de KeyDB por lotes mientras se envía la página
+        return renderizar_stream(content=content, tarjetas=tarjetas_libros(iterar_libros()), mensaje=request.args.get('mensaje'))
 
-@app.route('/search', methods=['POST'])
+    libros, siguiente = obtener_pagina_libros(despues, tamano)
+    return renderizar_stream(content=content, tarjetas=tarjetas_libros(libros), pie=paginacion_html('index', despues, siguiente, tamano),
+                             mensaje=request.args.get('mensaje'))
+
+@app.route('/search', methods=['GET', 'POST'])
 def buscar():
-    termino = request.form.get('termino')
-    libros = buscar_libros_db(termino)
+    # GET permite enlazar las páginas de resultados; POST se mantiene por compatibilidad
+    termino = request.values.get('termino', '')
+    despues, tamano = parametros_pagina()
+    if request.args.get('todos') and termino.strip():
+        # Todos los resultados en streaming: solo se calculan los ids; los libros se leen por lotes al enviar
+        ids = buscar_ids_db(termino)
+        libros, siguiente, total = iterar_libros_por_ids(ids), None, len(ids)
+    else:
+        libros, siguiente, total = buscar_pagina_db(termino, despues, tamano)
 
     content = f"""
     <div class="d-flex justify-content-between align-items-center mb-3">
-        <h2 class="h3">Resultados de Búsqueda para: "{termino}" ({len(libros)} encontrados)</h2>
+        <h2 class="h3">Resultados de Búsqueda para: "{escape(termino)}" ({total} encontrados)</h2>
         <a href="{url_for('agregar')}" class="btn btn-success btn-custom">Añadir Nuevo Libro</a>
     </div>
 
-    <form method="POST" action="{url_for('buscar')}" class="mb-4">
+    <form method="GET" action="{url_for('buscar')}" class="mb-4">
         <div class="input-group">
-            <input type="text" name="termino" class="form-control" placeholder="Buscar por título, autor o género..." value="{termino}" required>
+            <input type="text" name="termino" class="form-control" placeholder="Buscar por título, autor o género..." value="{escape(termino)}" required>
             <button class="btn btn-outline-primary btn-custom" type="submit">Buscar</button>
             <a href="{url_for('index')}" class="btn btn-outline-secondary btn-custom">Limpiar</a>
         </div>
     </form>
     
-    <div class="book-list-container">
-        <div class="list-group">
-            { libros_html(libros) }
-        </div>
+    """
+    pie = "" if request.args.get('todos') else paginacion_html('buscar', despues, siguiente, tamano, termino=termino)
+    return renderizar_stream(content=content, tarjetas=tarjetas_libros(libros), pie=pie)
+
+@app.route('/estado/<estado>')
+def filtrar_estado(estado):
+    libros = buscar_por_estado_db(estado)
+
+    content = f"""
+    <div class="d-flex justify-content-between align-items-center mb-3">
+        <h2 class="h3">Libros en estado: "{escape(estado)}" ({len(libros)} encontrados)</h2>
+        <a href="{url_for('index')}" class="btn btn-outline-secondary btn-custom">Ver todos</a>
     </div>
     """
-    return render_template_string(BASE_HTML, content=content)
+    return renderizar_stream(content=content, tarjetas=tarjetas_libros(libros))
 
 @app.route('/add', methods=['GET', 'POST'])
 def agregar():
@@ -240,14 +823,14 @@ def agregar():
         estado = request.form.get('estado')
         
         if not all([titulo, autor, genero, estado]):
-            return render_template_string(BASE_HTML, content=formulario_agregar_html(), error="Todos los campos son obligatorios.")
+            return renderizar(content=formulario_agregar_html(), error="Todos los campos son obligatorios.")
 
         if agregar_libro_db(titulo, autor, genero, estado):
             return redirect(url_for('index', mensaje=f"Libro '{titulo}' agregado con éxito."))
         else:
-            return render_template_string(BASE_HTML, content=formulario_agregar_html(), error="Error al guardar el libro en KeyDB.")
+            return renderizar(content=formulario_agregar_html(), error="Error al guardar el libro en KeyDB.")
 
-    return render_template_string(BASE_HTML, content=formulario_agregar_html())
+    return renderizar(content=formulario_agregar_html())
 
 @app.route('/edit/<int:libro_id>', methods=['GET', 'POST'])
 def editar(libro_id):
@@ -262,14 +845,22 @@ def editar(libro_id):
         estado = request.form.get('estado')
 
         if not all([titulo, autor, genero, estado]):
-            return render_template_string(BASE_HTML, content=formulario_editar_html(libro), error="Todos los campos son obligatorios.")
+            return renderizar(content=formulario_editar_html(libro), error="Todos los campos son obligatorios.")
 
-        if actualizar_libro_db(libro_id, titulo, autor, genero, estado):
+        # Versión que se mostró en el formulario: si otro usuario guardó cambios mientras tanto, no se pisan
+        version = request.form.get('version', type=int)
+        resultado = actualizar_libro_db(libro_id, titulo, autor, genero, estado, version)
+        if resultado == "ok":
             return redirect(url_for('index', mensaje=f"Libro con ID {libro_id} actualizado con éxito."))
+        elif resultado == "conflicto":
+            libro = obtener_libro_por_id(libro_id) or libro
+            return renderizar(content=formulario_editar_html(libro), error="Otro usuario modificó este libro mientras lo editabas. Se cargaron los datos actuales; revisa y vuelve a guardar.")
+        elif resultado == "no_encontrado":
+            return redirect(url_for('index', mensaje=f"ERROR: Libro con ID {libro_id} no encontrado."))
         else:
-            return render_template_string(BASE_HTML, content=formulario_editar_html(libro), error="Error al actualizar el libro en KeyDB.")
+            return renderizar(content=formulario_editar_html(libro), error="Error al actualizar el libro en KeyDB.")
 
-    return render_template_string(BASE_HTML, content=formulario_editar_html(libro))
+    return renderizar(content=formulario_editar_html(libro))
 
 @app.route('/delete/<int:libro_id>')
 def eliminar(libro_id):
@@ -281,36 +872,58 @@ def eliminar(libro_id):
 
 # --- Funciones Auxiliares para HTML ---
 
-def libros_html(libros):
-    if not libros:
-        return '<p class="text-muted text-center mt-5">No hay libros registrados en la biblioteca.</p>'
-    
-    html = ""
-    for libro in libros:
-        # Determinar color de estado
-        badge_class = 'bg-secondary'
-        if 'Leído' in libro['estado']: badge_class = 'bg-success'
-        elif 'En curso' in libro['estado']: badge_class = 'bg-warning text-dark'
-        elif 'Pendiente' in libro['estado']: badge_class = 'bg-info text-dark'
-
-        html += f"""
+def tarjeta_libro_html(libro):
+    # Determinar color de estado
+    badge_class = 'bg-secondary'
+    if 'Leído' in libro['estado']: badge_class = 'bg-success'
+    elif 'En curso' in libro['estado']: badge_class = 'bg-warning text-dark'
+    elif 'Pendiente' in libro['estado']: badge_class = 'bg-info text-dark'
+
+    confirmacion = escape(json.dumps(f"¿Estás seguro de que quieres eliminar el libro '{libro['titulo']}'?"))
+    return Markup(f"""
         <div class="card mb-3">
             <div class="card-body">
                 <div class="d-flex w-100 justify-content-between">
-                    <h5 class="mb-1">{libro['titulo']} <span class="badge {badge_class}">{libro['estado']}</span></h5>
+                    <h5 class="mb-1">{escape(libro['titulo'])} <a href="{url_for('filtrar_estado', estado=libro['estado'])}" class="badge {badge_class} text-decoration-none">{escape(libro['estado'])}</a></h5>
                     <small class="text-muted">ID: {libro['id']}</small>
                 </div>
-                <p class="mb-1"><strong>Autor:</strong> {libro['autor']}</p>
-                <p class="mb-1"><strong>Género:</strong> {libro['genero']}</p>
+                <p class="mb-1"><strong>Autor:</strong> {escape(libro['autor'])}</p>
+                <p class="mb-1"><strong>Género:</strong> {escape(libro['genero'])}</p>
                 <div class="mt-2">
                     <a href="{url_for('editar', libro_id=libro['id'])}" class="btn btn-sm btn-primary btn-custom me-2">Editar</a>
                     <a href="{url_for('eliminar', libro_id=libro['id'])}" class="btn btn-sm btn-danger btn-custom" 
-                       onclick="return confirm('¿Estás seguro de que quieres eliminar el libro \\'{libro['titulo']}\\'?');">Eliminar</a>
+                       onclick="return confirm({confirmacion});">Eliminar</a>
                 </div>
             </div>
         </div>
-        """
-    return html
+        """)
+
+def tarjetas_libros(libros):
+    """
+    Genera la tarjeta de cada libro, reutilizando la ya renderizada si el libro no cambió de versión.
+    `libros` puede ser un generador que lee de KeyDB: si la conexión se corta a mitad del envío
+    (los encabezados ya salieron), la página termina con un aviso en lugar de cortarse.
+    """
+    try:
+        for libro in libros:
+            tarjeta = cache.obtener_fragmento(libro)
+            if tarjeta is None:
+                tarjeta = tarjeta_libro_html(libro)
+                cache.guardar_fragmento(libro, tarjeta)
+            yield tarjeta
+    except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+        print(f"ERROR: KeyDB no disponible durante el envío del listado: {e}")
+        yield Markup(ERROR_CONEXION_HTML)
+
+def paginacion_html(endpoint, despues, siguiente, tamano, **argumentos):
+    """Enlaces a la primera página y a la siguiente (si hay), conservando los demás parámetros."""
+    enlaces = ""
+    if despues:
+        enlaces += f'<a href="{url_for(endpoint, tamano=tamano, **argumentos)}" class="btn btn-outline-secondary btn-custom">&laquo; Primera página</a>'
+    if siguiente is not None:
+        enlaces += f'<a href="{url_for(endpoint, todos=1, **argumentos)}" class="btn btn-outline-secondary btn-custom">Ver todos</a>'
+        enlaces += f'<a href="{url_for(endpoint, despues=siguiente, tamano=tamano, **argumentos)}" class="btn btn-outline-primary btn-custom ms-auto">Siguiente &raquo;</a>'
+    return f'<div class="d-flex gap-2 mt-3">{enlaces}</div>' if enlaces else ""
 
 def formulario_agregar_html():
     return f"""
@@ -352,17 +965,18 @@ def formulario_editar_html(libro):
     <div class="card p-4">
         <h2 class="h3 card-title">Editar Libro (ID: {libro['id']})</h2>
         <form method="POST" action="{url_for('editar', libro_id=libro['id'])}">
+            <input type="hidden" name="version" value="{libro.get('version', 0)}">
             <div class="mb-3">
                 <label for="titulo" class="form-label">Título</label>
-                <input type="text" class="form-control rounded-lg" id="titulo" name="titulo" value="{libro['titulo']}" required>
+                <input type="text" class="form-control rounded-lg" id="titulo" name="titulo" value="{escape(libro['titulo'])}" required>
             </div>
             <div class="mb-3">
                 <label for="autor" class="form-label">Autor</label>
-                <input type="text" class="form-control rounded-lg" id="autor" name="autor" value="{libro['autor']}" required>
+                <input type="text" class="form-control rounded-lg" id="autor" name="autor" value="{escape(libro['autor'])}" required>
             </div>
             <div class="mb-3">
                 <label for="genero" class="form-label">Género</label>
-                <input type="text" class="form-control rounded-lg" id="genero" name="genero" value="{libro['genero']}" required>
+                <input type="text" class="form-control rounded-lg" id="genero" name="genero" value="{escape(libro['genero'])}" required>
             </div>
             <div class="mb-3">
                 <label for="estado" class="form-label">Estado de Lectura</label>
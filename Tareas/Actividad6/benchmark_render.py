@@ -0,0 +1,109 @@
+"""
+Benchmark del renderizado del listado de libros (no necesita KeyDB: los libros se generan en memoria).
+
+Compara, para la página completa con N libros:
+- antes: render_template_string en cada petición + lista armada con `html += f"..."`,
+- plantilla compilada una vez + tarjetas generadas de a una (sin caché de fragmentos),
+- plantilla compilada + caché de fragmentos (tarjetas ya renderizadas en una petición anterior),
+y el tiempo hasta el primer bloque de la respuesta en streaming.
+
+    python benchmark_render.py --libros 10000 --repeticiones 5
+"""
+import argparse
+import time
+
+from flask import render_template_string, url_for
+from markupsafe import Markup
+
+from Actividad6 import (
+    BASE_HTML, PLANTILLA_BASE, TARJETAS_POR_ENVIO, app, cache, preparar_contexto, tarjeta_libro_html, tarjetas_libros,
+)
+
+ENCABEZADO = '<h2 class="h3">Listado de Libros</h2>'
+
+
+def libro_de_prueba(i):
+    return {
+        "id": i,
+        "titulo": f"Título de prueba número {i}",
+        "autor": f"Autor {i % 500}",
+        "genero": ["Novela", "Ensayo", "Poesía", "Cuento"][i % 4],
+        "estado": ["Pendiente", "En curso", "Leído"][i % 3],
+        "version": 1,
+    }
+
+
+def libros_html_concatenado(libros):
+    # Versión anterior de la lista: un único string armado con += por cada libro
+    html = ""
+    for libro in libros:
+        badge_class = 'bg-secondary'
+        if 'Leído' in libro['estado']: badge_class = 'bg-success'
+        elif 'En curso' in libro['estado']: badge_class = 'bg-warning text-dark'
+        elif 'Pendiente' in libro['estado']: badge_class = 'bg-info text-dark'
+        html += f"""
+        <div class="card mb-3">
+            <div class="card-body">
+                <div class="d-flex w-100 justify-content-between">
+                    <h5 class="mb-1">{libro['titulo']} <a href="{url_for('filtrar_estado', estado=libro['estado'])}" class="badge {badge_class} text-decoration-none">{libro['estado']}</a></h5>
+                    <small class="text-muted">ID: {libro['id']}</small>
+                </div>
+                <p class="mb-1"><strong>Autor:</strong> {libro['autor']}</p>
+                <p class="mb-1"><strong>Género:</strong> {libro['genero']}</p>
+                <div class="mt-2">
+                    <a href="{url_for('editar', libro_id=libro['id'])}" class="btn btn-sm btn-primary btn-custom me-2">Editar</a>
+                    <a href="{url_for('eliminar', libro_id=libro['id'])}" class="btn btn-sm btn-danger btn-custom">Eliminar</a>
+                </div>
+            </div>
+        </div>
+        """
+    return html
+
+
+def render_antes(libros):
+    contenido = Markup(ENCABEZADO + '<div class="list-group">' + libros_html_concatenado(libros) + '</div>')
+    return render_template_string(BASE_HTML, content=contenido)
+
+
+def render_compilado(tarjetas):
+    flujo = PLANTILLA_BASE.stream(preparar_contexto({"content": ENCABEZADO, "tarjetas": tarjetas}))
+    flujo.enable_buffering(TARJETAS_POR_ENVIO)
+    return "".join(flujo)
+
+
+def primer_bloque(libros):
+    flujo = PLANTILLA_BASE.stream(preparar_contexto({"content": ENCABEZADO, "tarjetas": tarjetas_libros(libros)}))
+    flujo.enable_buffering(TARJETAS_POR_ENVIO)
+    return next(iter(flujo))
+
+
+def medir(nombre, repeticiones, funcion):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    print(f"  {nombre:<46} {min(tiempos) * 1000:9.1f} ms (mejor de {repeticiones})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el renderizado del listado antes y después de compilar la plantilla.")
+    parser.add_argument("--libros", type=int, default=10000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+    libros = [libro_de_prueba(i) for i in range(1, args.libros + 1)]
+
+    with app.test_request_context("/"):
+        print(f"\n--- Renderizado del listado ({args.libros} libros) ---")
+        medir("antes (render_template_string + +=)", args.repeticiones, lambda: render_antes(libros))
+        medir("plantilla compilada, sin caché de fragmentos", args.repeticiones,
+              lambda: render_compilado(tarjeta_libro_html(libro) for libro in libros))
+        render_compilado(tarjetas_libros(libros))  # Primera pasada: llena la caché de fragmentos
+        medir("plantilla compilada + caché de fragmentos", args.repeticiones,
+              lambda: render_compilado(tarjetas_libros(libros)))
+        medir("streaming: hasta el primer bloque", args.repeticiones, lambda: primer_bloque(libros))
+        print("-----------------------------------------------------------------")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark del repositorio indexado (repositorio.py) contra la lista original.
+
+Con N libros sintéticos mide: carga, buscar por id, búsquedas por título/autor, alta, edición
+y baja, comparando con la implementación anterior (lista + recorrido lineal).
+
+    python benchmark_repositorio.py --libros 1000000
+"""
+import argparse
+import random
+import time
+
+from repositorio import BookRepository
+
+ADJETIVOS = ["oscuro", "perdido", "eterno", "secreto", "último", "rojo", "silencioso", "antiguo"]
+SUSTANTIVOS = ["jardín", "río", "laberinto", "viaje", "reino", "espejo", "invierno", "mar"]
+NOMBRES = ["Ana", "Jorge", "Lucía", "Pedro", "Elena", "Mario", "Sofía", "Julio"]
+APELLIDOS = ["García", "Borges", "Cortázar", "Allende", "Rulfo", "Storni", "Sabato", "Onetti"]
+
+
+def libro_sintetico(i, rng):
+    return {
+        'id': i,
+        'title': f"El {rng.choice(SUSTANTIVOS)} {rng.choice(ADJETIVOS)} {i}",
+        'author': f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}",
+        'year': rng.randint(1600, 2025),
+    }
+
+
+def medir(nombre, repeticiones, funcion):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    duracion = (time.perf_counter() - inicio) / repeticiones
+    print(f"  {nombre:<44} {duracion * 1e6:12.1f} µs")
+    return duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara el repositorio indexado con la lista + recorrido lineal.")
+    parser.add_argument("--libros", type=int, default=1_000_000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+    rng = random.Random(42)
+    n = args.libros
+
+    libros = [libro_sintetico(i, rng) for i in range(1, n + 1)]
+    inicio = time.perf_counter()
+    repo = BookRepository(libros)
+    print(f"\n--- Repositorio con {n} libros (carga con índices: {time.perf_counter() - inicio:.1f} s) ---")
+
+    ids = [rng.randint(1, n) for _ in range(1000)]
+    consultas = {
+        "búsqueda selectiva ('laberinto oscuro <n/2>')": f"laberinto oscuro {n // 2 + 45}",
+        "búsqueda por autor ('cortázar')": "cortázar",
+        "búsqueda sin resultados ('zzz')": "zzz",
+    }
+
+    print("Lista + recorrido lineal (antes):")
+    medir("buscar por id", args.repeticiones,
+          lambda: [next((b for b in libros if b['id'] == i), None) for i in ids[:5]])
+    for nombre, consulta in consultas.items():
+        medir(nombre, args.repeticiones,
+              lambda: [b for b in libros if consulta in b['title'].lower() or consulta in b['author'].lower()])
+
+    print("Repositorio indexado:")
+    medir("buscar por id", args.repeticiones, lambda: [repo.get(i) for i in ids[:5]])
+    for nombre, consulta in consultas.items():
+        medir(nombre, args.repeticiones, lambda: list(repo.search(consulta)))
+    medir("página de 50 libros desde la mitad", args.repeticiones, lambda: list(repo.list(after_id=n // 2, limit=50)))
+    nuevo = {'title': 'Libro del benchmark', 'author': 'Autora Prueba', 'year': 2025}
+    medir("alta + baja", args.repeticiones, lambda: repo.delete(repo.add(nuevo)['id']))
+    medir("edición (reindexa título)", args.repeticiones,
+          lambda: repo.update(ids[0], {'title': f"Título editado {rng.random()}"}))
+    print("-------------------------------------------------------------")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,52 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+import os
+from itertools import islice
+
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, get_flashed_messages, jsonify, stream_template
+
+from repositorio import create_repository
 
 app = Flask(__name__)
 
 app.secret_key = 'super_secret_key' 
 
+# Listados en streaming (por defecto): el encabezado de la página se envía enseguida y las filas
+# a medida que se recorren los libros. RENDER_STREAMING=0 arma la página completa antes de enviarla.
+app.config['RENDER_STREAMING'] = os.getenv('RENDER_STREAMING', '1') != '0'
+
 
-books = [
+# Almacenamiento de los libros según BOOKS_STORAGE (ver repositorio.py): "memory" (por defecto,
+# en el proceso, protegido con un lock) o "sqlite" (archivo compartido por varios hilos y workers)
+books = create_repository([
     {'id': 1, 'title': 'Cien años de soledad', 'author': 'Gabriel García Márquez', 'year': 1967},
     {'id': 2, 'title': 'Don Quijote de la Mancha', 'author': 'Miguel de Cervantes', 'year': 1605},
-]
-next_id = 3
+])
 
 def find_book(book_id):
-    return next((book for book in books if book['id'] == book_id), None)
+    return books.get(book_id)
+
+def render_book_list(books_iter, **context):
+    """Renderiza listalibros.html con `books_iter` (un iterable: se recorre una sola vez)."""
+    if not app.config['RENDER_STREAMING']:
+        return render_template('listalibros.html', books=list(books_iter), **context)
+    # Los mensajes flash se leen antes de empezar a enviar: la cookie de sesión sale con los
+    # encabezados, y si se consumieran durante el streaming se volverían a mostrar
+    get_flashed_messages(with_categories=True)
+    return stream_template('listalibros.html', books=books_iter, **context)
 
 
 @app.route('/')
 def book_list():
-    return render_template('listalibros.html', books=books)
+    return render_book_list(books.list())
 
 @app.route('/add', methods=['GET', 'POST'])
 @app.route('/edit/<int:book_id>', methods=['GET', 'POST'])
 def book_form(book_id=None):
     book = find_book(book_id) if book_id else {'id': None, 'title': '', 'author': '', 'year': ''}
+    if book is None:
+        flash('Libro no encontrado.', 'error')
+        return redirect(url_for('book_list'))
     
     if request.method == 'POST':
-        global next_id
-        
         # Recolectar datos del formulario
         new_data = {
             'title': request.form['title'],
@@ -35,12 +55,13 @@ def book_form(book_id=None):
         }
 
         if book_id: # Lógica de Actualización
-            book.update(new_data)
-            flash(f'Libro "{book["title"]}" actualizado con éxito.', 'success')
+            book = books.update(book_id, new_data)
+            if book is None: # Otro usuario lo eliminó mientras se editaba
+                flash('Libro no encontrado.', 'error')
+            else:
+                flash(f'Libro "{book["title"]}" actualizado con éxito.', 'success')
         else: # Lógica de Creación
-            new_book = {'id': next_id, **new_data}
-            books.append(new_book)
-            next_id += 1
+            new_book = books.add(new_data)
             flash(f'Libro "{new_book["title"]}" agregado con éxito.', 'success')
             
         return redirect(url_for('book_list'))
@@ -56,7 +77,7 @@ def confirm_delete(book_id):
         return redirect(url_for('book_list'))
     
     if request.method == 'POST':
-        books.remove(book)
+        books.delete(book_id)
         flash(f'Libro "{book["title"]}" eliminado con éxito.', 'success')
         return redirect(url_for('book_list'))
         
@@ -69,17 +90,115 @@ def search_books():
     query = request.args.get('query', '').lower()
     
     if query:
-        # Filtrar libros que coincidan en título o autor
-        search_results = [
-            book for book in books 
-            if query in book['title'].lower() or query in book['author'].lower()
-        ]
+        # Libros que coinciden en título o autor, vía el índice de trigramas (a medida que se envían las filas)
+        search_results = books.search(query)
         message = f"Resultados para: **{request.args['query']}**"
     else:
         search_results = []
         message = "Ingresa un término de búsqueda."
         
-    return render_template('listalibros.html', books=search_results, message=message, query=request.args.get('query', ''))
+    return render_book_list(search_results, message=message, query=request.args.get('query', ''))
+
+## ➡️ 5. API JSON
+# Las mismas operaciones sin plantillas ni redirecciones. Las lecturas llevan un ETag con la
+# versión del repositorio: si el cliente envía If-None-Match y nada cambió, se responde 304 sin
+# volver a leer ni serializar los libros. Las altas responden 201 con el libro y su Location.
+# El listado es paginado: `limit` (hasta API_MAX_PAGE_SIZE) y `offset`, o `after_id` (el
+# `next_after_id` de la respuesta anterior), que no recorre los libros salteados.
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+def api_error(message, status):
+    return jsonify({'error': message}), status
+
+def conditional_json(build):
+    """Responde 304 si el ETag del cliente coincide con la versión actual; si no, el JSON de build()."""
+    # La versión se lee antes que los datos: si cambian en el medio, el ETag queda viejo y el
+    # cliente simplemente vuelve a pedirlos (nunca recibe un 304 con datos desactualizados)
+    etag = f'v{books.version()}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        body = build()
+        if body is None:
+            return api_error('Libro no encontrado.', 404)
+        response = jsonify(body)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # Siempre revalidar (con If-None-Match)
+    return response
+
+def book_data_from_json(partial=False):
+    """Valida el cuerpo JSON; devuelve (datos, error)."""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return None, 'Se esperaba un objeto JSON.'
+    data = {}
+    for field in ('title', 'author', 'year'):
+        if field not in payload:
+            if partial:
+                continue
+            return None, f'Falta el campo "{field}".'
+        data[field] = payload[field]
+    if 'year' in data:
+        try:
+            data['year'] = int(data['year'])
+        except (TypeError, ValueError):
+            return None, 'El campo "year" debe ser un número entero.'
+    if any(not isinstance(data[field], str) or not data[field].strip() for field in ('title', 'author') if field in data):
+        return None, 'Los campos "title" y "author" deben ser textos no vacíos.'
+    if not data:
+        return None, 'No hay campos para actualizar.'
+    return data, None
+
+@app.route('/api/books', methods=['GET'])
+def api_book_list():
+    after_id = request.args.get('after_id', 0, type=int)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', API_PAGE_SIZE, type=int), 1), API_MAX_PAGE_SIZE)
+    query = request.args.get('query', '')
+
+    def build():
+        # Se pide un libro de más, que indica si hay página siguiente
+        if query:
+            found = (book for book in books.search(query) if book['id'] > after_id)
+            page = list(islice(found, offset, offset + limit + 1))
+        else:
+            # El repositorio corta la página (bisect / LIMIT ... OFFSET): no se lee el resto de la colección
+            page = list(books.list(after_id=after_id, limit=limit + 1, offset=offset))
+        next_after_id = page[limit - 1]['id'] if len(page) > limit else None
+        return {'books': page[:limit], 'next_after_id': next_after_id}
+    return conditional_json(build)
+
+@app.route('/api/books/<int:book_id>', methods=['GET'])
+def api_book_detail(book_id):
+    return conditional_json(lambda: find_book(book_id))
+
+@app.route('/api/books', methods=['POST'])
+def api_book_create():
+    data, error = book_data_from_json()
+    if error:
+        return api_error(error, 400)
+    book = books.add(data)
+    response = jsonify(book)
+    response.status_code = 201
+    response.headers['Location'] = url_for('api_book_detail', book_id=book['id'])
+    return response
+
+@app.route('/api/books/<int:book_id>', methods=['PUT', 'PATCH'])
+def api_book_update(book_id):
+    data, error = book_data_from_json(partial=request.method == 'PATCH')
+    if error:
+        return api_error(error, 400)
+    book = books.update(book_id, data)
+    if book is None:
+        return api_error('Libro no encontrado.', 404)
+    return jsonify(book)
+
+@app.route('/api/books/<int:book_id>', methods=['DELETE'])
+def api_book_delete(book_id):
+    if books.delete(book_id) is None:
+        return api_error('Libro no encontrado.', 404)
+    return Response(status=204)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,296 @@
+"""
+Almacenamiento de los libros. Dos implementaciones con la misma interfaz
+(get, add, update, delete, list, search, len, version), elegidas con BOOKS_STORAGE (ver create_repository):
+
+BookRepository ("memory", por defecto): en memoria del proceso, con índices.
+- `_books`: dict id -> libro; buscar, editar o eliminar por id es O(1) (antes se recorría la lista).
+- `_ids`: lista ordenada de ids; permite listar en orden y por páginas (`after_id`) con bisect.
+  Los ids se asignan crecientes, así que un alta es un append.
+- `_trigrams`: índice invertido trigrama -> ids, sobre título y autor en minúsculas. Una búsqueda
+  intersecta los conjuntos de los trigramas de la consulta y verifica la subcadena solo en esos
+  candidatos: mismo resultado que `query in title or query in author`, sin recorrer todos los libros.
+  Las consultas de menos de 3 caracteres no tienen trigramas y se resuelven recorriendo la lista.
+- Los índices se actualizan de forma incremental en cada alta, edición y baja, bajo un lock: el
+  servidor puede atender varias peticiones en hilos sin repetir ids ni leer índices a medio cambiar.
+  Los libros se devuelven como copias. Cada proceso tiene sus propios datos.
+
+SqliteBookRepository ("sqlite"): un archivo SQLite compartido por todos los hilos y procesos
+(por ejemplo varios workers de gunicorn). Modo WAL (las lecturas no bloquean a las escrituras),
+ids asignados por SQLite y búsqueda con un índice FTS5 de trigramas.
+"""
+import bisect
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+
+LARGO_NGRAMA = 3
+
+
+def trigrams(text):
+    return {text[i:i + LARGO_NGRAMA] for i in range(len(text) - LARGO_NGRAMA + 1)}
+
+
+def book_trigrams(book):
+    return trigrams(book['title'].lower()) | trigrams(book['author'].lower())
+
+
+def matches(book, query):
+    # `query` ya en minúsculas
+    return query in book['title'].lower() or query in book['author'].lower()
+
+
+class BookRepository:
+    def __init__(self, books=()):
+        self._books = {}
+        self._ids = []
+        self._trigrams = defaultdict(set)
+        self._next_id = 1
+        # Se incrementa en cada alta, edición y baja (para ETag / respuestas condicionales)
+        self._version = 0
+        self._lock = threading.RLock()
+        for book in books:
+            self._insert(dict(book))
+
+    def __len__(self):
+        return len(self._books)
+
+    def version(self):
+        return self._version
+
+    def _copy(self, book_id):
+        with self._lock:
+            book = self._books.get(book_id)
+            return dict(book) if book is not None else None
+
+    def _index(self, book):
+        for gram in book_trigrams(book):
+            self._trigrams[gram].add(book['id'])
+
+    def _unindex(self, book):
+        for gram in book_trigrams(book):
+            ids = self._trigrams.get(gram)
+            if ids is not None:
+                ids.discard(book['id'])
+                if not ids:
+                    del self._trigrams[gram]
+
+    def _insert(self, book):
+        with self._lock:
+            self._books[book['id']] = book
+            if not self._ids or book['id'] > self._ids[-1]:
+                self._ids.append(book['id'])
+            else:
+                bisect.insort(self._ids, book['id'])
+            self._index(book)
+            self._next_id = max(self._next_id, book['id'] + 1)
+            self._version += 1
+            return dict(book)
+
+    def get(self, book_id):
+        return self._copy(book_id)
+
+    def add(self, data):
+        """Agrega un libro (title, author, year) con el siguiente id y lo devuelve."""
+        with self._lock:
+            return self._insert({'id': self._next_id, **data})
+
+    def update(self, book_id, data):
+        """Modifica los campos de `data`; devuelve el libro actualizado o None si no existe."""
+        with self._lock:
+            book = self._books.get(book_id)
+            if book is None:
+                return None
+            self._unindex(book)
+            book.update(data)
+            self._index(book)
+            self._version += 1
+            return dict(book)
+
+    def delete(self, book_id):
+        """Elimina el libro; devuelve el libro eliminado o None si no existía."""
+        with self._lock:
+            book = self._books.pop(book_id, None)
+            if book is None:
+                return None
+            del self._ids[bisect.bisect_left(self._ids, book_id)]
+            self._unindex(book)
+            self._version += 1
+            return book
+
+    def list(self, after_id=0, limit=None, offset=0):
+        """Genera los libros en orden de id, desde el primero con id mayor a `after_id` (salteando `offset`)."""
+        with self._lock:
+            start = bisect.bisect_right(self._ids, after_id) + offset
+            stop = None if limit is None else start + limit
+            # Copia de los ids: el listado puede enviarse en streaming mientras hay altas/bajas
+            ids = self._ids[start:stop]
+        for book_id in ids:
+            book = self._copy(book_id)
+            if book is not None:
+                yield book
+
+    def search(self, query):
+        """Genera los libros cuyo título o autor contienen `query` (sin distinguir mayúsculas), en orden de id."""
+        query = query.lower()
+        grams = trigrams(query)
+        with self._lock:
+            if not grams:
+                candidates = self._ids[:]
+            else:
+                postings = [self._trigrams.get(gram) for gram in grams]
+                if not all(postings):
+                    return
+                # Se empieza por el conjunto más chico para que la intersección se achique enseguida
+                postings.sort(key=len)
+                candidates = sorted(postings[0].intersection(*postings[1:]))
+        for book_id in candidates:
+            book = self._copy(book_id)
+            if book is not None and matches(book, query):
+                yield book
+
+
+class SqliteBookRepository:
+    COLUMNS = ('id', 'title', 'author', 'year')
+    FETCH_SIZE = 500
+
+    def __init__(self, path, books=()):
+        self.path = path
+        # Una conexión por hilo (sqlite3 no permite compartirlas entre hilos)
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS books (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    author TEXT NOT NULL,
+                    year INTEGER
+                );
+                -- Índice de trigramas (sin distinguir mayúsculas) sincronizado con triggers
+                CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+                    title, author, content='books', content_rowid='id', tokenize='trigram'
+                );
+                CREATE TRIGGER IF NOT EXISTS books_ai AFTER INSERT ON books BEGIN
+                    INSERT INTO books_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+                END;
+                CREATE TRIGGER IF NOT EXISTS books_ad AFTER DELETE ON books BEGIN
+                    INSERT INTO books_fts(books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+                END;
+                CREATE TRIGGER IF NOT EXISTS books_au AFTER UPDATE ON books BEGIN
+                    INSERT INTO books_fts(books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+                    INSERT INTO books_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+                END;
+                -- Contador de versión compartido por todos los procesos (para ETag)
+                CREATE TABLE IF NOT EXISTS books_version (id INTEGER PRIMARY KEY CHECK (id = 1), value INTEGER NOT NULL);
+                INSERT OR IGNORE INTO books_version (id, value) VALUES (1, 0);
+                CREATE TRIGGER IF NOT EXISTS books_version_ai AFTER INSERT ON books BEGIN
+                    UPDATE books_version SET value = value + 1 WHERE id = 1;
+                END;
+                CREATE TRIGGER IF NOT EXISTS books_version_ad AFTER DELETE ON books BEGIN
+                    UPDATE books_version SET value = value + 1 WHERE id = 1;
+                END;
+                CREATE TRIGGER IF NOT EXISTS books_version_au AFTER UPDATE ON books BEGIN
+                    UPDATE books_version SET value = value + 1 WHERE id = 1;
+                END;
+            """)
+            # Datos iniciales solo en una base nueva (OR IGNORE: otro proceso pudo cargarlos a la vez)
+            if conn.execute("SELECT 1 FROM books LIMIT 1").fetchone() is None:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO books (id, title, author, year) VALUES (:id, :title, :author, :year)",
+                    [dict(book) for book in books],
+                )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _rows(self, sql, params=()):
+        # Se leen de a FETCH_SIZE filas: el listado en streaming no carga la tabla entera
+        cursor = self._conn().execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(self.FETCH_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM books").fetchone()[0]
+
+    def version(self):
+        return self._conn().execute("SELECT value FROM books_version WHERE id = 1").fetchone()[0]
+
+    def get(self, book_id):
+        row = self._conn().execute("SELECT id, title, author, year FROM books WHERE id = ?", (book_id,)).fetchone()
+        return dict(row) if row else None
+
+    def add(self, data):
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO books (title, author, year) VALUES (:title, :author, :year)", data
+            )
+        return {'id': cursor.lastrowid, **data}
+
+    def update(self, book_id, data):
+        fields = [field for field in self.COLUMNS[1:] if field in data]
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                f"UPDATE books SET {', '.join(f'{field} = :{field}' for field in fields)} WHERE id = :id",
+                {**data, 'id': book_id},
+            )
+        return self.get(book_id) if cursor.rowcount else None
+
+    def delete(self, book_id):
+        conn = self._conn()
+        with conn:
+            # BEGIN IMMEDIATE: se toma el lock de escritura antes de leer, así dos procesos no
+            # "eliminan" el mismo libro
+            conn.execute("BEGIN IMMEDIATE")
+            book = self.get(book_id)
+            if book is not None:
+                conn.execute("DELETE FROM books WHERE id = ?", (book_id,))
+        return book
+
+    def list(self, after_id=0, limit=None, offset=0):
+        return self._rows(
+            "SELECT id, title, author, year FROM books WHERE id > ? ORDER BY id LIMIT ? OFFSET ?",
+            (after_id, -1 if limit is None else limit, offset),
+        )
+
+    def search(self, query):
+        query = query.lower()
+        if len(query) < LARGO_NGRAMA:
+            candidates = self.list()
+        else:
+            # Frase entre comillas: el tokenizador trigram la busca como subcadena
+            phrase = '"' + query.replace('"', '""') + '"'
+            candidates = self._rows(
+                "SELECT b.id, b.title, b.author, b.year FROM books_fts f JOIN books b ON b.id = f.rowid "
+                "WHERE books_fts MATCH ? ORDER BY b.id",
+                (phrase,),
+            )
+        # Misma regla que la versión en memoria (minúsculas de Python)
+        return (book for book in candidates if matches(book, query))
+
+
+def create_repository(books=()):
+    """
+    Repositorio según BOOKS_STORAGE: "memory" (por defecto) o "sqlite" (archivo en BOOKS_DB_PATH,
+    por defecto biblioteca.db junto a este módulo). `books` son los datos iniciales.
+    """
+    storage = os.getenv('BOOKS_STORAGE', 'memory').lower()
+    if storage == 'sqlite':
+        path = os.getenv('BOOKS_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'biblioteca.db'))
+        return SqliteBookRepository(path, books)
+    if storage != 'memory':
+        raise ValueError(f"BOOKS_STORAGE desconocido: {storage!r} (usar 'memory' o 'sqlite')")
+    return BookRepository(books)
@@ -0,0 +1,132 @@
+"""
+Prueba de carga de send_async_email sin Redis ni servidor de correo externos: broker en memoria
+(memory://) con un worker dentro del mismo proceso, un servidor SMTP local (aiosmtpd) que acepta
+todo y fakeredis para el circuito y la cola de fallidos (o un Redis real con --redis). Al final imprime el throughput y el reporte de metricas.py (espera en cola, duración, SMTP,
+reintentos y fallos).
+
+    python carga_tareas.py --tareas 5000
+    python carga_tareas.py --pool threads --concurrencia 8
+    python carga_tareas.py --tareas 2000 --fallos 0.05        # el 5% de los envíos falla (451)
+    python carga_tareas.py --modo eager                       # sin broker: mide solo la ejecución
+    python carga_tareas.py --prometheus                        # además, las métricas en texto Prometheus
+
+Los envíos fallidos se reintentan con la política de send_async_email. Una tarea cuenta como
+terminada solo en un estado final (SUCCESS o FAILURE), no al pedir un reintento: la prueba espera
+los reintentos (hasta --limite) y el throughput incluye esas esperas. Con muchos fallos seguidos se
+abre el circuito y el resto de las tareas se pospone.
+
+El pool por defecto es "solo": los envíos del proceso comparten una conexión SMTP con lock, así
+que más hilos no aumentan el throughput (y con el transporte en memoria, el pool de hilos agrega
+esperas propias del transporte que no aparecen con un broker real).
+"""
+import argparse
+import os
+import random
+import socket
+import time
+
+from aiosmtpd.controller import Controller
+
+
+class ServidorSMTP:
+    """Manejador de aiosmtpd: cuenta los mensajes y rechaza una fracción `fallos` con un error temporal."""
+    def __init__(self, fallos):
+        self.fallos = fallos
+        self.recibidos = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        if random.random() < self.fallos:
+            return '451 4.3.0 Fallo simulado'
+        self.recibidos += 1
+        return '250 OK'
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def esperar(condicion, limite):
+    fin = time.monotonic() + limite
+    while not condicion():
+        if time.monotonic() > fin:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el throughput de send_async_email con broker en memoria.")
+    parser.add_argument("--tareas", type=int, default=2000)
+    parser.add_argument("--pool", choices=["solo", "threads"], default="solo")
+    parser.add_argument("--concurrencia", type=int, default=4, help="Hilos del worker (con --pool threads)")
+    parser.add_argument("--modo", choices=["worker", "eager"], default="worker")
+    parser.add_argument("--fallos", type=float, default=0.0, help="Fracción de envíos que el SMTP rechaza")
+    parser.add_argument("--limite", type=float, default=300, help="Segundos máximos de espera")
+    parser.add_argument("--redis", help="URL de Redis para el circuito y los fallidos (fakeredis por defecto)")
+    parser.add_argument("--prometheus", action="store_true", help="Imprimir también las métricas en formato Prometheus")
+    args = parser.parse_args()
+
+    manejador = ServidorSMTP(args.fallos)
+    puerto = puerto_libre()
+    smtp = Controller(manejador, hostname='localhost', port=puerto)
+    smtp.start()
+    # Antes de importar tareas: create_app_context() toma de aquí la configuración de correo
+    os.environ.update(MAIL_SERVER='localhost', MAIL_PORT=str(puerto), MAIL_USE_TLS='False',
+                      MAIL_USERNAME='', MAIL_PASSWORD='', MAIL_DEFAULT_SENDER='carga@biblioteca.local')
+
+    import metricas
+    from tareas import celery_app, send_async_email, usar_redis
+
+    if args.redis:
+        import redis
+        usar_redis(redis.Redis.from_url(args.redis, decode_responses=True))
+    else:
+        import fakeredis
+        usar_redis(fakeredis.FakeRedis(decode_responses=True))
+
+    celery_app.conf.update(broker_url='memory://', result_backend='cache+memory://', task_ignore_result=True,
+                           task_always_eager=args.modo == "eager", worker_hijack_root_logger=False,
+                           # El transporte en memoria consulta la cola cada 1 s por defecto
+                           broker_transport_options={'polling_interval': 0.005}, worker_prefetch_multiplier=16)
+    # Solo estados finales: un reintento también suma en celery_tareas_total (estado RETRY)
+    terminadas = lambda: sum(metricas.registro.contador('celery_tareas_total', tarea=send_async_email.name, estado=estado)
+                             for estado in ('SUCCESS', 'FAILURE'))
+
+    def publicar():
+        for i in range(args.tareas):
+            send_async_email.delay(recipient=f'lector{i % 50}@biblioteca.local',
+                                   subject=f'Carga {i}', body='Mensaje de prueba de carga.')
+
+    print(f"\n--- {args.tareas} tareas, modo {args.modo}"
+          f"{f', pool {args.pool}' if args.modo == 'worker' else ''}, fallos SMTP {args.fallos:.0%} ---")
+    try:
+        if args.modo == "eager":
+            inicio = time.perf_counter()
+            publicar()
+            duracion = time.perf_counter() - inicio
+            completo = True
+        else:
+            from celery.contrib.testing.worker import start_worker
+            with start_worker(celery_app, pool=args.pool, concurrency=args.concurrencia,
+                              perform_ping_check=False, loglevel='WARNING'):
+                inicio = time.perf_counter()
+                publicar()
+                publicado = time.perf_counter() - inicio
+                completo = esperar(lambda: terminadas() >= args.tareas, args.limite)
+                # Se mide antes de salir del bloque: detener el worker tarda unos segundos
+                duracion = time.perf_counter() - inicio
+            print(f"Publicación: {publicado:.2f} s ({args.tareas / publicado:,.0f} tareas/s)")
+    finally:
+        smtp.stop()
+
+    print(f"Procesadas: {terminadas()} de {args.tareas}{'' if completo else ' (se alcanzó el límite de espera)'}")
+    print(f"Total: {duracion:.2f} s ({terminadas() / duracion:,.0f} tareas/s), {manejador.recibidos} correos recibidos")
+    print(metricas.reporte())
+    if args.prometheus:
+        print(metricas.exportar_prometheus())
+
+
+if __name__ == "__main__":
+    main()
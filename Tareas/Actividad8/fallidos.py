@@ -0,0 +1,57 @@
+"""
+Revisión y reenvío de la cola de correos fallidos (ver tareas.py: enviar_a_fallidos).
+
+    python fallidos.py                          # total y los primeros 20 (los más antiguos)
+    python fallidos.py listar --desde 20 --cantidad 50
+    python fallidos.py reenviar                 # todos, agrupados en el envío por lote
+    python fallidos.py reenviar --limite 100 --individual
+    python fallidos.py vaciar
+    python fallidos.py circuito                 # estado del circuito SMTP
+"""
+import argparse
+
+from tareas import (
+    CLAVE_CIRCUITO_ABIERTO, CLAVE_FALLIDOS, CLAVE_FALLOS_SEGUIDOS, listar_fallidos, obtener_redis, reenviar_fallidos,
+)
+
+
+def listar(desde, cantidad):
+    fallidos, total = listar_fallidos(desde, cantidad)
+    print(f"Correos en la cola de fallidos: {total}")
+    for i, fallido in enumerate(fallidos, start=desde + 1):
+        print(f"{i:>5}. [{fallido['fecha']}] {fallido['recipient']} - {fallido['subject']}")
+        print(f"       {fallido['intentos']} intentos, {fallido['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Revisa y reenvía los correos de la cola de fallidos.")
+    comandos = parser.add_subparsers(dest="comando")
+    listar_cmd = comandos.add_parser("listar", help="Muestra los correos fallidos")
+    listar_cmd.add_argument("--desde", type=int, default=0)
+    listar_cmd.add_argument("--cantidad", type=int, default=20)
+    reenviar_cmd = comandos.add_parser("reenviar", help="Vuelve a encolar los correos fallidos")
+    reenviar_cmd.add_argument("--limite", type=int, default=None, help="Máximo de correos a reenviar (todos por defecto)")
+    reenviar_cmd.add_argument("--individual", action="store_true", help="Una tarea por correo en lugar del envío por lote")
+    comandos.add_parser("vaciar", help="Descarta todos los correos fallidos")
+    comandos.add_parser("circuito", help="Estado del circuito SMTP")
+    args = parser.parse_args()
+
+    if args.comando == "reenviar":
+        reenviados = reenviar_fallidos(args.limite, por_lote=not args.individual)
+        print(f"Correos reencolados: {reenviados}")
+    elif args.comando == "vaciar":
+        cliente = obtener_redis()
+        total = cliente.llen(CLAVE_FALLIDOS)
+        cliente.delete(CLAVE_FALLIDOS)
+        print(f"Correos descartados: {total}")
+    elif args.comando == "circuito":
+        cliente = obtener_redis()
+        espera = cliente.ttl(CLAVE_CIRCUITO_ABIERTO)
+        estado = f"abierto ({espera} s restantes)" if espera > 0 else "cerrado"
+        print(f"Circuito SMTP {estado}; fallos seguidos: {cliente.get(CLAVE_FALLOS_SEGUIDOS) or 0}")
+    else:
+        listar(getattr(args, "desde", 0), getattr(args, "cantidad", 20))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from flask import Flask, render_template, request, redirect, url_for, flash
 from flask_mail import Mail
-from tasks import celery_app, send_async_email
+from tareas import celery_app, encolar_correos, publicar_correos, registrar_eventos
+from outbox import Outbox
 from dotenv import load_dotenv
 import os
 
@@ -33,6 +34,47 @@ books = [
 next_id = 3
 DEFAULT_RECIPIENT = "usuario@ejemplo.com" # Dirección de correo del destinatario
 
+# Cómo se avisa de cada cambio:
+# - "inmediato" (por defecto): una tarea de Celery y un correo por cambio
+# - "lote": los correos se juntan unos segundos y salen por una sola conexión SMTP (encolar_correo)
+# - "resumen": el cambio se guarda en Redis y cada NOTIFICACIONES_INTERVALO segundos sale un único
+#   correo con todos los cambios. REQUIERE celery beat (`celery -A tareas worker --beat` o un proceso
+#   `celery -A tareas beat`): sin beat la tarea enviar_resumenes nunca corre y no sale ningún correo.
+NOTIFICACIONES_MODO = os.getenv('NOTIFICACIONES_MODO', 'inmediato')
+if NOTIFICACIONES_MODO not in ('inmediato', 'lote', 'resumen'):
+    raise ValueError(f"NOTIFICACIONES_MODO desconocido: {NOTIFICACIONES_MODO!r} (usar 'inmediato', 'lote' o 'resumen')")
+if NOTIFICACIONES_MODO == 'resumen':
+    print("Notificaciones en modo resumen: los correos solo salen si corre celery beat (celery -A tareas beat)")
+
+# Las rutas no esperan al broker ni a Redis: la notificación se guarda en un outbox local (SQLite)
+# y un hilo la publica en segundo plano, en lotes (ver outbox.py). Con NOTIFICACIONES_OUTBOX=False
+# se publica directamente durante la petición.
+NOTIFICACIONES_OUTBOX = os.getenv('NOTIFICACIONES_OUTBOX', 'True') == 'True'
+OUTBOX_PATH = os.getenv('OUTBOX_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'outbox.db'))
+
+def publicar_notificaciones(notificaciones):
+    """Publica un lote de notificaciones según NOTIFICACIONES_MODO, en una sola ida a Redis o al broker."""
+    if NOTIFICACIONES_MODO == 'resumen':
+        registrar_eventos([(n['recipient'], n['accion'], n['book']) for n in notificaciones])
+    else:
+        correos = [{'recipient': n['recipient'], 'subject': n['subject'], 'body': n['body']} for n in notificaciones]
+        if NOTIFICACIONES_MODO == 'lote':
+            encolar_correos(correos)
+        else:
+            publicar_correos(correos)
+
+outbox = Outbox(OUTBOX_PATH, publicar_notificaciones) if NOTIFICACIONES_OUTBOX else None
+if outbox is not None:
+    outbox.iniciar()  # Publica lo que haya quedado pendiente de una ejecución anterior
+
+def notificar(accion, book, subject, body):
+    """Avisa de un cambio ('agregado', 'actualizado' o 'eliminado') según NOTIFICACIONES_MODO."""
+    notificacion = {'recipient': DEFAULT_RECIPIENT, 'accion': accion, 'book': dict(book), 'subject': subject, 'body': body}
+    if outbox is not None:
+        outbox.agregar(notificacion)
+    else:
+        publicar_notificaciones([notificacion])
+
 # Función de utilidad para encontrar un libro por ID
 def find_book(book_id):
     return next((book for book in books if book['id'] == book_id), None)
@@ -62,9 +104,9 @@ def book_form(book_id=None):
             book.update(new_data)
             flash(f'Libro "{book["title"]}" actualizado con éxito.', 'success')
             
-            # Tarea Asíncrona de Correo
-            send_async_email.delay(
-                recipient=DEFAULT_RECIPIENT, 
+            # Notificación por correo
+            notificar(
+                'actualizado', book,
                 subject=f'Libro Actualizado: {book["title"]}', 
                 body=f'La información del libro "{book["title"]}" de {book["author"]} ha sido actualizada.'
             )
@@ -75,9 +117,9 @@ def book_form(book_id=None):
             next_id += 1
             flash(f'Libro "{new_book["title"]}" agregado con éxito.', 'success')
 
-            # Tarea Asíncrona de Correo
-            send_async_email.delay(
-                recipient=DEFAULT_RECIPIENT, 
+            # Notificación por correo
+            notificar(
+                'agregado', new_book,
                 subject=f'Nuevo Libro Agregado: {new_book["title"]}', 
                 body=f'Se ha añadido un nuevo libro: "{new_book["title"]}" de {new_book["author"]} ({new_book["year"]}).'
             )
@@ -101,9 +143,9 @@ def confirm_delete(book_id):
         
         flash(f'Libro "{book_title}" eliminado con éxito.', 'success')
         
-        # Tarea Asíncrona de Correo
-        send_async_email.delay(
-            recipient=DEFAULT_RECIPIENT, 
+        # Notificación por correo
+        notificar(
+            'eliminado', book,
             subject=f'Libro Eliminado: {book_title}', 
             body=f'El libro "{book_title}" de {book_author} ha sido eliminado permanentemente de la biblioteca.'
         )
@@ -0,0 +1,212 @@
+"""
+Métricas de las tareas de Celery, tomadas de sus señales (no hace falta tocar cada tarea):
+
+- before_task_publish: cuenta las tareas publicadas y agrega al mensaje el encabezado
+  `disponible_en` (momento desde el que la tarea puede ejecutarse: ahora, o su eta si tiene countdown).
+- task_prerun / task_postrun: espera en la cola (inicio - disponible_en) y duración de la ejecución.
+- task_retry / task_failure: reintentos y fallos, por tipo de error.
+- observar_smtp(): duración de cada envío por la conexión SMTP (lo llama ConexionSMTP).
+
+Cada proceso guarda sus métricas en memoria (`registro`). Se pueden ver como texto Prometheus
+(exportar_prometheus) o como un reporte legible (reporte). Si se define METRICAS_DIR, cada proceso
+del worker escribe además <METRICAS_DIR>/celery_<pid>.prom cada METRICAS_INTERVALO segundos y al
+terminar (formato del "textfile collector" de node_exporter).
+"""
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+
+from celery import signals
+
+METRICAS_DIR = os.getenv('METRICAS_DIR')
+METRICAS_INTERVALO = int(os.getenv('METRICAS_INTERVALO', 15))
+
+# Límites (en segundos) de los histogramas
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+MUESTRAS = 10000  # Últimas muestras guardadas por histograma, para los percentiles del reporte
+ULTIMOS_FALLOS = 20
+
+DESCRIPCIONES = {
+    'celery_tareas_publicadas_total': ('counter', 'Tareas publicadas en el broker'),
+    'celery_tareas_total': ('counter', 'Ejecuciones terminadas, por estado'),
+    'celery_tarea_reintentos_total': ('counter', 'Reintentos pedidos, por motivo'),
+    'celery_tarea_fallos_total': ('counter', 'Fallos definitivos, por motivo'),
+    'celery_tarea_espera_segundos': ('histogram', 'Tiempo en la cola desde que la tarea está disponible hasta que empieza'),
+    'celery_tarea_duracion_segundos': ('histogram', 'Duración de la ejecución'),
+    'correo_smtp_envio_segundos': ('histogram', 'Duración de cada envío SMTP'),
+}
+
+
+class Histograma:
+    def __init__(self):
+        self.conteos = [0] * len(BUCKETS)
+        self.total = 0
+        self.suma = 0.0
+        self.muestras = deque(maxlen=MUESTRAS)
+
+    def observar(self, valor):
+        for i, limite in enumerate(BUCKETS):
+            if valor <= limite:
+                self.conteos[i] += 1
+        self.total += 1
+        self.suma += valor
+        self.muestras.append(valor)
+
+    def percentil(self, p):
+        if not self.muestras:
+            return 0.0
+        ordenadas = sorted(self.muestras)
+        return ordenadas[min(len(ordenadas) - 1, int(p / 100 * len(ordenadas)))]
+
+
+class Registro:
+    """Contadores e histogramas identificados por nombre y etiquetas."""
+    def __init__(self):
+        self.lock = threading.Lock()  # El worker puede usar un pool de hilos
+        self.contadores = defaultdict(int)
+        self.histogramas = defaultdict(Histograma)
+        self.fallos = deque(maxlen=ULTIMOS_FALLOS)
+
+    def incrementar(self, nombre, **etiquetas):
+        with self.lock:
+            self.contadores[nombre, tuple(sorted(etiquetas.items()))] += 1
+
+    def observar(self, nombre, valor, **etiquetas):
+        with self.lock:
+            self.histogramas[nombre, tuple(sorted(etiquetas.items()))].observar(valor)
+
+    def contador(self, nombre, **etiquetas):
+        """Suma de los contadores `nombre` cuyas etiquetas incluyen las dadas."""
+        with self.lock:
+            return sum(valor for (n, clave), valor in self.contadores.items()
+                       if n == nombre and etiquetas.items() <= dict(clave).items())
+
+    def limpiar(self):
+        with self.lock:
+            self.contadores.clear()
+            self.histogramas.clear()
+            self.fallos.clear()
+
+
+registro = Registro()
+
+
+def formato_etiquetas(etiquetas, **extra):
+    pares = [*etiquetas, *extra.items()]
+    if not pares:
+        return ''
+    valores = (str(valor).replace('\\', '\\\\').replace('"', '\\"') for _, valor in pares)
+    return '{' + ','.join(f'{clave}="{valor}"' for (clave, _), valor in zip(pares, valores)) + '}'
+
+
+def exportar_prometheus():
+    """Métricas del proceso en el formato de texto de Prometheus."""
+    lineas = []
+    with registro.lock:
+        for nombre, (tipo, ayuda) in DESCRIPCIONES.items():
+            series = registro.contadores if tipo == 'counter' else registro.histogramas
+            claves = sorted(clave for clave in series if clave[0] == nombre)
+            if not claves:
+                continue
+            lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}']
+            for clave in claves:
+                etiquetas = clave[1]
+                if tipo == 'counter':
+                    lineas.append(f'{nombre}{formato_etiquetas(etiquetas)} {series[clave]}')
+                    continue
+                histograma = series[clave]
+                for limite, conteo in zip(BUCKETS, histograma.conteos):
+                    lineas.append(f'{nombre}_bucket{formato_etiquetas(etiquetas, le=limite)} {conteo}')
+                lineas.append(f'{nombre}_bucket{formato_etiquetas(etiquetas, le="+Inf")} {histograma.total}')
+                lineas.append(f'{nombre}_sum{formato_etiquetas(etiquetas)} {histograma.suma:.6f}')
+                lineas.append(f'{nombre}_count{formato_etiquetas(etiquetas)} {histograma.total}')
+    return '\n'.join(lineas) + '\n'
+
+
+def reporte():
+    """Resumen legible: contadores, percentiles de los tiempos (en ms) y últimos fallos."""
+    lineas = ['--- Métricas de tareas ---']
+    with registro.lock:
+        for (nombre, etiquetas), valor in sorted(registro.contadores.items()):
+            lineas.append(f'  {nombre}{formato_etiquetas(etiquetas)}: {valor}')
+        for (nombre, etiquetas), h in sorted(registro.histogramas.items()):
+            lineas.append(
+                f'  {nombre}{formato_etiquetas(etiquetas)}: n={h.total} '
+                f'p50={h.percentil(50) * 1000:.1f} p95={h.percentil(95) * 1000:.1f} '
+                f'p99={h.percentil(99) * 1000:.1f} max={max(h.muestras, default=0) * 1000:.1f} ms'
+            )
+        if registro.fallos:
+            lineas.append('  Últimos fallos:')
+            lineas += [f'    {tarea} [{task_id}] {motivo}' for tarea, task_id, motivo in registro.fallos]
+    return '\n'.join(lineas)
+
+
+def escribir_archivo():
+    """Escribe las métricas del proceso en METRICAS_DIR (reemplazo atómico, para no leer un archivo a medias)."""
+    if not METRICAS_DIR:
+        return
+    os.makedirs(METRICAS_DIR, exist_ok=True)
+    ruta = os.path.join(METRICAS_DIR, f'celery_{os.getpid()}.prom')
+    with open(ruta + '.tmp', 'w') as archivo:
+        archivo.write(exportar_prometheus())
+    os.replace(ruta + '.tmp', ruta)
+
+
+def observar_smtp(duracion):
+    registro.observar('correo_smtp_envio_segundos', duracion)
+
+
+def motivo(excepcion):
+    # En un reintento la razón es la excepción Retry; el error original está en .exc
+    # (y en EnvioIncompleto, el error del servidor SMTP está en .causa)
+    excepcion = getattr(excepcion, 'exc', None) or excepcion
+    excepcion = getattr(excepcion, 'causa', None) or excepcion
+    return type(excepcion).__name__
+
+
+# --- Señales de Celery ---
+_inicios = {}  # task_id -> perf_counter del inicio (solo mientras la tarea se ejecuta)
+_ultima_escritura = [0.0]
+
+@signals.before_task_publish.connect
+def al_publicar(sender=None, headers=None, **kwargs):
+    disponible_en = time.time()
+    if headers.get('eta'):
+        disponible_en = max(disponible_en, datetime.fromisoformat(headers['eta']).timestamp())
+    headers['disponible_en'] = disponible_en
+    registro.incrementar('celery_tareas_publicadas_total', tarea=sender)
+
+@signals.task_prerun.connect
+def al_empezar(task_id=None, task=None, **kwargs):
+    _inicios[task_id] = time.perf_counter()
+    # Solo si la tarea pasó por el broker (en modo eager no hay encabezado)
+    disponible_en = getattr(task.request, 'disponible_en', None)
+    if disponible_en is not None:
+        registro.observar('celery_tarea_espera_segundos', max(0.0, time.time() - disponible_en), tarea=task.name)
+
+@signals.task_postrun.connect
+def al_terminar(task_id=None, task=None, state=None, **kwargs):
+    inicio = _inicios.pop(task_id, None)
+    if inicio is not None:
+        registro.observar('celery_tarea_duracion_segundos', time.perf_counter() - inicio, tarea=task.name, estado=state)
+    registro.incrementar('celery_tareas_total', tarea=task.name, estado=state)
+    if METRICAS_DIR and time.monotonic() - _ultima_escritura[0] > METRICAS_INTERVALO:
+        _ultima_escritura[0] = time.monotonic()
+        escribir_archivo()
+
+@signals.task_retry.connect
+def al_reintentar(sender=None, reason=None, **kwargs):
+    registro.incrementar('celery_tarea_reintentos_total', tarea=sender.name, motivo=motivo(reason))
+
+@signals.task_failure.connect
+def al_fallar(sender=None, task_id=None, exception=None, **kwargs):
+    registro.incrementar('celery_tarea_fallos_total', tarea=sender.name, motivo=motivo(exception))
+    with registro.lock:
+        registro.fallos.append((sender.name, task_id, f'{motivo(exception)}: {exception}'))
+
+@signals.worker_process_shutdown.connect
+@signals.worker_shutdown.connect
+def al_cerrar_worker(**kwargs):
+    escribir_archivo()
@@ -0,0 +1,133 @@
+"""
+Outbox local de notificaciones. Las rutas no publican en el broker (ni en Redis) durante la
+petición: guardan la notificación en una tabla SQLite local y un hilo publicador la envía en
+segundo plano, en lotes. Si el broker está lento o caído la respuesta no se demora; las
+notificaciones esperan en el archivo (sobreviven a un reinicio) y salen cuando el broker vuelve.
+
+Entrega "al menos una vez": si el proceso termina después de publicar un lote y antes de borrarlo,
+ese lote se vuelve a publicar. Varios procesos (por ejemplo workers de gunicorn, o el proceso que
+vigila los cambios en modo debug) pueden compartir el archivo: cada publicador reserva su lote antes
+de publicarlo, así dos procesos no toman las mismas filas.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+OUTBOX_LOTE = int(os.getenv('OUTBOX_LOTE', 200))
+OUTBOX_INTERVALO = 5  # Segundos entre revisiones sin avisos (filas de otros procesos o reservas vencidas)
+OUTBOX_ESPERA_MAX = 60  # Espera máxima entre reintentos cuando el broker no responde
+OUTBOX_RESERVA = 120  # Segundos tras los que el lote reservado por un proceso que terminó vuelve a estar disponible
+
+
+class Outbox:
+    def __init__(self, path, publicar, tamano_lote=OUTBOX_LOTE):
+        """`publicar` recibe una lista de notificaciones (dicts) y las publica; si falla, se reintentan."""
+        self.path = path
+        self.publicar = publicar
+        self.tamano_lote = tamano_lote
+        # Una conexión por hilo (sqlite3 no permite compartirlas entre hilos)
+        self._local = threading.local()
+        self._hay_nuevas = threading.Event()
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._pid = None
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    datos TEXT NOT NULL,
+                    creado_en REAL NOT NULL,
+                    reservado_hasta REAL NOT NULL DEFAULT 0
+                )
+            """)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def agregar(self, notificacion):
+        """Guarda la notificación para publicarla en segundo plano (una inserción local, sin red)."""
+        with self._conn() as conn:
+            conn.execute("INSERT INTO outbox (datos, creado_en) VALUES (?, ?)", (json.dumps(notificacion), time.time()))
+        self.iniciar()
+        self._hay_nuevas.set()
+
+    def pendientes(self):
+        return self._conn().execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def iniciar(self):
+        """Arranca el hilo publicador, uno por proceso (tras un fork el hilo del padre no existe en el hijo)."""
+        with self._lock:
+            if self._pid == os.getpid() and self._hilo.is_alive():
+                return
+            if self._pid is not None:
+                self._local = threading.local()  # Proceso hijo: no se reutilizan las conexiones del padre
+            self._pid = os.getpid()
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._publicar_continuamente, name='outbox', daemon=True)
+            self._hilo.start()
+
+    def detener(self, timeout=5):
+        self._detener.set()
+        self._hay_nuevas.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+
+    def _reservar(self):
+        conn = self._conn()
+        with conn:
+            # BEGIN IMMEDIATE: se toma el lock de escritura antes de leer, así dos procesos no reservan las mismas filas
+            conn.execute("BEGIN IMMEDIATE")
+            ahora = time.time()
+            filas = conn.execute(
+                "SELECT id, datos FROM outbox WHERE reservado_hasta < ? ORDER BY id LIMIT ?", (ahora, self.tamano_lote)
+            ).fetchall()
+            conn.executemany("UPDATE outbox SET reservado_hasta = ? WHERE id = ?",
+                             [(ahora + OUTBOX_RESERVA, fila_id) for fila_id, _ in filas])
+        return filas
+
+    def publicar_pendientes(self):
+        """Publica un lote (el más antiguo); devuelve cuántas notificaciones se publicaron."""
+        filas = self._reservar()
+        if not filas:
+            return 0
+        ids = [(fila_id,) for fila_id, _ in filas]
+        conn = self._conn()
+        try:
+            self.publicar([json.loads(datos) for _, datos in filas])
+        except Exception:
+            # Se liberan para el próximo intento (de este u otro proceso)
+            with conn:
+                conn.executemany("UPDATE outbox SET reservado_hasta = 0 WHERE id = ?", ids)
+            raise
+        with conn:
+            conn.executemany("DELETE FROM outbox WHERE id = ?", ids)
+        return len(filas)
+
+    def _publicar_continuamente(self):
+        fallos = 0
+        while not self._detener.is_set():
+            # Se limpia antes de consultar: un aviso de agregar() que llegue durante la consulta
+            # queda marcado y el próximo wait() vuelve enseguida (no se pierde)
+            self._hay_nuevas.clear()
+            try:
+                publicadas = self.publicar_pendientes()
+                fallos = 0
+            except Exception as e:
+                # Broker o Redis sin responder: espera creciente, sin afectar a las peticiones
+                fallos += 1
+                espera = min(OUTBOX_ESPERA_MAX, 2 ** (fallos - 1))
+                print(f"ERROR al publicar notificaciones ({e}); nuevo intento en {espera} s")
+                self._detener.wait(espera)
+                continue
+            if publicadas < self.tamano_lote:
+                # Al día: se espera un aviso de agregar() (o el intervalo)
+                self._hay_nuevas.wait(OUTBOX_INTERVALO)
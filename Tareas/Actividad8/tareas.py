@@ -2,7 +2,17 @@ from celery import Celery
 from flask import Flask
 from flask_mail import Message, Mail
 from dotenv import load_dotenv
+from collections import defaultdict
+import json
 import os
+import random
+import smtplib
+import threading
+import time
+import redis
+
+# Registra los manejadores de señales que miden las tareas (ver metricas.py)
+import metricas
 
 # Cargar variables de entorno
 load_dotenv()
@@ -15,6 +25,42 @@ celery_app = Celery(
     backend=os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/1')
 )
 
+# --- Envío por lotes ---
+# encolar_correo() guarda el mensaje en una lista de Redis y, si no hay un envío programado,
+# programa enviar_lote para dentro de CORREO_VENTANA_SEGUNDOS: todo lo encolado en esa ventana
+# sale por una única conexión SMTP (o como un único resumen por destinatario).
+CORREO_REDIS_URL = os.getenv('CORREO_REDIS_URL', os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0'))
+CORREO_VENTANA_SEGUNDOS = int(os.getenv('CORREO_VENTANA_SEGUNDOS', 10))
+CORREO_MAX_LOTE = int(os.getenv('CORREO_MAX_LOTE', 500))
+CORREO_RESUMEN = os.getenv('CORREO_RESUMEN') == 'True'
+#
+# Para probar sin un servidor de correo real, un SMTP local que acepta todo:
+#   python -m aiosmtpd -n -l localhost:8025   (con MAIL_SERVER=localhost, MAIL_PORT=8025, MAIL_USE_TLS=False)
+
+# Segundos sin uso tras los que se verifica la conexión SMTP (NOOP) antes de reutilizarla
+SMTP_MAX_INACTIVIDAD = int(os.getenv('SMTP_MAX_INACTIVIDAD', 30))
+
+CLAVE_PENDIENTES = 'correo:pendientes'
+CLAVE_ENVIO_PROGRAMADO = 'correo:envio_programado'
+
+# --- Reintentos, circuito y cola de fallidos ---
+# Un envío fallido se reintenta con espera exponencial y jitter (al azar entre 0 y
+# REINTENTO_BASE * 2^intento, con tope REINTENTO_MAX_ESPERA), para que los workers no reintenten
+# todos a la vez. Tras REINTENTOS_MAX intentos, o ante un rechazo definitivo del servidor (5xx), el
+# correo pasa a la cola de fallidos (CLAVE_FALLIDOS), donde se puede revisar y reenviar (fallidos.py).
+# Circuito: con CIRCUITO_UMBRAL fallos seguidos (contados en Redis, entre todos los workers) se deja
+# de intentar durante CIRCUITO_PAUSA segundos y las tareas se posponen hasta el final de la pausa.
+REINTENTOS_MAX = int(os.getenv('CORREO_REINTENTOS_MAX', 8))
+REINTENTO_BASE = float(os.getenv('CORREO_REINTENTO_BASE', 15))
+REINTENTO_MAX_ESPERA = float(os.getenv('CORREO_REINTENTO_MAX_ESPERA', 1800))
+CIRCUITO_UMBRAL = int(os.getenv('CORREO_CIRCUITO_UMBRAL', 5))
+CIRCUITO_PAUSA = int(os.getenv('CORREO_CIRCUITO_PAUSA', 120))
+FALLIDOS_MAX = 10000  # Se conservan los más recientes
+
+CLAVE_FALLOS_SEGUIDOS = 'correo:circuito:fallos'
+CLAVE_CIRCUITO_ABIERTO = 'correo:circuito:abierto'
+CLAVE_FALLIDOS = 'correo:fallidos'
+
 # Configuración del contexto de Flask
 def create_app_context():
     """Crea una aplicación Flask mínima para el contexto del worker."""
@@ -30,27 +76,420 @@ def create_app_context():
     )
     return app
 
-# Inicializar Flask-Mail
-mail = Mail()
-
-# Carga la configuración de Flask en Celery
-@celery_app.task(bind=True)
-def send_async_email(self, recipient, subject, body):
-    """Tarea Celery para enviar un correo electrónico de forma asíncrona."""
-    # Necesitamos el contexto de la aplicación para que Flask-Mail funcione
-    app = create_app_context()
-    with app.app_context():
-        # Inicializar mail DENTRO del contexto para evitar errores de aplicación no registrada
-        mail.init_app(app) 
-        
-        msg = Message(
-            subject=subject,
-            recipients=[recipient],
-            body=body
-        )
+
+class EnvioIncompleto(Exception):
+    """Falló el envío de un mensaje; `enviados` son los que ya habían salido antes del error."""
+    def __init__(self, enviados, causa):
+        super().__init__(f"{enviados} enviados antes del error: {causa}")
+        self.enviados = enviados
+        self.causa = causa
+
+    def __reduce__(self):
+        # Celery serializa la excepción de un reintento o fallo; sin esto llegaría como UnpickleableExceptionWrapper
+        return EnvioIncompleto, (self.enviados, self.causa)
+
+
+class CircuitoAbierto(Exception):
+    """Los envíos están en pausa por fallos seguidos del servidor SMTP; `espera`: segundos que faltan."""
+    def __init__(self, espera):
+        super().__init__(f"envíos en pausa por fallos del servidor SMTP ({espera} s restantes)")
+        self.espera = espera
+
+    def __reduce__(self):
+        return CircuitoAbierto, (self.espera,)
+
+
+class ConexionSMTP:
+    """
+    Conexión SMTP reutilizada por todas las tareas del proceso, en lugar de abrir (TLS + login)
+    una por mensaje. Si estuvo inactiva se verifica con NOOP, y si el servidor la cerró se reabre
+    y se reintenta el mensaje que falló (los ya enviados no se repiten).
+    """
+    def __init__(self, app, mail):
+        self.app = app
+        self.mail = mail
+        self.conexion = None
+        self.ultimo_uso = 0.0
+        self.lock = threading.Lock()  # Por si el worker usa un pool de hilos
+
+    def _abrir(self):
+        if self.conexion is not None and time.monotonic() - self.ultimo_uso > SMTP_MAX_INACTIVIDAD:
+            try:
+                if self.conexion.host is not None:
+                    self.conexion.host.noop()
+            except (smtplib.SMTPException, OSError):
+                self.cerrar()
+        if self.conexion is None:
+            self.conexion = self.mail.connect().__enter__()
+        return self.conexion
+
+    def cerrar(self):
+        if self.conexion is not None:
+            try:
+                self.conexion.__exit__(None, None, None)
+            except (smtplib.SMTPException, OSError):
+                pass  # El servidor ya la había cerrado
+            self.conexion = None
+
+    def enviar(self, correos):
+        """Envía los correos (dicts con recipient, subject y body) por la conexión compartida; devuelve cuántos se enviaron."""
+        with self.lock, self.app.app_context():
+            for enviados, correo in enumerate(correos):
+                mensaje = crear_mensaje(**correo)
+                inicio = time.perf_counter()
+                try:
+                    try:
+                        self._abrir().send(mensaje)
+                    except (smtplib.SMTPServerDisconnected, ConnectionError):
+                        # Conexión vencida: se reabre una vez y se reintenta solo este mensaje
+                        self.cerrar()
+                        self._abrir().send(mensaje)
+                except Exception as e:
+                    self.cerrar()
+                    raise EnvioIncompleto(enviados, e) from e
+                self.ultimo_uso = time.monotonic()
+                metricas.observar_smtp(time.perf_counter() - inicio)
+            return len(correos)
+
+
+# Aplicación, Flask-Mail y conexión SMTP: una sola vez por proceso del worker
+# (se comprueba el pid porque el pool prefork crea los procesos con fork)
+_estado = {'pid': None, 'smtp': None, 'redis': None}
+
+def obtener_smtp():
+    if _estado['pid'] != os.getpid():
+        app = create_app_context()
+        _estado.update(pid=os.getpid(), smtp=ConexionSMTP(app, Mail(app)), redis=None)
+    return _estado['smtp']
+
+def obtener_redis():
+    obtener_smtp()
+    if _estado['redis'] is None:
+        _estado['redis'] = redis.Redis.from_url(CORREO_REDIS_URL, decode_responses=True)
+    return _estado['redis']
+
+def usar_redis(cliente):
+    """Usa `cliente` en lugar de CORREO_REDIS_URL en este proceso (scripts y pruebas, p. ej. con fakeredis)."""
+    obtener_smtp()
+    _estado['redis'] = cliente
+
+
+def espera_reintento(intento):
+    """Segundos antes de reintentar tras el fallo número `intento` (1, 2, ...)."""
+    return random.uniform(0, min(REINTENTO_MAX_ESPERA, REINTENTO_BASE * 2 ** (intento - 1)))
+
+def espera_circuito(espera):
+    # Repartidas a lo largo de otra pausa, para que al reabrir no lleguen todas juntas
+    return espera + random.uniform(0, CIRCUITO_PAUSA)
+
+def es_permanente(error):
+    """Rechazo definitivo del servidor (5xx): reintentar no cambia el resultado."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(codigo >= 500 for codigo, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+def enviar_correos(correos):
+    """
+    Envía por la conexión SMTP del proceso, salvo que el circuito esté abierto (CircuitoAbierto).
+    Un fallo temporal suma al contador de fallos seguidos y un envío exitoso lo reinicia. Si Redis
+    no responde se envía igual: el circuito es una protección, no un requisito para enviar.
+    """
+    cliente = obtener_redis()
+    try:
+        espera = cliente.ttl(CLAVE_CIRCUITO_ABIERTO)
+    except redis.RedisError as e:
+        print(f"ADVERTENCIA: no se pudo consultar el circuito SMTP ({e})")
+        espera = 0
+    if espera > 0:
+        raise CircuitoAbierto(espera)
+    try:
+        enviados = obtener_smtp().enviar(correos)
+    except EnvioIncompleto as e:
+        if not es_permanente(e.causa):
+            registrar_fallo_smtp(cliente)
+        raise
+    try:
+        cliente.delete(CLAVE_FALLOS_SEGUIDOS)
+    except redis.RedisError:
+        pass
+    return enviados
+
+def registrar_fallo_smtp(cliente):
+    try:
+        pipe = cliente.pipeline()
+        pipe.incr(CLAVE_FALLOS_SEGUIDOS)
+        pipe.expire(CLAVE_FALLOS_SEGUIDOS, CIRCUITO_PAUSA * 10)
+        fallos = pipe.execute()[0]
+        # NX: los fallos durante la pausa no la alargan. El contador sigue alto al terminar la pausa,
+        # así que si el primer intento después vuelve a fallar, el circuito se reabre enseguida.
+        if fallos >= CIRCUITO_UMBRAL and cliente.set(CLAVE_CIRCUITO_ABIERTO, fallos, nx=True, ex=CIRCUITO_PAUSA):
+            print(f"Circuito SMTP abierto tras {fallos} fallos seguidos: envíos en pausa por {CIRCUITO_PAUSA} s")
+    except redis.RedisError as e:
+        print(f"ADVERTENCIA: no se pudo registrar el fallo en el circuito SMTP ({e})")
+
+def enviar_a_fallidos(correos, error, intentos):
+    """Guarda los correos (dicts con recipient, subject y body) en la cola de fallidos, con el error."""
+    fecha = time.strftime('%Y-%m-%d %H:%M:%S')
+    fallidos = [
+        json.dumps({**correo, 'error': f"{type(error).__name__}: {error}", 'intentos': intentos, 'fecha': fecha})
+        for correo in correos
+    ]
+    pipe = obtener_redis().pipeline()
+    pipe.rpush(CLAVE_FALLIDOS, *fallidos)
+    pipe.ltrim(CLAVE_FALLIDOS, -FALLIDOS_MAX, -1)
+    pipe.execute()
+    print(f"ERROR: {len(fallidos)} correos a la cola de fallidos ({type(error).__name__}: {error})")
+
+def listar_fallidos(inicio=0, cantidad=20):
+    """Los correos fallidos (los más antiguos primero) y el total en la cola."""
+    cliente = obtener_redis()
+    pipe = cliente.pipeline()
+    pipe.lrange(CLAVE_FALLIDOS, inicio, inicio + cantidad - 1)
+    pipe.llen(CLAVE_FALLIDOS)
+    fallidos, total = pipe.execute()
+    return [json.loads(f) for f in fallidos], total
+
+def reenviar_fallidos(limite=None, por_lote=True):
+    """
+    Saca de la cola de fallidos hasta `limite` correos (todos si es None), los más antiguos primero,
+    y los vuelve a encolar: en el lote (encolar_correo, una tarea para todos) o uno por tarea.
+    Devuelve cuántos se reencolaron.
+    """
+    cliente = obtener_redis()
+    reenviados = 0
+    while limite is None or reenviados < limite:
+        cantidad = CORREO_MAX_LOTE if limite is None else min(CORREO_MAX_LOTE, limite - reenviados)
+        # LRANGE + LTRIM en una transacción, igual que enviar_lote: dos reenvíos a la vez no repiten correos
+        pipe = cliente.pipeline()
+        pipe.lrange(CLAVE_FALLIDOS, 0, cantidad - 1)
+        pipe.ltrim(CLAVE_FALLIDOS, cantidad, -1)
+        fallidos = [json.loads(f) for f in pipe.execute()[0]]
+        if not fallidos:
+            break
+        for fallido in fallidos:
+            correo = {'recipient': fallido['recipient'], 'subject': fallido['subject'], 'body': fallido['body']}
+            if por_lote:
+                encolar_correo(**correo)
+            else:
+                send_async_email.delay(**correo)
+        reenviados += len(fallidos)
+    return reenviados
+
+
+def crear_mensaje(recipient, subject, body):
+    # Dentro del contexto de la aplicación (Message toma de ahí el remitente por defecto)
+    return Message(subject=subject, recipients=[recipient], body=body)
+
+def crear_resumenes(pendientes):
+    """Un correo por destinatario que junta todas sus notificaciones: lista de (correo, notificaciones)."""
+    por_destinatario = defaultdict(list)
+    for pendiente in pendientes:
+        por_destinatario[pendiente['recipient']].append(pendiente)
+    mensajes = []
+    for recipient, notificaciones in por_destinatario.items():
+        if len(notificaciones) == 1:
+            mensajes.append((notificaciones[0], notificaciones))
+            continue
+        cuerpo = "\n\n".join(f"- {n['subject']}\n  {n['body']}" for n in notificaciones)
+        asunto = f'Resumen de la biblioteca: {len(notificaciones)} novedades'
+        mensajes.append(({'recipient': recipient, 'subject': asunto, 'body': cuerpo}, notificaciones))
+    return mensajes
+
+
+# max_retries=None: el tope lo controla `intentos`, que no cuenta las pausas del circuito
+@celery_app.task(bind=True, max_retries=None)
+def send_async_email(self, recipient, subject, body, intentos=0):
+    """Tarea Celery para enviar un correo electrónico de forma asíncrona (`intentos`: envíos ya fallidos)."""
+    correo = {'recipient': recipient, 'subject': subject, 'body': body}
+    try:
+        enviar_correos([correo])
+        print(f"Correo enviado a {recipient} para la tarea: {subject}")
+    except CircuitoAbierto as e:
+        # Se pospone hasta que termine la pausa; no cuenta como intento fallido
+        raise self.retry(exc=e, countdown=espera_circuito(e.espera))
+    except EnvioIncompleto as e:
+        intentos += 1
+        if intentos >= REINTENTOS_MAX or es_permanente(e.causa):
+            enviar_a_fallidos([correo], e.causa, intentos)
+            raise
+        # Reintento con espera exponencial y jitter
+        raise self.retry(exc=e, countdown=espera_reintento(intentos), kwargs={**correo, 'intentos': intentos})
+
+
+def encolar_correo(recipient, subject, body):
+    """
+    Agrega el correo al lote pendiente y programa su envío si todavía no hay uno programado.
+    Con muchos cambios seguidos solo se encola una tarea por ventana en lugar de una por correo.
+    """
+    encolar_correos([{'recipient': recipient, 'subject': subject, 'body': body}])
+
+def encolar_correos(correos):
+    """Como encolar_correo, para varios correos (dicts con recipient, subject y body) en una sola ida a Redis."""
+    pipe = obtener_redis().pipeline()
+    pipe.rpush(CLAVE_PENDIENTES, *[json.dumps(correo) for correo in correos])
+    # SET NX: solo el primero de la ventana programa el envío (la clave vence por si la tarea se pierde)
+    pipe.set(CLAVE_ENVIO_PROGRAMADO, 1, nx=True, ex=CORREO_VENTANA_SEGUNDOS * 6)
+    if pipe.execute()[1]:
+        enviar_lote.apply_async(countdown=CORREO_VENTANA_SEGUNDOS)
+
+def publicar_correos(correos):
+    """Una tarea send_async_email por correo, todas publicadas por la misma conexión al broker."""
+    with celery_app.producer_or_acquire() as producer:
+        for correo in correos:
+            send_async_email.apply_async(kwargs=correo, producer=producer)
+
+
+@celery_app.task(bind=True, max_retries=None)
+def enviar_lote(self, resumen=None, intentos=0):
+    """Envía todo lo pendiente por una sola conexión SMTP (o un resumen por destinatario)."""
+    resumen = CORREO_RESUMEN if resumen is None else resumen
+    cliente = obtener_redis()
+    # Se libera la marca antes de sacar los pendientes: lo que llegue después programa otro envío
+    cliente.delete(CLAVE_ENVIO_PROGRAMADO)
+    enviados = 0
+    while True:
+        # LRANGE + LTRIM en una transacción: nadie más recibe los mismos mensajes
+        pipe = cliente.pipeline()
+        pipe.lrange(CLAVE_PENDIENTES, 0, CORREO_MAX_LOTE - 1)
+        pipe.ltrim(CLAVE_PENDIENTES, CORREO_MAX_LOTE, -1)
+        pendientes = [json.loads(p) for p in pipe.execute()[0]]
+        if not pendientes:
+            break
+        if resumen:
+            mensajes = crear_resumenes(pendientes)
+        else:
+            mensajes = [(p, [p]) for p in pendientes]
         try:
-            mail.send(msg)
-            print(f"Correo enviado a {recipient} para la tarea: {subject}")
-        except Exception as e:
-            # En caso de fallo de SMTP, reintenta la tarea después de un tiempo
-            raise self.retry(exc=e, countdown=60)
\ No newline at end of file
+            enviados += enviar_correos([correo for correo, _ in mensajes])
+            intentos = 0
+        except CircuitoAbierto as e:
+            cliente.lpush(CLAVE_PENDIENTES, *[json.dumps(p) for p in reversed(pendientes)])
+            raise self.retry(exc=e, countdown=espera_circuito(e.espera),
+                             kwargs={'resumen': resumen, 'intentos': intentos})
+        except EnvioIncompleto as e:
+            enviados += e.enviados
+            fallido, restantes = mensajes[e.enviados], mensajes[e.enviados + 1:]
+            if es_permanente(e.causa):
+                # Solo ese mensaje va a fallidos; el resto del lote sigue
+                enviar_a_fallidos(fallido[1], e.causa, intentos + 1)
+                volver = [p for _, incluidas in restantes for p in incluidas]
+                if volver:
+                    cliente.lpush(CLAVE_PENDIENTES, *[json.dumps(p) for p in reversed(volver)])
+                continue
+            intentos += 1
+            sin_enviar = [p for _, incluidas in [fallido, *restantes] for p in incluidas]
+            if intentos >= REINTENTOS_MAX:
+                enviar_a_fallidos(sin_enviar, e.causa, intentos)
+                raise
+            # Los que no salieron vuelven al principio de la cola (en orden) y el lote se reintenta más tarde
+            cliente.lpush(CLAVE_PENDIENTES, *[json.dumps(p) for p in reversed(sin_enviar)])
+            raise self.retry(exc=e, countdown=espera_reintento(intentos),
+                             kwargs={'resumen': resumen, 'intentos': intentos})
+    print(f"Lote enviado: {enviados} correos")
+    return enviados
+
+
+# --- Resumen periódico de novedades ---
+# registrar_evento() no encola ninguna tarea: guarda el cambio en una lista de Redis por
+# destinatario. La tarea periódica enviar_resumenes (Celery beat, cada NOTIFICACIONES_INTERVALO
+# segundos) manda un único correo por destinatario con todo lo que cambió en ese intervalo.
+#   celery -A tareas worker --beat   (o un proceso `celery -A tareas beat` aparte)
+NOTIFICACIONES_INTERVALO = int(os.getenv('NOTIFICACIONES_INTERVALO', 300))
+NOTIFICACIONES_MAX_DETALLE = 50  # Líneas de detalle por correo (el resto solo se cuenta)
+
+CLAVE_DESTINATARIOS = 'notificaciones:destinatarios'
+ACCIONES = {'agregado': 'agregados', 'actualizado': 'actualizados', 'eliminado': 'eliminados'}
+
+def clave_eventos(recipient):
+    return f'notificaciones:eventos:{recipient}'
+
+def registrar_evento(recipient, accion, book):
+    """Guarda un cambio ('agregado', 'actualizado' o 'eliminado') para el próximo resumen del destinatario."""
+    registrar_eventos([(recipient, accion, book)])
+
+def registrar_eventos(eventos):
+    """Como registrar_evento, para varios (recipient, accion, book) en una sola ida a Redis."""
+    pipe = obtener_redis().pipeline()
+    for recipient, accion, book in eventos:
+        evento = {'accion': accion, 'id': book['id'], 'title': book['title'], 'author': book['author']}
+        pipe.rpush(clave_eventos(recipient), json.dumps(evento))
+        pipe.sadd(CLAVE_DESTINATARIOS, recipient)
+    pipe.execute()
+
+def crear_resumen_eventos(recipient, eventos):
+    """
+    Un correo con el resumen de los eventos: totales por acción y una línea por libro y acción
+    (varias ediciones del mismo libro se muestran una vez, con el título más reciente).
+    """
+    totales = {accion: 0 for accion in ACCIONES}
+    por_libro = {}
+    for evento in eventos:
+        totales[evento['accion']] = totales.get(evento['accion'], 0) + 1
+        clave = (evento['accion'], evento['id'])
+        anterior = por_libro.pop(clave, {'veces': 0})
+        por_libro[clave] = {**evento, 'veces': anterior['veces'] + 1}
+
+    partes = [f"{total} {ACCIONES.get(accion, accion)}" for accion, total in totales.items() if total]
+    lineas = []
+    for evento in list(por_libro.values())[:NOTIFICACIONES_MAX_DETALLE]:
+        veces = f" (x{evento['veces']})" if evento['veces'] > 1 else ""
+        lineas.append(f"- {evento['accion'].capitalize()}{veces}: \"{evento['title']}\" de {evento['author']}")
+    if len(por_libro) > NOTIFICACIONES_MAX_DETALLE:
+        lineas.append(f"... y {len(por_libro) - NOTIFICACIONES_MAX_DETALLE} libros más.")
+    return {
+        'recipient': recipient,
+        'subject': f"Resumen de la biblioteca: {', '.join(partes)}",
+        'body': "Cambios en la biblioteca desde el último resumen:\n\n" + "\n".join(lineas),
+    }
+
+@celery_app.task
+def enviar_resumenes():
+    """Tarea periódica: un correo de resumen por destinatario con eventos pendientes, todos por una conexión."""
+    cliente = obtener_redis()
+    pendientes = []
+    for recipient in cliente.smembers(CLAVE_DESTINATARIOS):
+        # Leer y vaciar en una transacción: los eventos que lleguen después quedan para el próximo resumen
+        pipe = cliente.pipeline()
+        pipe.lrange(clave_eventos(recipient), 0, -1)
+        pipe.delete(clave_eventos(recipient))
+        pipe.srem(CLAVE_DESTINATARIOS, recipient)
+        eventos_json = pipe.execute()[0]
+        if eventos_json:
+            pendientes.append((recipient, eventos_json))
+    if not pendientes:
+        return 0
+    # Hasta saber qué salió, todos los eventos leídos se consideran sin enviar: ante cualquier
+    # error (al armar un resumen, al enviar, etc.) vuelven a su lista en el `finally`
+    sin_enviar = pendientes
+    try:
+        resumenes = [crear_resumen_eventos(recipient, [json.loads(e) for e in eventos_json])
+                     for recipient, eventos_json in pendientes]
+        try:
+            enviados = enviar_correos(resumenes)
+            sin_enviar = []
+        except CircuitoAbierto as e:
+            print(f"Resúmenes pospuestos: {e}")
+            enviados = 0
+        except EnvioIncompleto as e:
+            sin_enviar, enviados = pendientes[e.enviados:], e.enviados
+            if es_permanente(e.causa):
+                # Ese resumen no se puede entregar: a fallidos, sin volver a acumular sus eventos
+                enviar_a_fallidos([resumenes[e.enviados]], e.causa, 1)
+                sin_enviar = sin_enviar[1:]
+            else:
+                print(f"ERROR al enviar resúmenes ({e}); se reintentará en el próximo intervalo")
+    finally:
+        # Los eventos de los resúmenes que no salieron vuelven a su lista (antes de los nuevos)
+        # y se reintentan en el próximo intervalo; todo en una transacción
+        if sin_enviar:
+            pipe = cliente.pipeline()
+            for recipient, eventos_json in sin_enviar:
+                pipe.lpush(clave_eventos(recipient), *reversed(eventos_json))
+                pipe.sadd(CLAVE_DESTINATARIOS, recipient)
+            pipe.execute()
+    print(f"Resúmenes enviados: {enviados}")
+    return enviados
+
+celery_app.conf.beat_schedule = {
+    'resumen-notificaciones': {'task': enviar_resumenes.name, 'schedule': NOTIFICACIONES_INTERVALO},
+}